@@ -0,0 +1,249 @@
+"""
+This module benchmarks the sync against a local stand-in for the Nextcloud server (see `stub_server`), so no live Nextcloud is needed.
+For every dataset size, observations of every ObservationType are generated and the following jobs are timed end to end:
+    - upload: `upload_observations` uploads all observations
+    - update: `update_observations` after NINA finished every second non-scheduled observation
+    - pending_deletion: `process_pending_deletion_observations` after every fourth observation was deleted by its user
+
+Each job reports its wall time, the number of database queries and the number of HTTP requests received by the server.
+The results can be stored as baseline and later runs compared against it (see `compare_to_baseline`).
+Used by the `benchmark_sync` command, which runs the benchmark in a test database.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+from itertools import cycle
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from nc_py_api import NextcloudException
+
+import nextcloud.nextcloud_manager as nm
+from accounts.models import ObservatoryUser
+from nextcloud.nextcloud_sync import update_observations, upload_observations
+from nextcloud.stub_server import StubNextcloudServer
+from observation_data.models import (
+    AbstractObservation,
+    CelestialTarget,
+    ExoplanetObservation,
+    ExpertObservation,
+    Filter,
+    ImagingObservation,
+    MonitoringObservation,
+    ObservationStatus,
+    ObservationType,
+    Observatory,
+    VariableObservation,
+)
+from observation_data.observation_management import (
+    process_pending_deletion_observations,
+)
+
+logger = logging.getLogger(__name__)
+
+default_sizes = [100, 1000, 10000]
+# Metrics compared against the baseline
+compared_metrics = ["wall_time", "queries", "http_calls"]
+
+
+def create_dataset(size: int, user: ObservatoryUser) -> None:
+    """
+    Creates `size` observations, cycling through all observation types and observatories. Scheduled observations are due today,
+    exoplanet observations take place tomorrow.
+
+    :param size: Number of observations
+    :param user: Owner of the observations
+    """
+    now = timezone.now()
+    today = now.date()
+    luminance = Filter.objects.get(filter_type="L")
+    observatories = cycle(Observatory.objects.order_by("name"))
+    observation_types = cycle(ObservationType)
+    for i in range(size):
+        observation_type = next(observation_types)
+        model, fields = {
+            ObservationType.IMAGING: (ImagingObservation, {"frames_per_filter": 10}),
+            ObservationType.EXOPLANET: (
+                ExoplanetObservation,
+                {
+                    "start_observation": now + timedelta(days=1),
+                    "end_observation": now + timedelta(days=1, hours=2),
+                },
+            ),
+            ObservationType.VARIABLE: (
+                VariableObservation,
+                {"minimum_altitude": 10.0, "frames_per_filter": 100},
+            ),
+            ObservationType.MONITORING: (
+                MonitoringObservation,
+                {
+                    "start_scheduling": today,
+                    "end_scheduling": today + timedelta(days=7),
+                    "next_upload": today,
+                    "cadence": 1,
+                    "minimum_altitude": 10.0,
+                    "frames_per_filter": 10,
+                },
+            ),
+            ObservationType.EXPERT: (
+                ExpertObservation,
+                {
+                    "start_scheduling": today,
+                    "end_scheduling": today + timedelta(days=7),
+                    "next_upload": today,
+                    "cadence": 1,
+                    "frames_per_filter": 100,
+                    "dither_every": 10,
+                    "binning": 1,
+                    "subframe": 1,
+                    "gain": 10,
+                    "offset": 10,
+                    "moon_separation_angle": 10.0,
+                    "moon_separation_width": 1,
+                    "batch_size": 1,
+                    "minimum_altitude": 10.0,
+                },
+            ),
+        }[observation_type]
+        target = CelestialTarget.objects.create(name=f"Target{i}", ra="0", dec="0")
+        obs = model.objects.create(
+            observatory=next(observatories),
+            target=target,
+            user=user,
+            created_at=now,
+            observation_type=observation_type,
+            project_status=ObservationStatus.PENDING,
+            project_completion=0.0,
+            priority=1,
+            exposure_time=10.0,
+            **fields,
+        )
+        obs.filter_set.add(luminance)
+
+
+def _finish_observations(server: StubNextcloudServer) -> None:
+    """
+    Simulates NINA: every second non-scheduled observation in the nextcloud gets all of its frames accepted.
+    """
+    non_scheduled = AbstractObservation.objects.filter(
+        monitoringobservation__isnull=True, expertobservation__isnull=True
+    ).order_by("id")[::2]
+    for path in nm.generate_observation_paths(non_scheduled).values():
+        try:
+            nc_dict = json.loads(server.storage.read(path))
+        except NextcloudException:
+            continue  # not uploaded
+        for exposure in nc_dict["targets"][0]["exposures"]:
+            exposure["acceptedAmount"] = exposure["requiredAmount"]
+        server.storage.write(path, json.dumps(nc_dict, indent=2).encode("utf-8"))
+
+
+def _delete_observations() -> None:
+    """
+    Simulates users deleting every fourth observation.
+    """
+    ids = list(AbstractObservation.objects.order_by("id").values_list("id", flat=True))
+    AbstractObservation.objects.filter(id__in=ids[::4]).update(
+        project_status=ObservationStatus.PENDING_DELETION
+    )
+
+
+def _measure(server: StubNextcloudServer, job) -> dict:
+    server.reset_requests()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.monotonic()
+        job()
+        wall_time = time.monotonic() - start
+    return {
+        "wall_time": round(wall_time, 3),
+        "queries": len(queries),
+        "http_calls": sum(server.requests.values()),
+        "requests": dict(server.requests),
+    }
+
+
+def run_benchmark(
+    size: int,
+    user: ObservatoryUser,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    concurrency: int = 1,
+) -> dict:
+    """
+    Generates a dataset of `size` observations and runs all jobs against a new stand-in server. All observations are deleted afterward.
+
+    :param size: Number of observations
+    :param user: Owner of the observations
+    :param latency: Seconds every request to the server is delayed by
+    :param error_rate: Share of the WebDAV requests the server answers with 503
+    :param concurrency: Concurrency passed to the jobs
+    :return: dict mapping the jobs to their "wall_time", "queries", "http_calls" and "requests" by verb
+    """
+    old_env = {key: os.environ.get(key) for key in ("NC_URL", "NC_USER", "NC_PASSWORD")}
+    old_prefix, old_backends = nm.prefix, nm.backends
+    today = timezone.now().date()
+    results = {}
+    with StubNextcloudServer(latency=latency, error_rate=error_rate) as server:
+        os.environ.update(NC_URL=server.url, NC_USER=server.user, NC_PASSWORD="x")
+        nm.prefix, nm.backends = "benchmark", {}
+        nm.reset_connection()
+        nm.reset_circuit_breaker()
+        try:
+            nm.initialize_connection()
+            for observatory in Observatory.objects.values_list("name", flat=True):
+                nm.mkdir(nm.get_projects_directory(observatory))
+            create_dataset(size, user)
+
+            results["upload"] = _measure(
+                server, lambda: upload_observations(today, concurrency=concurrency)
+            )
+            _finish_observations(server)
+            results["update"] = _measure(
+                server, lambda: update_observations(today, concurrency=concurrency)
+            )
+            _delete_observations()
+            results["pending_deletion"] = _measure(
+                server,
+                lambda: process_pending_deletion_observations(concurrency=concurrency),
+            )
+        finally:
+            AbstractObservation.objects.all().delete()
+            CelestialTarget.objects.all().delete()
+            nm.prefix, nm.backends = old_prefix, old_backends
+            nm.reset_connection()
+            for key, value in old_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+    return results
+
+
+def compare_to_baseline(
+    results: dict[str, dict], baseline: dict[str, dict], tolerance: float = 0.2
+) -> list[str]:
+    """
+    Compares the results of a benchmark with a baseline. Sizes and jobs missing in either are skipped.
+
+    :param results: dict mapping the dataset sizes (as str) to the results of `run_benchmark`
+    :param baseline: Results of an earlier benchmark in the same format
+    :param tolerance: Relative increase of a metric that is accepted, e.g. 0.2 accepts 20% more than the baseline
+    :return: Descriptions of all metrics that got worse by more than the tolerance
+    """
+    regressions = []
+    for size, size_results in results.items():
+        for job, job_results in size_results.items():
+            old_results = baseline.get(size, {}).get(job)
+            if old_results is None:
+                continue
+            for metric in compared_metrics:
+                old, new = old_results[metric], job_results[metric]
+                if new > old * (1 + tolerance) and new - old > 0.01:
+                    regressions.append(
+                        f"{job} of {size} observations: {metric} increased from {old} to {new}"
+                    )
+    return regressions
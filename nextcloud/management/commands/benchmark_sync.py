@@ -0,0 +1,122 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.models import ObservatoryUser
+from nextcloud.benchmark import compare_to_baseline, default_sizes, run_benchmark
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Benchmarks upload, update and pending deletion of observations against a local stand-in for the Nextcloud, using a test database"
+
+    def handle(self, *args, **options):
+        # The benchmark creates and deletes observations, so it must never run against the real database (like the testserver command)
+        old_database_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            call_command("load_configuration", options["config"], stdout=self.stdout)
+            user = ObservatoryUser.objects.create_user(
+                username="benchmark", email="benchmark@example.com", password=None
+            )
+            results = {}
+            for size in options["sizes"]:
+                self.stdout.write(f"Benchmarking {size} observations ...")
+                results[str(size)] = run_benchmark(
+                    size,
+                    user,
+                    latency=options["latency"],
+                    error_rate=options["error_rate"],
+                    concurrency=options["concurrency"],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        report = {
+            "settings": {
+                key: options[key] for key in ("latency", "error_rate", "concurrency")
+            },
+            "results": results,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            if baseline["settings"] != report["settings"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"The baseline was measured with other settings: {baseline['settings']}"
+                    )
+                )
+            regressions = compare_to_baseline(
+                results, baseline["results"], options["tolerance"]
+            )
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} metrics got worse than the baseline"
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            help="Numbers of observations to benchmark with",
+            default=default_sizes,
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            help="Seconds every request to the Nextcloud is delayed by",
+            default=0.0,
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            help="Share of the requests to the Nextcloud that fail with 503, between 0 and 1",
+            default=0.0,
+        )
+        parser.add_argument(
+            "--concurrency",
+            "-c",
+            type=int,
+            help="Maximum number of concurrent requests of the sync",
+            default=1,
+        )
+        parser.add_argument(
+            "--config",
+            type=str,
+            help="Configuration of the observatories and filters, see load_configuration",
+            default="./default_config.json",
+        )
+        parser.add_argument(
+            "--baseline",
+            type=str,
+            help="JSON file written by --save-baseline to compare the results with",
+            default=None,
+        )
+        parser.add_argument(
+            "--save-baseline",
+            type=str,
+            help="File the results are written to, to be used as --baseline of later runs",
+            default=None,
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            help="Relative increase of wall time, queries or HTTP calls over the baseline that is not reported as regression",
+            default=0.2,
+        )
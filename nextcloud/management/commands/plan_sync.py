@@ -0,0 +1,42 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from nextcloud.sync_plan import build_sync_plan
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Prints the actions the next upload and update of observations would take as JSON, without contacting the Nextcloud"
+
+    def handle(self, *args, **options):
+        today = (timezone.now() + timedelta(days=options["days"])).date()
+        plan = build_sync_plan(today, observatories=options["observatory"])
+        output = json.dumps(plan, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", "-d", type=int, help="Timedelta of days from now", default=0
+        )
+        parser.add_argument(
+            "--observatory",
+            "-o",
+            action="append",
+            help="Only plan the observations of this observatory. Can be passed multiple times",
+            default=None,
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="File the plan is written to instead of stdout. Can be passed to --plan of upload_observations and update_observations",
+            default=None,
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from nextcloud.outbox import process_outbox
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Carries out the nextcloud writes of paused and resumed observations"
+
+    def handle(self, *args, **options):
+        try:
+            process_outbox(
+                concurrency=options["concurrency"],
+                max_attempts=options["max_attempts"],
+            )
+        except Exception as e:
+            logger.error(f"Error processing outbox: {e}")
+            self.stdout.write(self.style.ERROR(f"Error processing outbox: {e}"))
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            "-c",
+            type=int,
+            help="Maximum number of concurrent uploads",
+            default=1,
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            help="Number of failed uploads after which the observation is set to Error",
+            default=5,
+        )
@@ -0,0 +1,89 @@
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from nextcloud.sync_daemon import create_jobs, run_sync_daemon
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Runs upload, update, pending deletion and outbox of observations on a schedule in a single long-running process"
+
+    def handle(self, *args, **options):
+        jobs = create_jobs(
+            upload_interval=timedelta(minutes=options["upload_interval"]),
+            update_interval=timedelta(minutes=options["update_interval"]),
+            deletion_interval=timedelta(minutes=options["deletion_interval"]),
+            outbox_interval=timedelta(minutes=options["outbox_interval"]),
+            concurrency=options["concurrency"],
+            bulk=options["bulk"],
+        )
+
+        stop_event = threading.Event()
+
+        def stop(signum, frame):
+            logger.info(f"Received signal {signum}, stopping sync daemon ...")
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        run_sync_daemon(
+            jobs,
+            status_file=options["status_file"],
+            stop_event=stop_event,
+            once=options["once"],
+        )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--upload-interval",
+            type=float,
+            help="Minutes between two uploads of observations. 0 disables the upload.",
+            default=15,
+        )
+        parser.add_argument(
+            "--update-interval",
+            type=float,
+            help="Minutes between two updates of observations. 0 disables the update.",
+            default=15,
+        )
+        parser.add_argument(
+            "--deletion-interval",
+            type=float,
+            help="Minutes between two runs of the pending deletion, the first run is at the end of the current observing night. 0 disables the deletion.",
+            default=24 * 60,
+        )
+        parser.add_argument(
+            "--outbox-interval",
+            type=float,
+            help="Minutes between two runs of the outbox (pausing and resuming of observations). 0 disables the outbox.",
+            default=1,
+        )
+        parser.add_argument(
+            "--concurrency",
+            "-c",
+            type=int,
+            help="Maximum number of concurrent uploads, downloads and deletions",
+            default=1,
+        )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Download the Projects directory of each observatory as a single zip instead of every progress file on its own",
+        )
+        parser.add_argument(
+            "--status-file",
+            type=str,
+            help="JSON file the last run times and durations of the jobs are written to",
+            default=None,
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run every job once and exit",
+        )
@@ -1,9 +1,11 @@
-from datetime import timedelta
+import json
+from datetime import date, timedelta
 from django.utils import timezone
 
 from django.core.management.base import BaseCommand
 
-from nextcloud.nextcloud_sync import update_observations
+import nextcloud.nextcloud_manager as nm
+from nextcloud.nextcloud_sync import run_sharded, update_observations
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,8 +20,31 @@ class Command(BaseCommand):
         if options.get("days"):
             time_delta = options["days"]
 
+        today = (timezone.now() + timedelta(days=time_delta)).date()
+        plan = None
+        if options["plan"]:
+            with open(options["plan"]) as f:
+                plan = json.load(f)
+            today = date.fromisoformat(plan["today"])
         try:
-            update_observations((timezone.now() + timedelta(days=time_delta)).date())
+            with nm.deadline(options["deadline"]):
+                if options["sharded"]:
+                    summary = run_sharded(
+                        "update",
+                        processes=options["processes"],
+                        today=today,
+                        concurrency=options["concurrency"],
+                        bulk=options["bulk"],
+                        plan=plan,
+                    )
+                    self.stdout.write(json.dumps(summary, indent=2))
+                else:
+                    update_observations(
+                        today,
+                        concurrency=options["concurrency"],
+                        bulk=options["bulk"],
+                        plan=plan,
+                    )
         except Exception as e:
             logger.error(f"Error updating observations: {e}")
             self.stdout.write(self.style.ERROR(f"Error updating observations: {e}"))
@@ -28,3 +53,39 @@ class Command(BaseCommand):
         parser.add_argument(
             "--days", "-d", type=int, help="Timedelta of days from now", default=0
         )
+        parser.add_argument(
+            "--concurrency",
+            "-c",
+            type=int,
+            help="Maximum number of concurrent downloads of progress files",
+            default=1,
+        )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Download the Projects directory of each observatory as a single zip instead of every progress file on its own",
+        )
+        parser.add_argument(
+            "--sharded",
+            action="store_true",
+            help="Sync the observations of every observatory in its own process",
+        )
+        parser.add_argument(
+            "--processes",
+            "-p",
+            type=int,
+            help="Maximum number of processes in sharded mode. Default is one per observatory",
+            default=None,
+        )
+        parser.add_argument(
+            "--deadline",
+            type=float,
+            help="Seconds after which the run is stopped. Default is NC_SYNC_DEADLINE or no deadline",
+            default=None,
+        )
+        parser.add_argument(
+            "--plan",
+            type=str,
+            help="JSON file written by plan_sync. Only the observations of the plan are synced, using the date of the plan",
+            default=None,
+        )
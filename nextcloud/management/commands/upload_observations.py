@@ -1,9 +1,11 @@
-from datetime import timedelta
+import json
+from datetime import date, timedelta
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from nextcloud.nextcloud_sync import upload_observations
+import nextcloud.nextcloud_manager as nm
+from nextcloud.nextcloud_sync import run_sharded, upload_observations
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,11 +20,77 @@ class Command(BaseCommand):
         if options.get("days"):
             time_delta = options["days"]
 
+        today = (timezone.now() + timedelta(days=time_delta)).date()
+        plan = None
+        if options["plan"]:
+            with open(options["plan"]) as f:
+                plan = json.load(f)
+            today = date.fromisoformat(plan["today"])
         try:
-            upload_observations((timezone.now() + timedelta(days=time_delta)).date())
+            with nm.deadline(options["deadline"]):
+                if options["sharded"]:
+                    summary = run_sharded(
+                        "upload",
+                        processes=options["processes"],
+                        today=today,
+                        concurrency=options["concurrency"],
+                        plan=plan,
+                        budget_seconds=options["budget_seconds"],
+                    )
+                    self.stdout.write(json.dumps(summary, indent=2))
+                else:
+                    summary = upload_observations(
+                        today,
+                        concurrency=options["concurrency"],
+                        plan=plan,
+                        budget_seconds=options["budget_seconds"],
+                    )
+                    if summary and summary["deferred"]:
+                        self.stdout.write(
+                            self.style.WARNING(
+                                f"Deferred {summary['deferred']} uploads to the next run"
+                            )
+                        )
         except Exception as e:
             logger.error(f"Error uploading observations: {e}")
             self.stdout.write(self.style.ERROR(f"Error uploading observations: {e}"))
 
     def add_arguments(self, parser):
         parser.add_argument("--days", "-d", type=int, help="Timedelta of days from now")
+        parser.add_argument(
+            "--concurrency",
+            "-c",
+            type=int,
+            help="Maximum number of concurrent uploads",
+            default=1,
+        )
+        parser.add_argument(
+            "--sharded",
+            action="store_true",
+            help="Sync the observations of every observatory in its own process",
+        )
+        parser.add_argument(
+            "--processes",
+            "-p",
+            type=int,
+            help="Maximum number of processes in sharded mode. Default is one per observatory",
+            default=None,
+        )
+        parser.add_argument(
+            "--deadline",
+            type=float,
+            help="Seconds after which the run is stopped. Default is NC_SYNC_DEADLINE or no deadline",
+            default=None,
+        )
+        parser.add_argument(
+            "--plan",
+            type=str,
+            help="JSON file written by plan_sync. Only the observations of the plan are synced, using the date of the plan",
+            default=None,
+        )
+        parser.add_argument(
+            "--budget-seconds",
+            type=float,
+            help="Time the upload may take. The most important observations are uploaded first, the rest is deferred to the next run",
+            default=None,
+        )
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncCollectionState",
+            fields=[
+                (
+                    "directory",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("token", models.TextField(blank=True, default="")),
+                ("listing", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
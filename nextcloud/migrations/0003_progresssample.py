@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-16 12:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("nextcloud", "0002_outboxentry"),
+        ("observation_data", "0017_observation_due_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProgressSample",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("filter", models.CharField(max_length=6)),
+                ("accepted", models.PositiveIntegerField()),
+                ("required", models.PositiveIntegerField()),
+                ("night", models.DateField()),
+                (
+                    "recorded_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "observation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="observation_data.abstractobservation",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("observation", "filter", "night"),
+                        name="progress_sample_unique_night",
+                    )
+                ],
+            },
+        ),
+    ]
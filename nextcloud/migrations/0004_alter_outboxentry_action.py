@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-16 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("nextcloud", "0003_progresssample"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="outboxentry",
+            name="action",
+            field=models.CharField(
+                choices=[("Pause", "Pause"), ("Resume", "Resume"), ("Delete", "Delete")]
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+"""
+Database models of the nextcloud app.
+"""
+
+from django.db import models
+from django.utils import timezone
+
+from observation_data.models import AbstractObservation
+
+
+class SyncCollectionState(models.Model):
+    """
+    Sync token of a directory in the nextcloud for WebDAV sync-collection REPORTs (RFC 6578) and the listing it belongs to.
+    The next REPORT only returns the files changed since this token, which are applied to the listing.
+    Without sync-collection, only the listing is stored (empty token). It is the snapshot `plan_sync` works with.
+    """
+
+    directory = models.CharField(max_length=255, primary_key=True)
+    token = models.TextField(blank=True, default="")
+    listing = models.JSONField(default=dict)  # {user_path: {"etag": ..., "size": ...}}
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.directory
+
+
+class OutboxAction(models.TextChoices):
+    PAUSE = "Pause"  # upload the paused observation, so NINA skips it
+    RESUME = (
+        "Resume"  # upload the resumed observation again if it is still in the nextcloud
+    )
+    DELETE = "Delete"  # delete the deleted or finished observation from the nextcloud once the night is over
+
+
+class OutboxEntry(models.Model):
+    """
+    Nextcloud write requested by a view. Written in the same transaction as the status change of the observation
+    and carried out by the `process_outbox` command, so the request does not wait for the nextcloud.
+    """
+
+    observation = models.ForeignKey(
+        AbstractObservation, on_delete=models.CASCADE, related_name="+"
+    )
+    action = models.CharField(choices=OutboxAction)
+    created_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return f"{self.action} {self.observation_id}"
+
+
+class ProgressSample(models.Model):
+    """
+    Accepted and required frames of one filter of an observation at the start of an observing night, as read from its progress file.
+    Appended by the update runs (see `progress_history`), at most one sample per observation, filter and night is kept.
+    """
+
+    observation = models.ForeignKey(
+        AbstractObservation, on_delete=models.CASCADE, related_name="+"
+    )
+    filter = models.CharField(max_length=6)
+    accepted = models.PositiveIntegerField()
+    required = models.PositiveIntegerField()
+    night = models.DateField()  # date the observing night starts on
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["observation", "filter", "night"],
+                name="progress_sample_unique_night",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.observation_id} {self.filter} {self.night}"
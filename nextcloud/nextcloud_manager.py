@@ -2,39 +2,150 @@
 This module provides a simple interface to interact with the Nextcloud server using the nc_py_api library.
 Functions:
     - initialize_connection: Initializes the connection to the Nextcloud server using the credentials from the .env file
+    - persistent_connection: Keeps a single connection to the Nextcloud server alive, e.g. for the sync daemon
+    - get_connection: Returns the shared connection of the process, creates it lazily and reconnects if it is broken
     - upload_file: Uploads a file to the Nextcloud server
     - download_file: Downloads a file from the Nextcloud server
     - download_folder: Downloads a folder from the Nextcloud server into a zip file
+    - download_folder_dicts: Downloads all JSON files of a folder at once as a zip file
+    - listing_cache: Caches directory listings for the duration of a sync run
+    - build_observation_index: Maps the ids of all observations in the nextcloud to their files
+    - snapshot_observation_index: Same as build_observation_index, but from the listings stored by the last index, without any request
+    - sync_collection: Lists only the files changed since the last listing using WebDAV sync-collection REPORTs
+    - deadline: Limits the total time of the requests made during a sync run
+    - get_backend: Returns the storage backend of a path (see `nextcloud.storage`)
 
 Environment Variables:
     - NC_URL: The URL of the Nextcloud server
     - NC_USER: The username to authenticate with
     - NC_PASSWORD: The password to authenticate with
+    - NC_HEALTH_CHECK_INTERVAL: Seconds after which `get_connection` checks the shared connection again (default 60)
+    - NC_SYNC_COLLECTION: If "True", `build_observation_index` lists the project directories incrementally with sync-collection REPORTs
+    - NC_BREAKER_THRESHOLD: Number of consecutive transport failures after which the circuit breaker opens (default 5)
+    - NC_BREAKER_COOLDOWN: Seconds after which an open circuit breaker lets a single request through to probe the server (default 300)
+    - NC_SYNC_DEADLINE: Seconds a sync run may take before its remaining requests are refused (default: no deadline)
+    - NC_STORAGE_BACKENDS: Storage backends of observatories that are not accessed through WebDAV, e.g. "TURMX2=local:/mnt/nina;TURMX3=memory".
+      The files of these observatories are read and written by their backend, everything else goes to the Nextcloud server.
+
+While the circuit breaker is open or after the deadline of the sync run has passed, every request raises `NextcloudUnavailable`.
+It is deliberately no NextcloudException, so the sync functions do not mark the remaining observations as ERROR but stop instead.
 """
 
+import hashlib
 import json
+import logging
 import os
-from io import BytesIO
+from contextlib import contextmanager, nullcontext
 from os import PathLike
 import re
-
+import tempfile
+import threading
+import time
+import zipfile
+from typing import NamedTuple
+from urllib.parse import quote, unquote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import niquests
+from django.db.models import prefetch_related_objects
 from nc_py_api import Nextcloud, NextcloudException
 from dotenv import load_dotenv
 
-from observation_data.models import AbstractObservation, ObservationStatus
-from observation_data.serializers import get_serializer
+from observation_data.models import (
+    AbstractObservation,
+    ObservationStatus,
+    Observatory,
+)
+from nextcloud import sync_metrics
+from nextcloud.models import SyncCollectionState
+from nextcloud.storage import FileInfo, StorageBackend, WebDavBackend, parse_backends
+from observation_data.serializers import get_project_name
 
+logger = logging.getLogger(__name__)
 
 prefix = os.getenv("NC_PREFIX", default="")
 nc: Nextcloud
 
+# True inside a `persistent_connection()` context. initialize_connection() then keeps the existing connection.
+_persistent = False
+
+# Guards the creation and health checks of the shared connection returned by `get_connection()`
+_connection_lock = threading.Lock()
+_last_health_check = 0.0
+health_check_interval = float(os.getenv("NC_HEALTH_CHECK_INTERVAL", default=60))
+
+# Maps a directory path to its listing ({user_path: FileInfo}) or None if the directory does not exist.
+# Only active inside a `listing_cache()` context, otherwise None.
+_listing_cache: dict[str, dict[str, FileInfo] | None] | None = None
+_listing_cache_lock = threading.RLock()
+
+# Matches the file names of observations, e.g. "00042_Imaging_L_M42.json"
+_observation_file_pattern = re.compile(r"^(\d+)_.*\.json$")
+
+use_sync_collection = os.getenv("NC_SYNC_COLLECTION", default="False") == "True"
+
+# State of the circuit breaker. The breaker is open while `_breaker_opened_at` is set.
+breaker_threshold = int(os.getenv("NC_BREAKER_THRESHOLD", default=5))
+breaker_cooldown = float(os.getenv("NC_BREAKER_COOLDOWN", default=300))
+_breaker_lock = threading.Lock()
+_consecutive_failures = 0
+_breaker_opened_at: float | None = None
+_probe_running = False
+
+# Time (time.monotonic()) after which requests are refused. Only set inside a `deadline()` context.
+sync_deadline = (
+    float(os.getenv("NC_SYNC_DEADLINE")) if os.getenv("NC_SYNC_DEADLINE") else None
+)
+_deadline: float | None = None
+
+# Backend of all paths that do not belong to an observatory in `backends`
+webdav_backend = WebDavBackend(lambda: nc)
+# Maps the upper case names of observatories to their storage backends, if they are not accessed through WebDAV
+backends: dict[str, StorageBackend] = parse_backends(
+    os.getenv("NC_STORAGE_BACKENDS", default="")
+)
+
+# Transport failures of the HTTP client of nc_py_api (niquests): the server could not be reached or did not answer in time.
+# Read timeouts of requests made through nc_py_api are raised as NextcloudException with status code 408 instead.
+transport_errors = (niquests.exceptions.ConnectionError, niquests.exceptions.Timeout)
+
+_sync_collection_request = """<?xml version="1.0" encoding="utf-8"?>
+<d:sync-collection xmlns:d="DAV:">
+  <d:sync-token>{token}</d:sync-token>
+  <d:sync-level>1</d:sync-level>
+  <d:prop>
+    <d:getetag/>
+    <d:getcontentlength/>
+  </d:prop>
+</d:sync-collection>"""
+
+
+class NextcloudUnavailable(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker is open or after the deadline of the sync run has passed.
+    """
+
+
+class ObservationFile(NamedTuple):
+    """
+    Entry of the observation index. Describes the file of an observation in the nextcloud.
+    """
+
+    path: str
+    etag: str
+    size: int
+
 
 def initialize_connection() -> None:
     """
     Initializes the connection to the Nextcloud server using the credentials from the .env file.
-    Needs to be run once before using other functions of this manager
+    Needs to be run once before using other functions of this manager.
+    Keeps the existing connection inside a `persistent_connection()` context.
     """
     global nc
+    if _persistent and "nc" in globals():
+        return
     load_dotenv()
     nc_url = os.getenv("NC_URL")
     nc_auth_user = os.getenv("NC_USER")
@@ -45,6 +156,172 @@ def initialize_connection() -> None:
     )
 
 
+@contextmanager
+def persistent_connection():
+    """
+    Keeps the connection to the Nextcloud server alive for the duration of the context.
+    The connection is initialized once, later calls of initialize_connection() reuse it instead of creating a new client.
+    Used by long-running processes like the sync daemon to avoid the setup of a new client and session for every run.
+    """
+    global _persistent
+    was_persistent = _persistent
+    initialize_connection()
+    _persistent = True
+    try:
+        yield
+    finally:
+        _persistent = was_persistent
+
+
+def get_connection() -> Nextcloud:
+    """
+    Returns the connection shared by all requests and threads of the process. Creates it on first use.
+    The client keeps its HTTP connections alive and pools them, so later requests skip the connection setup and authentication.
+    If the last health check is older than `health_check_interval` seconds, the server is queried once and a new connection is
+    created if the old one is broken.
+
+    :return: The shared Nextcloud client, which is also used by the other functions of this manager
+    """
+    global _last_health_check
+    with _connection_lock:
+        if "nc" not in globals():
+            initialize_connection()
+        elif time.monotonic() - _last_health_check > health_check_interval:
+            try:
+                with _request_guard("PROPFIND"):
+                    nc.files.by_path("")
+            except (NextcloudException, *transport_errors) as e:
+                logger.warning(
+                    f"Connection to the nextcloud is broken, reconnecting: {e}"
+                )
+                reset_connection()
+                initialize_connection()
+        else:
+            return nc
+        _last_health_check = time.monotonic()
+        return nc
+
+
+@contextmanager
+def deadline(seconds: float | None = None):
+    """
+    Limits the time of all requests made inside the context. Once `seconds` have passed, every request raises `NextcloudUnavailable`.
+    Nested contexts cannot extend the deadline of an outer context. Can also be used as a decorator, e.g. for the sync functions.
+
+    Example: ``with deadline(600): upload_observations()``
+
+    :param seconds: Maximum duration of the context; default=None uses NC_SYNC_DEADLINE. No deadline is set if both are None.
+    """
+    global _deadline
+    if seconds is None:
+        seconds = sync_deadline
+    outer_deadline = _deadline
+    if seconds is not None:
+        _deadline = time.monotonic() + seconds
+        if outer_deadline is not None:
+            _deadline = min(_deadline, outer_deadline)
+    try:
+        yield
+    finally:
+        _deadline = outer_deadline
+
+
+@contextmanager
+def _request_guard(verb: str):
+    """
+    Wraps every request to the Nextcloud server and counts it in the metrics of the sync run. Refuses the request if the deadline has passed or the circuit breaker is open.
+    Counts consecutive transport failures (connection errors and timeouts) and opens the breaker after `breaker_threshold` of them,
+    so the remaining requests fail immediately instead of each waiting for its own timeout.
+    After `breaker_cooldown` seconds, a single request is let through as probe. It closes the breaker if it succeeds, else the breaker stays open.
+
+    :param verb: HTTP verb of the request, e.g. "PROPFIND"
+    :raises NextcloudUnavailable: If the request is refused
+    """
+    global _consecutive_failures, _breaker_opened_at, _probe_running
+    if _deadline is not None and time.monotonic() > _deadline:
+        raise NextcloudUnavailable("The deadline of the sync run has passed")
+    with _breaker_lock:
+        is_probe = _breaker_opened_at is not None
+        if is_probe and (
+            _probe_running or time.monotonic() - _breaker_opened_at < breaker_cooldown
+        ):
+            raise NextcloudUnavailable(
+                f"Circuit breaker is open after {_consecutive_failures} consecutive transport failures"
+            )
+        _probe_running = _probe_running or is_probe
+
+    sync_metrics.record_request(verb)
+    failed = False
+    try:
+        yield
+    except transport_errors:
+        failed = True
+        raise
+    except NextcloudException as e:
+        failed = (
+            e.status_code == 408
+        )  # timeouts are raised as NextcloudException by nc_py_api
+        raise
+    finally:
+        with _breaker_lock:
+            if is_probe:
+                _probe_running = False
+            if not failed:
+                if _breaker_opened_at is not None:
+                    logger.info("Nextcloud is reachable again, closing circuit breaker")
+                _consecutive_failures = 0
+                _breaker_opened_at = None
+            else:
+                _consecutive_failures += 1
+                if is_probe or _consecutive_failures >= breaker_threshold:
+                    if _breaker_opened_at is None:
+                        logger.error(
+                            f"Opening circuit breaker after {_consecutive_failures} consecutive transport failures, next probe in {breaker_cooldown}s"
+                        )
+                    _breaker_opened_at = time.monotonic()
+
+
+def reset_circuit_breaker() -> None:
+    """
+    Closes the circuit breaker and forgets all failures, e.g. after the configuration of the server was fixed.
+    """
+    global _consecutive_failures, _breaker_opened_at, _probe_running
+    with _breaker_lock:
+        _consecutive_failures = 0
+        _breaker_opened_at = None
+        _probe_running = False
+
+
+def reset_connection() -> None:
+    """
+    Drops the shared connection, e.g. after a connection error. The next call of `get_connection()` creates a new one.
+    """
+    global nc
+    if "nc" in globals():
+        del nc
+
+
+def get_backend(nc_path: str) -> StorageBackend:
+    """
+    Returns the storage backend of a path. The observatory is taken from the first directory after the prefix,
+    e.g. "TURMX" of "[prefix]/TURMX/Projects/00001_M42.json". Paths of observatories without own backend use WebDAV.
+
+    :param nc_path: Path of a file/directory
+    :return: The backend the path is stored in
+    """
+    path = str(nc_path).strip("/")
+    if prefix and path.startswith(f"{prefix.strip('/')}/"):
+        path = path[len(prefix.strip("/")) + 1 :]
+    return backends.get(path.split("/", 1)[0].upper(), webdav_backend)
+
+
+def _backend_request(backend: StorageBackend, verb: str):
+    """
+    Guards a request of a remote backend with `_request_guard`. Requests of local backends are neither guarded nor counted.
+    """
+    return _request_guard(verb) if backend.remote else nullcontext()
+
+
 def _check_initialized(method):
     """
     Wrapper to check whether the Nextcloud connection was initialized.
@@ -63,6 +340,85 @@ def _check_initialized(method):
     return wrapper
 
 
+@contextmanager
+def listing_cache():
+    """
+    Caches directory listings for the duration of the context, e.g. a single sync run.
+    Every directory is listed at most once, `file_exists` and `get_observation_file` are answered from memory afterward.
+    Uploads and deletions made through this module keep the cache up to date, changes made by others (e.g. NINA) are not noticed.
+    Nested contexts share the cache of the outermost context. Can also be used as a decorator.
+    The cache is shared by all threads, so it must only be entered by the thread that starts the sync run.
+
+    Example: ``with listing_cache(): upload_observations()``
+    """
+    global _listing_cache
+    is_outermost = _listing_cache is None
+    if is_outermost:
+        _listing_cache = {}
+    try:
+        yield
+    finally:
+        if is_outermost:
+            _listing_cache = None
+
+
+def _listdir(dir_path: str) -> dict[str, FileInfo]:
+    """
+    Lists a directory on the Nextcloud server. Uses the listing cache if it is active.
+
+    :param dir_path: Path of the directory
+    :return: dict mapping the path of each entry to its FileInfo
+    :raises NextcloudException: If the directory does not exist
+    """
+    backend = get_backend(dir_path)
+    if _listing_cache is None:
+        with _backend_request(backend, "PROPFIND"):
+            return backend.listdir(dir_path)
+
+    with _listing_cache_lock:
+        if dir_path not in _listing_cache:
+            try:
+                with _backend_request(backend, "PROPFIND"):
+                    _listing_cache[dir_path] = backend.listdir(dir_path)
+            except NextcloudException:
+                _listing_cache[dir_path] = None
+                raise
+
+        listing = _listing_cache[dir_path]
+    if listing is None:
+        raise NextcloudException(404, "Not found", f"listdir: {dir_path}")
+    return listing
+
+
+def _cache_add(file: FileInfo) -> None:
+    """
+    Adds an uploaded file to the listing of its directory if that listing is cached.
+    """
+    if _listing_cache is None:
+        return
+    with _listing_cache_lock:
+        listing = _listing_cache.get(os.path.dirname(file.path))
+        if listing is not None:
+            listing[file.path] = file
+
+
+def _cache_remove(nc_path: str) -> None:
+    """
+    Removes a deleted file/directory from the cache, including the listings of all directories below it.
+    """
+    if _listing_cache is None:
+        return
+    nc_path = nc_path.strip("/")
+    with _listing_cache_lock:
+        listing = _listing_cache.get(os.path.dirname(nc_path))
+        if listing is not None:
+            listing.pop(nc_path, None)
+            listing.pop(f"{nc_path}/", None)
+        for dir_path in list(_listing_cache):
+            if dir_path == nc_path or dir_path.startswith(f"{nc_path}/"):
+                del _listing_cache[dir_path]
+
+
 @_check_initialized
 def file_exists(nc_path: PathLike[bytes] | str) -> bool:
     """
@@ -72,69 +428,307 @@ def file_exists(nc_path: PathLike[bytes] | str) -> bool:
     :return: true if file exists, else false
     """
     try:
-        file_dir = nc.files.listdir(str(os.path.dirname(nc_path)))
-        for file in file_dir:
-            if file.user_path == nc_path:
-                return True
-        return False
+        return nc_path in _listdir(str(os.path.dirname(nc_path)))
     except NextcloudException:
         return False
 
 
 @_check_initialized
-def get_observation_file(observation: AbstractObservation) -> str | None:
+def get_observation_file(
+    observation: AbstractObservation,
+    index: dict[int, ObservationFile] | None = None,
+) -> str | None:
     """
     Returns the path of the observation request file in the nextcloud if it exists, else None
     :param observation: Abstract observation
+    :param index: Observation index built by `build_observation_index`. If passed, the lookup is made in the index instead of the nextcloud.
 
     :return: path of the file in nextcloud or None if the file does not exist
     """
+    if index is not None:
+        file = index.get(observation.id)
+        return file.path if file else None
 
-    base_path = generate_observation_path(observation).rsplit("/", 1)[0]
+    nc_path = generate_observation_path(observation)
+    if nc_path is None:
+        return None
+    base_path = nc_path.rsplit("/", 1)[0]
 
     target_pattern = re.compile(rf"(?<!\d)0*{observation.id}_")
     try:
-        file_dir = nc.files.listdir(base_path)
-        for file in file_dir:
-            path = os.path.basename(file.user_path)
-            if target_pattern.match(path):
-                return file.user_path
+        for file_path in _listdir(base_path):
+            if target_pattern.match(os.path.basename(file_path)):
+                return file_path
     except NextcloudException:
         return None
     return None
 
 
+@_check_initialized
+def build_observation_index(
+    observatories: list[str] | None = None,
+) -> dict[int, ObservationFile]:
+    """
+    Lists the project directory of every observatory once and maps the id of every observation file found to its path, etag and size.
+    Lookups of observation files are O(1) afterward. Uses the listing cache if it is active.
+    Project directories that do not exist are skipped. With NC_SYNC_COLLECTION, only the changes since the last index are listed.
+    The listings are stored as snapshot in the database (see `SyncCollectionState`), which `snapshot_observation_index` reads.
+
+    :param observatories: Names of the observatories to index; default=None indexes all observatories in the database.
+    :return: dict mapping observation ids to their files
+    """
+    if observatories is None:
+        observatories = Observatory.objects.values_list("name", flat=True)
+
+    index = {}
+    snapshots = []
+    for observatory in observatories:
+        dir_path = get_projects_directory(observatory)
+        try:
+            if use_sync_collection and get_backend(dir_path).remote:
+                listing = _listdir_incremental(dir_path)  # stores its own snapshot
+            else:
+                listing = _listdir(dir_path)
+                snapshots.append(
+                    SyncCollectionState(
+                        directory=dir_path,
+                        listing={
+                            path: {"etag": file.etag, "size": file.size}
+                            for path, file in listing.items()
+                            if not file.is_dir
+                        },
+                    )
+                )
+        except NextcloudException:
+            continue
+        index.update(
+            _index_listing(
+                {path: (file.etag, file.size) for path, file in listing.items()}
+            )
+        )
+
+    # The token is cleared, as the listing may contain changes the stored token does not know about
+    SyncCollectionState.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=["directory"],
+        update_fields=["token", "listing", "updated_at"],
+    )
+    return index
+
+
+def snapshot_observation_index(
+    observatories: list[str],
+) -> tuple[dict[int, ObservationFile], dict[str, str]]:
+    """
+    Builds the observation index from the listings stored by the last `build_observation_index`, without any request to the nextcloud.
+    Changes made by NINA since then are not included.
+
+    :param observatories: Names of the observatories to index
+    :return: the index (see `build_observation_index`) and a dict mapping the directories to the time of their snapshot
+        (ISO format). Directories without snapshot are left out.
+    """
+    states = SyncCollectionState.objects.filter(
+        directory__in=[
+            get_projects_directory(observatory) for observatory in observatories
+        ]
+    )
+    index = {}
+    snapshot_times = {}
+    for state in states:
+        index.update(
+            _index_listing(
+                {
+                    path: (entry["etag"], entry["size"])
+                    for path, entry in state.listing.items()
+                }
+            )
+        )
+        snapshot_times[state.directory] = state.updated_at.isoformat()
+    return index, snapshot_times
+
+
+def _index_listing(listing: dict[str, tuple[str, int]]) -> dict[int, ObservationFile]:
+    """
+    Maps the ids of the observation files of a listing ({path: (etag, size)}) to their files. Other files are left out.
+    """
+    index = {}
+    for file_path, (etag, size) in listing.items():
+        match = _observation_file_pattern.match(os.path.basename(file_path))
+        if match:
+            index[int(match.group(1))] = ObservationFile(file_path, etag, size)
+    return index
+
+
+@_check_initialized
+def sync_collection(
+    dir_path: str, token: str = ""
+) -> tuple[dict[str, dict | None], str]:
+    """
+    Sends a WebDAV sync-collection REPORT (RFC 6578) for a directory.
+    Example: ``changes, token = sync_collection("TURMX/Projects", token)``
+    :param dir_path: Path of the directory
+    :param token: Sync token returned by the last REPORT. An empty token returns all files of the directory.
+    :return: dict mapping the paths of the changed files to {"etag", "size"} or None if they were deleted, and the new sync token
+    :raises NextcloudException: If the server rejects the REPORT, e.g. because the token is invalid or sync-collection is not supported
+    """
+    dir_path = dir_path.strip("/")
+    with _request_guard("REPORT"):
+        response = nc._session.adapter_dav.request(
+            "REPORT",
+            quote(f"/files/{nc.user}/{dir_path}"),
+            data=_sync_collection_request.format(token=escape(token)),
+            headers={"Content-Type": "text/xml", "Depth": "0"},
+        )
+    sync_metrics.record_bytes(received=len(response.content))
+    if response.status_code != 207:
+        raise NextcloudException(
+            response.status_code, "sync-collection REPORT failed", f"{dir_path}"
+        )
+    try:
+        return parse_sync_collection(response.text, f"/files/{nc.user}/")
+    except ElementTree.ParseError as e:
+        raise NextcloudException(reason=f"Invalid sync-collection response: {e}")
+
+
+def parse_sync_collection(
+    response: str, files_root: str
+) -> tuple[dict[str, dict | None], str]:
+    """
+    Parses the multistatus response of a sync-collection REPORT. Directories are left out.
+    :param response: Body of the response
+    :param files_root: Part of the hrefs up to the user paths, e.g. "/files/admin/"
+    :return: dict mapping the paths of the changed files to {"etag", "size"} or None if they were deleted, and the new sync token
+    """
+    ns = {"d": "DAV:"}
+    root = ElementTree.fromstring(response)
+    changes = {}
+    for entry in root.findall("d:response", ns):
+        href = unquote(entry.findtext("d:href", "", ns))
+        if href.endswith("/") or files_root not in href:
+            continue
+        path = href.split(files_root, 1)[1]
+        if "404" in entry.findtext("d:status", "", ns):
+            changes[path] = None
+            continue
+        for propstat in entry.findall("d:propstat", ns):
+            if "200" not in propstat.findtext("d:status", "", ns):
+                continue
+            changes[path] = {
+                "etag": propstat.findtext("d:prop/d:getetag", "", ns),
+                "size": int(propstat.findtext("d:prop/d:getcontentlength", "0", ns)),
+            }
+    return changes, root.findtext("d:sync-token", "", ns)
+
+
+def _listdir_incremental(dir_path: str) -> dict[str, FileInfo]:
+    """
+    Lists a directory using sync-collection REPORTs. Only the files changed since the sync token stored in the database are transferred
+    and applied to the stored listing. If the server rejects the token, the REPORT is repeated without token. If it does not support
+    sync-collection at all, the directory is listed in full. Uses the listing cache if it is active.
+
+    :param dir_path: Path of the directory
+    :return: dict mapping the path of each file to its FileInfo
+    :raises NextcloudException: If the directory does not exist
+    """
+    if _listing_cache is not None and dir_path in _listing_cache:
+        return _listdir(dir_path)
+
+    state = SyncCollectionState.objects.filter(directory=dir_path).first()
+    listing, token = {}, ""
+    tokens = [state.token, ""] if state and state.token else [""]
+    for old_token in tokens:
+        try:
+            changes, token = sync_collection(dir_path, old_token)
+        except (NextcloudException, niquests.exceptions.RequestException) as e:
+            logger.info(
+                f"sync-collection of {dir_path} with token '{old_token}' failed: {e}"
+            )
+            continue
+        listing = dict(state.listing) if old_token else {}
+        for path, entry in changes.items():
+            if entry is None:
+                listing.pop(path, None)
+            else:
+                listing[path] = entry
+        break
+    else:
+        logger.info(f"Falling back to a full listing of {dir_path}")
+        listing = {
+            path: {"etag": file.etag, "size": file.size}
+            for path, file in _listdir(dir_path).items()
+            if not file.is_dir
+        }
+
+    SyncCollectionState.objects.update_or_create(
+        directory=dir_path, defaults={"token": token, "listing": listing}
+    )
+    files = {
+        path: FileInfo(path, entry["etag"], entry["size"])
+        for path, entry in listing.items()
+    }
+    if _listing_cache is not None:
+        with _listing_cache_lock:
+            _listing_cache[dir_path] = files
+    return files
+
+
+def get_projects_directory(observatory: str) -> str:
+    """
+    Returns the path of the directory holding the observation files of an observatory, according to the scheme "/[Observatory]/Projects".
+
+    :param observatory: Name of the observatory
+    :return: path of the directory in the nextcloud
+    """
+    path = f"{str(observatory).upper()}/Projects"
+    if prefix:  # adds the prefix if necessary
+        path = f"{prefix}/{path}"
+    return path
+
+
 @_check_initialized
 def generate_observation_path(
     observation: AbstractObservation,
     dec_offset: int = 5,
-) -> str:
+) -> str | None:
     """
     Generates the path of the file according to the scheme "/[Observatory]/Projects/[Observation_ID]_[Project_Name].json".
     Observation_ID is the unique identifier for all observations.
+    Only the filter set and the target of the observation are queried, use `generate_observation_paths` for many observations.
+    Observations without observatory have no path, their status is set to ERROR.
 
     :param observation: Abstract observation. Is instance of subclass of AbstractObservation and contains all necessary information to build the path
     :param dec_offset: 0 padding for the observation ID in the file name
-    :return path of the file in the nextcloud
+    :return path of the file in the nextcloud, or None if the observation has no observatory
     """
-    if not observation.observatory:
+    if not observation.observatory_id:
         observation.project_status = ObservationStatus.ERROR
         observation.save()
+        return None
 
-    # get the name of the project. Inefficient to get serializer again, but prevents necessity of another argument
-    project_name = get_serializer(observation.observation_type)(observation).data[
-        "name"
-    ]
-
-    observatory_string = str(observation.observatory.name).upper()
     obs_id = observation.id
     formatted_id = f"{obs_id:0{dec_offset}}"
-    path = f"{observatory_string}/Projects/{formatted_id}_{project_name}.json"
+    directory = get_projects_directory(observation.observatory_id)
+    return f"{directory}/{formatted_id}_{get_project_name(observation)}.json"
 
-    if prefix:  # adds the prefix if necessary
-        path = f"{prefix}/{path}"
 
-    return path
+@_check_initialized
+def generate_observation_paths(
+    observations: list[AbstractObservation],
+    dec_offset: int = 5,
+) -> dict[int, str]:
+    """
+    Generates the paths of many observations (see `generate_observation_path`) with two bulk queries for the filter sets and targets.
+    Observations without observatory are left out.
+
+    :param observations: Abstract observations
+    :param dec_offset: 0 padding for the observation ID in the file name
+    :return dict mapping the observation ids to the paths of their files in the nextcloud
+    """
+    observations = list(observations)
+    prefetch_related_objects(observations, "filter_set", "target")
+    paths = {obs.id: generate_observation_path(obs, dec_offset) for obs in observations}
+    return {obs_id: path for obs_id, path in paths.items() if path is not None}
 
 
 @_check_initialized
@@ -156,7 +750,12 @@ def upload_file(
         return False
 
     with open(local_path, "rb") as file:
-        nc.files.upload_stream(nc_path, file)
+        content = file.read()
+    backend = get_backend(nc_path)
+    with _backend_request(backend, "PUT"):
+        _cache_add(backend.write(nc_path, content))
+    if backend.remote:
+        sync_metrics.record_bytes(sent=len(content))
 
     return True
 
@@ -179,11 +778,30 @@ def upload_dict(
     if not overwrite_existing and file_exists(nc_path):
         return False
 
-    json_stream = BytesIO(json.dumps(data, indent=indent).encode("utf-8"))
-    nc.files.upload_stream(path=nc_path, fp=json_stream)
+    content = _dict_to_json(data, indent)
+    backend = get_backend(nc_path)
+    with _backend_request(backend, "PUT"):
+        _cache_add(backend.write(nc_path, content))
+    if backend.remote:
+        sync_metrics.record_bytes(sent=len(content))
     return True
 
 
+def _dict_to_json(data: dict, indent: int = 2) -> bytes:
+    return json.dumps(data, indent=indent).encode("utf-8")
+
+
+def dict_digest(data: dict, indent: int = 2) -> str:
+    """
+    Calculates the SHA-256 digest of the JSON file `upload_dict` would upload for the given dict.
+
+    :param data: Dict to calculate the digest of
+    :param indent: Number of spaces per indent for the generated JSON
+    :return: Hex digest of the JSON file
+    """
+    return hashlib.sha256(_dict_to_json(data, indent)).hexdigest()
+
+
 @_check_initialized
 def download_file(nc_path: str, local_path: PathLike[bytes] | str) -> None:
     """
@@ -195,8 +813,9 @@ def download_file(nc_path: str, local_path: PathLike[bytes] | str) -> None:
     :param local_path: Local path to save the file
     :raises NextcloudException: If the file does not exist on the server
     """
+    content = _read(nc_path)
     with open(local_path, "wb") as file:
-        file.write(nc.files.download(nc_path))
+        file.write(content)
 
 
 @_check_initialized
@@ -208,8 +827,16 @@ def download_dict(nc_path: str) -> dict:
     :raises NextcloudException: If the file does not exist on the server
 
     """
-    byte_stream = nc.files.download(path=nc_path)
-    return json.loads(byte_stream.decode("utf-8"))
+    return json.loads(_read(nc_path).decode("utf-8"))
+
+
+def _read(nc_path: str) -> bytes:
+    backend = get_backend(nc_path)
+    with _backend_request(backend, "GET"):
+        content = backend.read(nc_path)
+    if backend.remote:
+        sync_metrics.record_bytes(received=len(content))
+    return content
 
 
 @_check_initialized
@@ -221,7 +848,62 @@ def download_folder(nc_path: str, local_path: PathLike[bytes] | str) -> None:
     :param local_path: Local path to save the zip file
     :raises NextcloudException: If the folder does not exist on the server
     """
-    nc.files.download_directory_as_zip(nc_path, local_path)
+    _zip_folder(nc_path, local_path)
+
+
+@_check_initialized
+def download_folder_dicts(nc_path: str) -> dict[str, dict]:
+    """
+    Downloads a folder from the Nextcloud server as a single zip file and parses all JSON files directly inside it.
+    The archive is only stored in a temporary file, the JSON files are read from it without being extracted.
+    Example: ``download_folder_dicts("TURMX/Projects")``
+    :param nc_path: Folder path on the Nextcloud server
+    :return: dict mapping the paths of the JSON files on the Nextcloud server to their content. Files that are not valid JSON are left out.
+    :raises NextcloudException: If the folder does not exist on the server
+    :raises zipfile.BadZipFile: If the server did not send a valid zip file
+    """
+    nc_dicts = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        zip_path = os.path.join(tmp_dir, "folder.zip")
+        _zip_folder(nc_path, zip_path)
+        with zipfile.ZipFile(zip_path) as zf:
+            for member in zf.infolist():
+                # members are named "<folder name>/<file name>"
+                parts = member.filename.strip("/").split("/")
+                if member.is_dir() or len(parts) > 2 or not parts[-1].endswith(".json"):
+                    continue
+                try:
+                    with zf.open(member) as f:
+                        nc_dicts[f"{nc_path}/{parts[-1]}"] = json.load(f)
+                except ValueError as e:
+                    logger.warning(
+                        f"Skipped invalid file {member.filename} in zip of {nc_path}: {e}"
+                    )
+    return nc_dicts
+
+
+def _zip_folder(nc_path: str, zip_path: PathLike[bytes] | str) -> None:
+    """
+    Stores a folder as zip file with the members "<folder name>/<path inside the folder>". The Nextcloud server builds the archive itself,
+    for the other backends it is built from their files.
+    """
+    backend = get_backend(nc_path)
+    if backend.remote:
+        with _request_guard("GET"):
+            nc.files.download_directory_as_zip(nc_path, zip_path)
+        sync_metrics.record_bytes(received=os.path.getsize(zip_path))
+        return
+
+    nc_path = nc_path.strip("/")
+    root = os.path.dirname(nc_path)
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        dirs = [nc_path]
+        while dirs:
+            for path, file in backend.listdir(dirs.pop()).items():
+                if file.is_dir:
+                    dirs.append(path.rstrip("/"))
+                else:
+                    zf.writestr(os.path.relpath(path, root), backend.read(path))
 
 
 @_check_initialized
@@ -231,7 +913,10 @@ def delete(nc_path: str) -> None:
     Example: ``delete("Documents/test.json"), delete("Files")``
     :raises NextcloudException: If the file/folder does not exist on the server
     """
-    nc.files.delete(nc_path)
+    backend = get_backend(nc_path)
+    with _backend_request(backend, "DELETE"):
+        backend.delete(nc_path)
+    _cache_remove(nc_path)
 
 
 @_check_initialized
@@ -240,12 +925,13 @@ def mkdir(nc_path: str) -> None:
     Creates a directory on the Nextcloud server. If part of the path already exists, it will continue in this folder. No folder is overwritten
     Example: ``mkdir("Documents/example")``
     """
-    dirs = nc_path.split("/")
-    if dirs[-1] == "":
-        dirs.pop()
+    backend = get_backend(nc_path)
+    with _backend_request(backend, "MKCOL"):
+        backend.mkdir(nc_path)
+    dirs = nc_path.strip("/").split("/")
     for i in range(1, len(dirs) + 1):
         path = "/".join(dirs[:i])
-        try:
-            nc.files.mkdir(path)
-        except NextcloudException:
-            pass
+        if _listing_cache is not None:
+            with _listing_cache_lock:
+                _listing_cache.pop(path, None)
+                _listing_cache.pop(os.path.dirname(path), None)
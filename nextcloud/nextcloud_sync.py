@@ -1,29 +1,287 @@
 import datetime
+import multiprocessing
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import timedelta
 from itertools import chain
 
-from django.db.models import Q
+import niquests
+from django.db import connections, transaction
+from django.db.models import F, Q, QuerySet
 from django.utils import timezone
 from nc_py_api import NextcloudException
 
+from nextcloud import progress_history, sync_metrics
 from nextcloud.nextcloud_manager import generate_observation_path
 from observation_data.models import (
     AbstractObservation,
+    ExpertObservation,
+    MonitoringObservation,
     ScheduledObservation,
     ObservationStatus,
     ObservationType,
+    Observatory,
 )
-from observation_data.serializers import get_serializer
+from observation_data.serializers import serialize_many
 import logging
 import nextcloud.nextcloud_manager as nm
 
 """
 This module retrieves the observation requests for a night and uses the nextcloud_manager to upload them to the nextcloud.
 `upload_observation()` and `update_observation()` are supposed to be triggered via a cron-Job
+Each run is limited by NC_SYNC_DEADLINE (see `nm.deadline()`). If the deadline passes or the nextcloud becomes unreachable,
+the run stops with NextcloudUnavailable. Observations that were not processed yet keep their status.
+The metrics of every run are collected by `sync_metrics.collect_metrics()`.
 """
 
 logger = logging.getLogger(__name__)
 
+# Related names of the subclasses of ScheduledObservation, used to filter them from queries on AbstractObservation
+_scheduled_models = ["monitoringobservation", "expertobservation"]
+
+# Observations changed during the current sync run, keyed by id. Only active inside a `_write_back()` context.
+_changed_observations: dict[int, AbstractObservation] | None = None
+# Progress samples recorded during the current sync run. Only active inside a `_write_back()` context.
+_progress_samples: list | None = None
+
+
+@contextmanager
+def _write_back():
+    """
+    Collects all observations passed to `_mark_changed` and writes their sync related fields to the database when the context is left,
+    using one bulk update per table inside a single transaction. Nested contexts share the outermost collection.
+    The progress samples passed to `_record_progress` are inserted in bulk as well.
+    Used as decorator for the sync functions, so a sync run costs a handful of queries instead of one UPDATE per table and save.
+    """
+    global _changed_observations, _progress_samples
+    is_outermost = _changed_observations is None
+    if is_outermost:
+        _changed_observations = {}
+        _progress_samples = []
+    try:
+        yield
+    finally:
+        if is_outermost:
+            observations = list(_changed_observations.values())
+            samples = _progress_samples
+            _changed_observations = None
+            _progress_samples = None
+            with sync_metrics.phase("write_back"):
+                _bulk_save(observations)
+                progress_history.save_samples(samples)
+
+
+def _mark_changed(obs: AbstractObservation):
+    """
+    Marks the observation to be written back to the database at the end of the sync run. Saves it directly outside a `_write_back()` context.
+    """
+    if _changed_observations is None:
+        obs.save()
+    else:
+        _changed_observations[obs.id] = obs
+
+
+def _record_progress(obs: AbstractObservation, amounts: dict | None):
+    """
+    Records the per-filter progress of the observation in the progress history at the end of the sync run. Saves it directly outside a `_write_back()` context.
+
+    :param obs: Observation the progress belongs to
+    :param amounts: Progress as returned by `progress_history.exposure_amounts`. Nothing is recorded if None.
+    """
+    if amounts is None:
+        return
+    samples = progress_history.create_samples(obs, amounts)
+    if _progress_samples is None:
+        progress_history.save_samples(samples)
+    else:
+        _progress_samples.extend(samples)
+
+
+def _bulk_save(observations: list[AbstractObservation]):
+    """
+    Writes project_status, project_completion, upload_digest, progress_cache, synced_version and (for scheduled observations) next_upload of the observations back to the database.
+    Observations whose status was changed by someone else since they were loaded (e.g. paused or deleted by their user) are not written back,
+    so the change is not reverted. They are synced again by the next run.
+    """
+    if not observations:
+        return
+
+    with transaction.atomic():
+        current_statuses = dict(
+            AbstractObservation.objects.non_polymorphic()
+            .select_for_update()
+            .filter(id__in=[obs.id for obs in observations])
+            .values_list("id", "project_status")
+        )
+        changed_since = {
+            obs.id
+            for obs in observations
+            if getattr(obs, "loaded_status", None)
+            not in (None, current_statuses.get(obs.id))
+        }
+        if changed_since:
+            logger.warning(
+                f"Not writing back {len(changed_since)} observations whose status was changed during the sync run: {sorted(changed_since)}"
+            )
+            observations = [obs for obs in observations if obs.id not in changed_since]
+
+        scheduled_observations = defaultdict(list)
+        for obs in observations:
+            sync_metrics.record_transition(
+                current_statuses.get(obs.id), obs.project_status
+            )
+            if isinstance(obs, ScheduledObservation):
+                scheduled_observations[type(obs)].append(obs)
+
+        AbstractObservation.objects.bulk_update(
+            observations,
+            [
+                "project_status",
+                "project_completion",
+                "upload_digest",
+                "progress_cache",
+                "synced_version",
+            ],
+            batch_size=500,
+        )
+        for model, objs in scheduled_observations.items():
+            model.objects.bulk_update(objs, ["next_upload"], batch_size=500)
+    logger.info(f"Wrote back {len(observations)} changed observations.")
+
+
+def map_concurrently(func, items: list, concurrency: int = 1):
+    """
+    Calls `func` for every item and yields the tuple (item, result, error) as soon as the call finishes.
+    A NextcloudException raised by `func` is returned as error, all other exceptions are propagated.
+    If an exception is propagated, e.g. NextcloudUnavailable, the calls that have not started yet are cancelled.
+    With a concurrency greater than 1, the calls are made by a bounded thread pool and the order of the results is arbitrary.
+    `func` should only do Nextcloud I/O, all database access must stay in the calling thread.
+
+    :param func: Function that is called with a single item
+    :param items: Items to call `func` with
+    :param concurrency: Maximum number of concurrent calls
+    """
+    if concurrency <= 1:
+        for item in items:
+            try:
+                yield item, func(item), None
+            except NextcloudException as e:
+                yield item, None, e
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(func, item): item for item in items}
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except NextcloudException as e:
+                    yield futures[future], None, e
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def _download_projects_archives(observatories) -> dict[str, dict]:
+    """
+    Downloads the Projects directories of the observatories as one zip file each and parses the JSON files inside.
+    If the archive of an observatory cannot be fetched, the error is logged and its files are left out, so they are downloaded one by one instead.
+
+    :param observatories: Names of the observatories
+    :return: dict mapping the paths of the files in the nextcloud to their content
+    """
+    nc_dicts = {}
+    for observatory in sorted(observatories):
+        projects_directory = nm.get_projects_directory(observatory)
+        try:
+            nc_dicts.update(nm.download_folder_dicts(projects_directory))
+        except (
+            NextcloudException,
+            zipfile.BadZipFile,
+            niquests.exceptions.RequestException,
+        ) as e:
+            logger.warning(
+                f"Failed to download {projects_directory} as zip, falling back to downloading the files one by one. Got: {e}"
+            )
+    return nc_dicts
+
+
+def _filter_observatories(observations, observatories: list[str] | None):
+    """
+    Restricts a queryset of observations to the given observatories, does nothing if observatories is None.
+    """
+    if observatories is None:
+        return observations
+    return observations.filter(observatory__in=observatories)
+
+
+def _planned_ids(plan: dict, part: str) -> list[int]:
+    """
+    Returns the ids of the observations in a part ("upload" or "update") of a plan built by `sync_plan.build_sync_plan`.
+    """
+    return [action["id"] for action in plan[part]]
+
+
+def _not_scheduled() -> Q:
+    """
+    Matches all observations that are not scheduled, i.e. are no ScheduledObservation or have no start_scheduling.
+    """
+    return Q(
+        *(
+            Q(**{f"{model}__start_scheduling__isnull": True})
+            for model in _scheduled_models
+        )
+    )
+
+
+def _due_querysets(today: datetime.date) -> list[QuerySet]:
+    """
+    Selects the scheduled observations that are due for upload today from each subclass of ScheduledObservation on its own,
+    so every query can use the index on next_upload and end_scheduling of its table.
+    """
+    return [
+        model.objects.non_polymorphic().filter(
+            next_upload__lte=today,
+            end_scheduling__gte=today,
+            start_scheduling__lte=today,
+        )
+        for model in (MonitoringObservation, ExpertObservation)
+    ]
+
+
+def _due_for_upload(today: datetime.date) -> Q:
+    """
+    Matches all scheduled observations that are due for upload today: their scheduling has started, has not ended yet and their next upload has come.
+    The due observations are selected by a subquery per subclass (see `_due_querysets`) instead of conditions on the joined subclass tables,
+    which could not use the indexes.
+    """
+    return Q(
+        *(Q(id__in=queryset.values("pk")) for queryset in _due_querysets(today)),
+        _connector=Q.OR,
+    )
+
+
+def upload_order_key(
+    priority: int,
+    start_observation: datetime.datetime | None,
+    created_at: datetime.datetime,
+    obs_id: int,
+) -> tuple:
+    """
+    Sort key of the upload queue: higher priority first, then time-critical observations with the earliest start, then the oldest.
+
+    :return: tuple to sort the observations by
+    """
+    return (
+        -priority,
+        start_observation is None,
+        start_observation or created_at,
+        created_at,
+        obs_id,
+    )
+
 
 def calc_progress(observation: dict) -> float:
     """
@@ -45,7 +303,9 @@ def calc_progress(observation: dict) -> float:
     return round((accepted_amount / required_amount) * 100, 2)
 
 
-def get_data_from_nc(obs: AbstractObservation, day_now=None):
+def get_data_from_nc(
+    obs: AbstractObservation, day_now=None, index=None, prefetched=None
+):
     """
     Downloads the dict of the observation from the nextcloud.
     If an error occurs, it will be logged and the status set to error.
@@ -53,29 +313,109 @@ def get_data_from_nc(obs: AbstractObservation, day_now=None):
 
     :param obs: Observation to retrieve the dict from.
     :param day_now: date; default=None. Can be changed for debugging purposes.
+    :param index: Observation index used to look up the file; default=None lists the directory of the observation.
+        With an index, the download is skipped if the ETag of the file has not changed since the last download.
+    :param prefetched: Optional dict of already downloaded files ({nc_path: dict}), e.g. from `_download_projects_archives`.
 
     :return: the dictionary of the observation, the nc_path and an indicator if the "endDateTime" has passed. The progress is None if an error occurs.
     """
     try:
-        nc_path = nm.get_observation_file(obs)
+        nc_path = nm.get_observation_file(obs, index)
 
         if nc_path is None:
-            logger.error(
-                f"Expected observation {obs.id} with target {obs.target.name} to be uploaded in nextcloud to retrieve progress, but could not find it under expected path: {generate_observation_path(obs)}"
-            )
+            _log_missing_file(obs)
             return None, None, None
 
-        nc_dict = nm.download_dict(nc_path)
+        etag = index[obs.id].etag if index is not None else ""
+        cached_progress = _get_cached_progress(obs, etag, day_now)
+        if cached_progress is not None:
+            partial_progress, past_time = cached_progress
+            return partial_progress, nc_path, past_time
+
+        if prefetched and nc_path in prefetched:
+            nc_dict = prefetched[nc_path]
+        else:
+            nc_dict = nm.download_dict(nc_path)
     except NextcloudException as e:
-        logger.error(
-            f"Expected observation {obs.id} with target {obs.target.name} to be uploaded in nextcloud to retrieve progress, but got: {e}"
-        )
+        _log_download_error(obs, e)
         return None, None, None
 
-    partial_progress = calc_progress(nc_dict)
+    _cache_progress(obs, nc_dict, etag)
+    partial_progress, past_time = get_progress_from_dict(nc_dict, day_now)
+    return partial_progress, nc_path, past_time
+
+
+def _cache_progress(obs: AbstractObservation, nc_dict: dict, etag: str):
+    """
+    Stores the progress, per-filter progress and "endDateTime" of a downloaded progress file with its ETag, so the next download can be skipped if the file has not changed.
+
+    :param obs: Observation the progress file belongs to
+    :param nc_dict: Downloaded observation dict
+    :param etag: ETag of the file at the time it was listed. Nothing is cached without an ETag.
+    """
+    obs.progress_cache = (
+        {
+            "etag": etag,
+            "progress": calc_progress(nc_dict),
+            "exposures": progress_history.exposure_amounts(nc_dict),
+            "endDateTime": nc_dict["targets"][0]["endDateTime"],
+        }
+        if etag
+        else None
+    )
+
+
+def _get_cached_progress(obs: AbstractObservation, etag: str, day_now=None):
+    """
+    Returns the cached progress of the observation if its progress file has not changed since the last download.
+
+    :param obs: Observation
+    :param etag: Current ETag of the progress file
+    :param day_now: date; default=None. Can be changed for debugging purposes.
+
+    :return: the progress and an indicator if the "endDateTime" has passed, or None if the file has to be downloaded
+    """
+    cache = obs.progress_cache
+    if not etag or not cache or cache.get("etag") != etag:
+        return None
+    return cache["progress"], _end_date_passed(cache["endDateTime"], day_now)
+
+
+def _log_missing_file(obs: AbstractObservation):
+    logger.error(
+        f"Expected observation {obs.id} with target {obs.target.name} to be uploaded in nextcloud to retrieve progress, but could not find it under expected path: {generate_observation_path(obs)}"
+    )
+
+
+def _log_download_error(obs: AbstractObservation, error: NextcloudException):
+    logger.error(
+        f"Expected observation {obs.id} with target {obs.target.name} to be uploaded in nextcloud to retrieve progress, but got: {error}"
+    )
+
+
+def get_progress_from_dict(nc_dict: dict, day_now=None):
+    """
+    Calculates the progress of an observation dict downloaded from the nextcloud and checks whether its "endDateTime" has passed.
+
+    :param nc_dict: Observation as dict
+    :param day_now: date; default=None. Can be changed for debugging purposes.
+
+    :return: the progress and an indicator if the "endDateTime" has passed
+    """
+    return calc_progress(nc_dict), _end_date_passed(
+        nc_dict["targets"][0]["endDateTime"], day_now
+    )
+
+
+def _end_date_passed(dt_str: str, day_now=None) -> bool:
+    """
+    Checks whether the "endDateTime" of an observation dict has passed.
+
+    :param dt_str: "endDateTime" of the observation dict, may be empty
+    :param day_now: date; default=None. Can be changed for debugging purposes.
+    """
     past_time = False
-    if nc_dict["targets"][0]["endDateTime"] != "":
-        dt_str = nc_dict["targets"][0]["endDateTime"]
+    if dt_str != "":
         fmt = "%Y-%m-%d %H:%M:%S.%f" if "." in dt_str else "%Y-%m-%d %H:%M:%S"
         end_date = timezone.make_aware(
             datetime.datetime.strptime(dt_str, fmt),
@@ -95,12 +435,29 @@ def get_data_from_nc(obs: AbstractObservation, day_now=None):
         if end_date <= date_now:
             past_time = True
 
-    return partial_progress, nc_path, past_time
+    return past_time
 
 
-def update_non_scheduled_observations(today: datetime.date = timezone.now().date()):
+@sync_metrics.collect_metrics("update")
+@nm.deadline()
+@nm.listing_cache()
+@_write_back()
+def update_non_scheduled_observations(
+    today: datetime.date = timezone.now().date(),
+    concurrency: int = 1,
+    bulk: bool = False,
+    observatories: list[str] | None = None,
+    plan: dict | None = None,
+):
     """
     Downloads all non-scheduled observations from the nextcloud, checks for progress and updates database accordingly.
+    The progress files are downloaded and parsed first, afterward all status transitions and deletions are applied in one pass.
+
+    :param today: datetime.date; default=timezone.now().date(). Can be changed for debugging purposes.
+    :param concurrency: Maximum number of concurrent downloads; default=1 downloads one file after another.
+    :param bulk: Download the Projects directory of each observatory as a single zip instead of every file on its own; default=False.
+    :param observatories: Names of the observatories whose observations are synced; default=None syncs all observations.
+    :param plan: Plan built by `sync_plan.build_sync_plan`; default=None. If passed, only the observations of the plan are synced.
     """
     try:
         nm.initialize_connection()
@@ -108,18 +465,24 @@ def update_non_scheduled_observations(today: datetime.date = timezone.now().date
         logger.error(f"Failed to initialize connection: {e}")
         return
 
-    observations = AbstractObservation.objects.filter(
-        project_status__in=[ObservationStatus.UPLOADED, ObservationStatus.PAUSED]
+    with sync_metrics.phase("listing"):
+        index = nm.build_observation_index(observatories)
+    observations = _filter_observatories(
+        AbstractObservation.objects.filter(
+            project_status__in=[ObservationStatus.UPLOADED, ObservationStatus.PAUSED]
+        ),
+        observatories,
     )
+    if plan is not None:
+        observations = observations.filter(id__in=_planned_ids(plan, "update"))
 
     excluded_observations = []
-    for obs in observations:
-        if isinstance(obs, ScheduledObservation) and obs.start_scheduling:
-            excluded_observations.append(obs)
-        if obs.project_status == ObservationStatus.PAUSED and not nm.file_exists(
-            nm.generate_observation_path(obs)
-        ):
-            excluded_observations.append(obs)
+    with sync_metrics.phase("db_query"):
+        for obs in observations:
+            if isinstance(obs, ScheduledObservation) and obs.start_scheduling:
+                excluded_observations.append(obs)
+            if obs.project_status == ObservationStatus.PAUSED and obs.id not in index:
+                excluded_observations.append(obs)
 
     observations = observations.exclude(
         id__in=[obs.id for obs in excluded_observations]
@@ -129,20 +492,78 @@ def update_non_scheduled_observations(today: datetime.date = timezone.now().date
         f"Got {len(observations)} non-scheduled observations to check for updates."
     )
 
-    for obs in observations:
-        progress, nc_path, past_time = get_data_from_nc(obs, today)
-        if (
-            progress is None or nc_path is None
-        ):  # an error occurred and has already been logged
-            obs.project_status = ObservationStatus.ERROR
-            obs.save()
-            continue
+    # Looking up the files needs the database, the downloads are made concurrently.
+    # Files whose ETag has not changed since the last run are not downloaded again.
+    downloads = []
+    progresses = []
+    with sync_metrics.phase("db_query"):
+        for obs in observations:
+            nc_path = nm.get_observation_file(obs, index)
+            if nc_path is None:
+                _log_missing_file(obs)
+                obs.project_status = ObservationStatus.ERROR
+                _mark_changed(obs)
+                continue
+            cached_progress = _get_cached_progress(obs, index[obs.id].etag, today)
+            if cached_progress is not None:
+                progresses.append(
+                    (
+                        obs,
+                        nc_path,
+                        *cached_progress,
+                        obs.progress_cache.get("exposures"),
+                    )
+                )
+                continue
+            downloads.append((obs, nc_path))
+
+    logger.info(
+        f"Downloading {len(downloads)} progress files, {len(progresses)} progress files are unchanged."
+    )
+    with sync_metrics.phase("download"):
+        prefetched = (
+            _download_projects_archives({obs.observatory_id for obs, _ in downloads})
+            if bulk and downloads
+            else {}
+        )
+        for (obs, nc_path), nc_dict, error in chain(
+            [
+                (download, prefetched[download[1]], None)
+                for download in downloads
+                if download[1] in prefetched
+            ],
+            map_concurrently(
+                lambda download: nm.download_dict(download[1]),
+                [download for download in downloads if download[1] not in prefetched],
+                concurrency,
+            ),
+        ):
+            if error is not None:
+                _log_download_error(obs, error)
+                obs.project_status = ObservationStatus.ERROR
+                _mark_changed(obs)
+                continue
+            _cache_progress(obs, nc_dict, index[obs.id].etag)
+            progress, past_time = get_progress_from_dict(nc_dict, today)
+            progresses.append(
+                (
+                    obs,
+                    nc_path,
+                    progress,
+                    past_time,
+                    progress_history.exposure_amounts(nc_dict),
+                )
+            )
+
+    for obs, nc_path, progress, past_time, amounts in progresses:
+        _record_progress(obs, amounts)
         if progress != obs.project_completion:
             obs.project_completion = progress
         if progress == 100.0:
             obs.project_status = ObservationStatus.COMPLETED
             try:
-                nm.delete(nc_path)
+                with sync_metrics.phase("delete"):
+                    nm.delete(nc_path)
                 logger.info(
                     f"Deleted observation {obs.id} with target {obs.target.name} from nextcloud as it is completed. Set status to {ObservationStatus.COMPLETED}!"
                 )
@@ -151,14 +572,15 @@ def update_non_scheduled_observations(today: datetime.date = timezone.now().date
                     f"Tried to delete observation {obs.id} with target {obs.target.name} because progress is 100, but got: {e}"
                 )
                 obs.project_status = ObservationStatus.ERROR
-                obs.save()
+                _mark_changed(obs)
         if past_time:
             if progress == 0.0:
                 obs.project_status = ObservationStatus.FAILED
             else:
                 obs.project_status = ObservationStatus.COMPLETED
             try:
-                nm.delete(nc_path)
+                with sync_metrics.phase("delete"):
+                    nm.delete(nc_path)
                 logger.info(
                     f"Deleted observation {obs.id} with target {obs.target.name} from nextcloud as it is completed. Set status to {ObservationStatus.COMPLETED}!"
                 )
@@ -167,15 +589,27 @@ def update_non_scheduled_observations(today: datetime.date = timezone.now().date
                     f"Tried to delete observation {obs.id} with target {obs.target.name} because progress is 100, but got: {e}"
                 )
                 obs.project_status = ObservationStatus.ERROR
-                obs.save()
-        obs.save()
+                _mark_changed(obs)
+        _mark_changed(obs)
 
 
-def update_scheduled_observations(today: datetime.date = timezone.now().date()):
+@sync_metrics.collect_metrics("update")
+@nm.deadline()
+@nm.listing_cache()
+@_write_back()
+def update_scheduled_observations(
+    today: datetime.date = timezone.now().date(),
+    bulk: bool = False,
+    observatories: list[str] | None = None,
+    plan: dict | None = None,
+):
     """
     Downloads all scheduled observations from the nextcloud, checks for progress and updates database accordingly.
 
     :param today: datetime.date; default=timezone.now().date(). Can be changed for debugging purposes.
+    :param bulk: Download the Projects directory of each observatory as a single zip instead of every file on its own; default=False.
+    :param observatories: Names of the observatories whose observations are synced; default=None syncs all observations.
+    :param plan: Plan built by `sync_plan.build_sync_plan`; default=None. If passed, only the observations of the plan are synced.
     """
     try:
         nm.initialize_connection()
@@ -183,20 +617,26 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
         logger.error(f"Failed to initialize connection: {e}")
         return
 
-    observations = AbstractObservation.objects.instance_of(ScheduledObservation).filter(
-        Q(project_status=ObservationStatus.PENDING)
-        | Q(project_status=ObservationStatus.UPLOADED)
-        | Q(project_status=ObservationStatus.PAUSED)
+    with sync_metrics.phase("listing"):
+        index = nm.build_observation_index(observatories)
+    observations = _filter_observatories(
+        AbstractObservation.objects.instance_of(ScheduledObservation).filter(
+            Q(project_status=ObservationStatus.PENDING)
+            | Q(project_status=ObservationStatus.UPLOADED)
+            | Q(project_status=ObservationStatus.PAUSED)
+        ),
+        observatories,
     )
+    if plan is not None:
+        observations = observations.filter(id__in=_planned_ids(plan, "update"))
 
     excluded_observations = []
-    for obs in observations:
-        if not obs.start_scheduling:
-            excluded_observations.append(obs)
-        if obs.project_status == ObservationStatus.PAUSED and not nm.file_exists(
-            nm.generate_observation_path(obs)
-        ):
-            excluded_observations.append(obs)
+    with sync_metrics.phase("db_query"):
+        for obs in observations:
+            if not obs.start_scheduling:
+                excluded_observations.append(obs)
+            if obs.project_status == ObservationStatus.PAUSED and obs.id not in index:
+                excluded_observations.append(obs)
 
     observations = observations.exclude(
         id__in=[obs.id for obs in excluded_observations]
@@ -204,6 +644,19 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
 
     logger.info(f"Got {len(observations)} scheduled observations to check for updates.")
 
+    prefetched = {}
+    if bulk:
+        with sync_metrics.phase("download"):
+            prefetched = _download_projects_archives(
+                {
+                    obs.observatory_id
+                    for obs in observations
+                    if obs.project_status == ObservationStatus.UPLOADED
+                    and obs.id in index
+                    and _get_cached_progress(obs, index[obs.id].etag) is None
+                }
+            )
+
     for obs in observations:
         # Calculates the progress of a scheduled observation. Only considers the continuance of the days, not whether pictures were actually taken.
         duration = (obs.end_scheduling - obs.start_scheduling).days + 1
@@ -219,7 +672,13 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
             # If an observation has reached 100.0% project_completion (i.e. the time windows has passed), it is considered done regardless the actual pictures taken.
             if obs.project_status == ObservationStatus.UPLOADED:
                 try:
-                    nm.delete(nm.generate_observation_path(obs))
+                    nc_path = nm.get_observation_file(
+                        obs, index
+                    ) or nm.generate_observation_path(obs)
+                    if nc_path is None:
+                        continue  # has no observatory and was set to ERROR
+                    with sync_metrics.phase("delete"):
+                        nm.delete(nc_path)
                     logger.info(
                         f"Deleted observation {obs.id} with target {obs.target.name} from nextcloud as it is completed. Set status to {ObservationStatus.COMPLETED}."
                     )
@@ -228,10 +687,10 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
                         f"Tried to delete observation {obs.id} with target {obs.target.name} because it has reached its scheduled end, but got: {e}"
                     )
                     obs.project_status = ObservationStatus.ERROR
-                    obs.save()
+                    _mark_changed(obs)
                     continue
             obs.project_status = ObservationStatus.COMPLETED
-            obs.save()
+            _mark_changed(obs)
             continue
 
         if (
@@ -240,13 +699,16 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
         ):
             # If the status is pending or paused, the observation currently waits for the next upload during its scheduling and the prior partial observation is finished.
             # No further actions required.
-            obs.save()
+            _mark_changed(obs)
             continue
 
-        partial_progress, nc_path, past_time = get_data_from_nc(obs, today)
+        with sync_metrics.phase("download"):
+            partial_progress, nc_path, past_time = get_data_from_nc(
+                obs, today, index, prefetched
+            )
         if partial_progress is None:  # has already been logged
             obs.project_status = ObservationStatus.ERROR
-            obs.save()
+            _mark_changed(obs)
             continue
 
         if past_time:
@@ -274,13 +736,14 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
         ):
             # Checking uploaded expert observations, even if their partial progress is not 100.0%. If the observation time has passed, the observation is considered done.
             try:
-                nm_dict = nm.download_dict(nc_path)
+                with sync_metrics.phase("download"):
+                    nm_dict = nm.download_dict(nc_path)
             except NextcloudException as e:
                 logger.error(
                     f"Failed to download observation {obs.id} with target {obs.target.name} because progress is 0, but got: {e}"
                 )
                 obs.project_status = ObservationStatus.ERROR
-                obs.save()
+                _mark_changed(obs)
                 continue
             target_date = timezone.make_aware(
                 datetime.datetime.strptime(
@@ -302,7 +765,8 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
             # If an observation has reached 100.0% partial completion, it is deleted from the nextcloud since no images have to be taken until it is uploaded again
             try:
                 obs.project_status = ObservationStatus.PENDING  # set status to pending to indicate observation currently does NOT exist in the nextcloud.
-                nm.delete(nc_path)
+                with sync_metrics.phase("delete"):
+                    nm.delete(nc_path)
                 logger.info(
                     f"Deleted observation {obs.id} with target {obs.target.name} from nextcloud as it is partially completed. Set status to {ObservationStatus.PENDING} to prepare for new upload on {obs.next_upload}."
                 )
@@ -311,92 +775,275 @@ def update_scheduled_observations(today: datetime.date = timezone.now().date()):
                     f"Tried to delete observation {obs.id} with target {obs.target.name} because partial progress is 100, but got: {e}"
                 )
                 obs.project_status = ObservationStatus.ERROR
-            obs.save()
+            _mark_changed(obs)
 
-        obs.save()
+        _mark_changed(obs)
 
 
-def update_observations(today: datetime.date = timezone.now().date()):
+@sync_metrics.collect_metrics("update")
+@nm.deadline()
+def update_observations(
+    today: datetime.date = timezone.now().date(),
+    concurrency: int = 1,
+    bulk: bool = False,
+    observatories: list[str] | None = None,
+    plan: dict | None = None,
+):
     """
     Wrapper method for calling 'download_non_scheduled_observations' and 'download_scheduled_observations'.
 
     :param today: datetime; default=timezone.now().date. Can be changed for debugging purposes.
+    :param concurrency: Maximum number of concurrent downloads of progress files.
+    :param bulk: Download the Projects directory of each observatory as a single zip instead of every progress file on its own.
+        Falls back to single downloads if an archive cannot be fetched.
+    :param observatories: Names of the observatories whose observations are synced; default=None syncs all observations.
+    :param plan: Plan built by `sync_plan.build_sync_plan`; default=None. If passed, only the observations of the plan are synced.
     """
-    update_non_scheduled_observations(today)
-    update_scheduled_observations(today)
+    update_non_scheduled_observations(today, concurrency, bulk, observatories, plan)
+    update_scheduled_observations(today, bulk, observatories, plan)
 
 
-def upload_observations(today: datetime.date = timezone.now().date()):
+@sync_metrics.collect_metrics("upload")
+@nm.deadline()
+@nm.listing_cache()
+@_write_back()
+def upload_observations(
+    today: datetime.date = timezone.now().date(),
+    concurrency: int = 1,
+    observatories: list[str] | None = None,
+    plan: dict | None = None,
+    budget_seconds: float | None = None,
+):
     """
     Uploads all observations with project_status "upload_pending" from the database to the nextcloud and updates the status accordingly.
+    Already uploaded observations are only serialized again if they were saved since their last upload (see `sync_version`)
+    or are scheduled, and only uploaded again if their JSON representation has changed. Uploaded observations without
+    `upload_digest` (uploaded before the digest was stored) are not uploaded again, their digest is stored instead,
+    unless they were saved since the migration added `sync_version`.
+    The observations are uploaded by priority, then by the start of their observation window and age (see `upload_order_key`).
 
     :param today: datetime; default=timezone.now(). Can be changed for debugging purposes.
+    :param concurrency: Maximum number of concurrent uploads; default=1 uploads one observation after another.
+    :param observatories: Names of the observatories whose observations are synced; default=None syncs all observations.
+    :param plan: Plan built by `sync_plan.build_sync_plan`; default=None. If passed, only the observations of the plan are uploaded.
+    :param budget_seconds: Time the run may take; default=None has no limit. Uploads that did not start in time are deferred to the
+        next run, their observations are left unchanged.
+    :return: dict with the number of "new", "changed", "skipped", "failed" and "deferred" uploads
     """
+    start = time.monotonic()
     try:
         nm.initialize_connection()
     except NextcloudException as e:
         logger.error(f"Failed to initialize connection: {e}")
         return
 
-    # Handling of observations, that can be uploaded anytime (all non-scheduled observations)
-    pending_observations = AbstractObservation.objects.filter(
-        Q(project_status=ObservationStatus.PENDING)
-        | Q(project_status=ObservationStatus.UPLOADED)
+    # Observations that can be uploaded anytime (all non-scheduled observations) and scheduled observations that are due today.
+    # Uploaded observations are only considered if they were changed since their last upload or are scheduled and due.
+    pending_observations = _filter_observatories(
+        AbstractObservation.objects.filter(
+            (
+                Q(project_status=ObservationStatus.PENDING)
+                | Q(
+                    project_status=ObservationStatus.UPLOADED,
+                    sync_version__gt=F("synced_version"),
+                )
+            )
+            & _not_scheduled()
+            | Q(
+                project_status__in=[
+                    ObservationStatus.PENDING,
+                    ObservationStatus.UPLOADED,
+                ]
+            )
+            & _due_for_upload(today)
+        ),
+        observatories,
     )
+    if plan is not None:
+        pending_observations = pending_observations.filter(
+            id__in=_planned_ids(plan, "upload")
+        )
 
-    scheduled_observations = []
-    excluded_observations = []
-    for obs in pending_observations:
-        if (
-            isinstance(obs, ScheduledObservation)
-            and obs.start_scheduling
-            and (
-                obs.project_status == ObservationStatus.PENDING
-                or obs.project_status == ObservationStatus.UPLOADED
+    with sync_metrics.phase("db_query"):
+        # Upload all pending_observation to Nextcloud, the most important first.
+        list_to_upload = sorted(
+            pending_observations,
+            key=lambda obs: upload_order_key(
+                obs.priority,
+                getattr(obs, "start_observation", None),
+                obs.created_at,
+                obs.id,
+            ),
+        )
+    logger.info(f"Uploading {len(list_to_upload)} observations ...")
+
+    # Serialization needs the database and therefore happens before the (possibly concurrent) uploads
+    with sync_metrics.phase("listing"):
+        index = nm.build_observation_index(observatories)
+    with sync_metrics.phase("serialization"):
+        with_observatory = [obs for obs in list_to_upload if obs.observatory_id]
+        obs_dicts = serialize_many(with_observatory)
+        paths = nm.generate_observation_paths(with_observatory)
+        summary = {"new": 0, "changed": 0, "skipped": 0, "failed": 0, "deferred": 0}
+        uploads = []
+        for obs in list_to_upload:
+            if not obs.observatory:
+                obs.project_status = ObservationStatus.ERROR
+                logger.warning(f"Observation {obs.id} has no observatory assigned.")
+                _mark_changed(obs)
+                summary["failed"] += 1
+                continue
+
+            obs_dict = obs_dicts[obs.id]
+            nc_path = paths[obs.id]
+            digest = nm.dict_digest(obs_dict)
+            # Observations uploaded before digests were stored have none. They are assumed to be unchanged,
+            # unless they were saved since the migration (which left them one version ahead of synced_version).
+            unknown_digest = (
+                not obs.upload_digest and obs.sync_version <= obs.synced_version + 1
             )
+
+            if obs.project_status != ObservationStatus.UPLOADED:
+                kind = "new"
+            elif (
+                not unknown_digest and obs.upload_digest != digest
+            ) or nm.get_observation_file(obs, index) != nc_path:
+                kind = "changed"
+            else:
+                # Uploading the same JSON again would only reset the progress NINA has written into the file.
+                obs.upload_digest = digest
+                obs.synced_version = obs.sync_version
+                _mark_changed(obs)
+                summary["skipped"] += 1
+                continue
+            uploads.append((obs, obs_dict, nc_path, digest, kind))
+
+    def upload_within_budget(upload) -> bool:
+        if budget_seconds is not None and time.monotonic() - start > budget_seconds:
+            return False
+        nm.upload_dict(upload[2], upload[1])
+        return True
+
+    with sync_metrics.phase("upload"):
+        for (obs, obs_dict, nc_path, digest, kind), uploaded, error in map_concurrently(
+            upload_within_budget, uploads, concurrency
         ):
-            scheduled_observations.append(obs)
-        elif obs.project_status == ObservationStatus.UPLOADED:
-            excluded_observations.append(obs)
+            if error is None and not uploaded:
+                summary["deferred"] += 1
+                continue
+            if error is None:
+                logger.info(
+                    f"Uploaded observation {obs_dict['name']} with id {obs.id} to {nc_path}"
+                )
+                obs.project_status = ObservationStatus.UPLOADED
+                obs.upload_digest = digest
+                obs.synced_version = obs.sync_version
+                summary[kind] += 1
+            else:
+                logger.error(
+                    f"Failed to upload observation {obs.id} to {nc_path}. Got: {error}"
+                )
+                obs.project_status = ObservationStatus.ERROR
+                summary["failed"] += 1
+            _mark_changed(obs)
 
-    pending_observations = pending_observations.exclude(
-        id__in=[obs.id for obs in scheduled_observations]
-    )  # exclude all scheduled observations
+    logger.info(
+        f"Uploaded {summary['new']} new and {summary['changed']} changed observations, skipped {summary['skipped']} unchanged observations, {summary['failed']} uploads failed."
+    )
+    if summary["deferred"]:
+        logger.warning(
+            f"Deferred {summary['deferred']} uploads to the next run, as the budget of {budget_seconds}s was used up."
+        )
+    return summary
 
-    # Handling of Scheduled Observation. If Observation is due today, it is included in pending_observation
-    for obs in scheduled_observations:
-        if obs.start_scheduling > today or obs.end_scheduling < today:
-            continue
-        if today < obs.next_upload:
-            continue
-        pending_observations = chain(pending_observations, [obs])
 
-    # Upload all pending_observation to Nextcloud.
-    list_to_upload = list(pending_observations)
-    logger.info(f"Uploading {len(list_to_upload)} observations ...")
+def _run_shard(job: str, observatory: str, kwargs: dict):
+    """
+    Runs a sync job for the observations of a single observatory. Used as the task of the worker processes of `run_sharded`.
+    The metrics of each shard are reported as job "<job>_<observatory>".
 
-    for obs in list_to_upload:
-        if not obs.observatory:
-            obs.project_status = ObservationStatus.ERROR
-            logger.warning(f"Observation {obs.id} has no observatory assigned.")
-            obs.save()
-            continue
+    :param job: "upload" or "update"
+    :param observatory: Name of the observatory
+    :param kwargs: Further keyword arguments of the job
+    :return: tuple of the return value of the job and its duration in seconds
+    """
+    start = time.monotonic()
+    with sync_metrics.collect_metrics(f"{job}_{observatory}"):
+        result = _shard_jobs[job](observatories=[observatory], **kwargs)
+    return result, time.monotonic() - start
 
-        serializer_class = get_serializer(obs.observation_type)
-        serializer = serializer_class(obs)
 
-        obs_dict = serializer.data
-        nc_path = nm.generate_observation_path(obs)
-        try:
-            nm.upload_dict(nc_path, obs_dict)
-            logger.info(
-                f"Uploaded observation {obs_dict['name']} with id {obs.id} to {nc_path}"
-            )
-            obs.project_status = ObservationStatus.UPLOADED
+def run_sharded(
+    job: str,
+    observatories: list[str] | None = None,
+    processes: int | None = None,
+    **kwargs,
+) -> dict:
+    """
+    Runs `upload_observations` or `update_observations` once per observatory, each in its own process with its own nextcloud session
+    and database connection. A slow or unreachable observatory therefore does not hold up the others.
+    Observations without an observatory are not synced in this mode.
+
+    :param job: "upload" or "update"
+    :param observatories: Names of the observatories to sync; default=None syncs all observatories in the database.
+    :param processes: Maximum number of worker processes; default=None uses one per observatory. With 1, the shards run in this process.
+    :param kwargs: Further keyword arguments of the job, e.g. today or concurrency
+    :return: dict with the summary of every shard ({"result", "duration", "error"}) under "shards" and the sums of the numeric
+        results of all shards (e.g. "new" and "failed" of the upload) under "total"
+    """
+    if observatories is None:
+        observatories = list(Observatory.objects.values_list("name", flat=True))
+
+    shard_results = {}
+    if processes == 1 or len(observatories) <= 1:
+        for observatory in observatories:
+            try:
+                shard_results[observatory] = _run_shard(job, observatory, kwargs)
+            except Exception as e:
+                shard_results[observatory] = e
+    else:
+        # The connections are re-opened by each process on its own instead of sharing the sockets of this process
+        connections.close_all()
+        with (
+            ProcessPoolExecutor(
+                max_workers=processes or len(observatories),
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=nm.reset_connection,  # workers must not reuse the client and sockets of this process
+            ) as executor
+        ):
+            futures = {
+                executor.submit(_run_shard, job, observatory, kwargs): observatory
+                for observatory in observatories
+            }
+            for future in as_completed(futures):
+                try:
+                    shard_results[futures[future]] = future.result()
+                except Exception as e:
+                    shard_results[futures[future]] = e
 
-        except NextcloudException as e:
+    summary = {"shards": {}, "total": defaultdict(int)}
+    for observatory in sorted(shard_results):
+        if isinstance(shard_results[observatory], Exception):
             logger.error(
-                f"Failed to upload observation {obs.id} to {nc_path}. Got: {e}"
+                f"Sharded {job} of observatory {observatory} failed: {shard_results[observatory]}"
             )
-            obs.project_status = ObservationStatus.ERROR
-        obs.save()
+            summary["shards"][observatory] = {
+                "result": None,
+                "duration": None,
+                "error": str(shard_results[observatory]),
+            }
+            continue
+        result, duration = shard_results[observatory]
+        logger.info(f"Sharded {job} of observatory {observatory} took {duration:.2f}s")
+        summary["shards"][observatory] = {
+            "result": result,
+            "duration": duration,
+            "error": None,
+        }
+        for key, value in (result or {}).items():
+            summary["total"][key] += value
+    summary["total"] = dict(summary["total"])
+    return summary
+
+
+_shard_jobs = {"upload": upload_observations, "update": update_observations}
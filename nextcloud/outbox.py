@@ -0,0 +1,198 @@
+"""
+This module carries out the nextcloud writes requested by views through the outbox (see `OutboxEntry`).
+Views only write an entry in the same transaction as the status change of the observation, `process_outbox()` is run by the
+`process_outbox` command or the sync daemon and retries failed writes with an increasing delay.
+Deletions are only due once the observing night is over (see `deletion_due`), so NINA does not lose an observation while it is scheduling.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from nc_py_api import NextcloudException
+
+import nextcloud.nextcloud_manager as nm
+from nextcloud.models import OutboxAction, OutboxEntry
+from nextcloud.nextcloud_sync import map_concurrently
+from nextcloud.progress_history import night_of, night_start_hour
+from observation_data.models import AbstractObservation, ObservationStatus
+from observation_data.serializers import serialize_many
+
+logger = logging.getLogger(__name__)
+
+# Status the observation must still have for the action to be carried out. Otherwise, the entry is outdated.
+_expected_status = {
+    OutboxAction.PAUSE: [ObservationStatus.PAUSED],
+    OutboxAction.RESUME: [ObservationStatus.PENDING],
+    OutboxAction.DELETE: [
+        ObservationStatus.PENDING_DELETION,
+        ObservationStatus.PENDING_COMPLETION,
+    ],
+}
+
+
+def deletion_due(now: datetime | None = None) -> datetime:
+    """
+    Returns the time a deletion requested at `now` is due, i.e. the end of the current observing night.
+
+    :param now: datetime; default=None uses the current time
+    """
+    night = night_of(now or timezone.now())
+    return timezone.make_aware(
+        datetime.combine(night + timedelta(days=1), time(night_start_hour))
+    )
+
+
+def _carry_out(write: tuple):
+    """
+    Uploads or deletes the file of an entry. Files that are already gone count as deleted.
+    """
+    entry, _, nc_path, obs_dict = write
+    if entry.action != OutboxAction.DELETE:
+        nm.upload_dict(nc_path, obs_dict)
+    elif nc_path is not None:
+        try:
+            nm.delete(nc_path)
+        except NextcloudException as e:
+            if e.status_code != 404:
+                raise
+
+
+@nm.listing_cache()
+def process_outbox(
+    concurrency: int = 1,
+    max_attempts: int = 5,
+    retry_delay: timedelta = timedelta(minutes=1),
+) -> dict | None:
+    """
+    Carries out all due entries of the outbox. Only the latest entry of each observation is carried out, older ones are dropped.
+    Paused observations are uploaded again, so NINA skips them. Resumed observations are uploaded again and set to UPLOADED if
+    they are still in the nextcloud, otherwise they are left PENDING for the next `upload_observations`.
+    Deleted observations are deleted from the nextcloud and the database, finished ones are deleted from the nextcloud and set to COMPLETED.
+    A failed write is retried with a doubled delay each time. After `max_attempts` the observation is set to ERROR,
+    unless it is to be deleted: it is then left to `process_pending_deletion`.
+
+    :param concurrency: Maximum number of concurrent uploads and deletions
+    :param max_attempts: Maximum number of attempts per entry
+    :param retry_delay: Delay before the first retry
+    :return: dict with the number of "done", "retried" and "failed" entries, or None if the nextcloud could not be reached
+    """
+    try:
+        nm.get_connection()
+    except NextcloudException as e:
+        logger.error(f"Failed to initialize connection: {e}")
+        return None
+
+    entries = list(
+        OutboxEntry.objects.filter(next_attempt__lte=timezone.now()).order_by("id")
+    )
+    latest_entries = {entry.observation_id: entry for entry in entries}
+    OutboxEntry.objects.filter(
+        id__in=[entry.id for entry in entries if entry not in latest_entries.values()]
+    ).delete()
+    observations = AbstractObservation.objects.in_bulk(latest_entries.keys())
+
+    report = {"done": 0, "retried": 0, "failed": 0}
+    uploads = []
+    deletions = []
+    for obs_id, entry in latest_entries.items():
+        obs = observations[obs_id]
+        if obs.project_status not in _expected_status[entry.action]:
+            entry.delete()  # the observation was changed since
+            report["done"] += 1
+            continue
+
+        nc_path = nm.get_observation_file(obs)
+        if entry.action == OutboxAction.DELETE:
+            deletions.append((entry, obs, nc_path, None))
+            continue
+        if nc_path is None:
+            if entry.action == OutboxAction.RESUME:
+                entry.delete()  # will be uploaded by upload_observations
+                report["done"] += 1
+                continue
+            nc_path = nm.generate_observation_path(obs)
+            if nc_path is None:
+                logger.error(
+                    f"{entry.action} of observation {obs.id} failed, as it has no observatory. Set status to {ObservationStatus.ERROR}."
+                )
+                entry.delete()
+                report["failed"] += 1
+                continue
+
+        uploads.append((entry, obs, nc_path))
+
+    obs_dicts = serialize_many([obs for _, obs, _ in uploads])
+    uploads = [
+        (entry, obs, nc_path, obs_dicts[obs.id]) for entry, obs, nc_path in uploads
+    ]
+
+    for (entry, obs, nc_path, obs_dict), _, error in map_concurrently(
+        _carry_out, uploads + deletions, concurrency
+    ):
+        if error is None and entry.action == OutboxAction.DELETE:
+            logger.info(
+                f"{entry.action} of observation {obs.id}: deleted {nc_path or 'nothing'} from the nextcloud"
+            )
+            # only applies if the status was not changed by another request in the meantime
+            if obs.project_status == ObservationStatus.PENDING_DELETION:
+                type(obs).objects.non_polymorphic().filter(
+                    id=obs.id, project_status=ObservationStatus.PENDING_DELETION
+                ).delete()
+            else:
+                AbstractObservation.objects.filter(
+                    id=obs.id, project_status=ObservationStatus.PENDING_COMPLETION
+                ).update(project_status=ObservationStatus.COMPLETED)
+            entry.delete()
+            report["done"] += 1
+            continue
+        if error is None:
+            logger.info(
+                f"{entry.action} of observation {obs.id}: uploaded {obs_dict['name']} to {nc_path}"
+            )
+            # only applies if the status was not changed by another request in the meantime
+            AbstractObservation.objects.filter(
+                id=obs.id, project_status__in=_expected_status[entry.action]
+            ).update(
+                project_status=ObservationStatus.UPLOADED
+                if entry.action == OutboxAction.RESUME
+                else ObservationStatus.PAUSED,
+                upload_digest=nm.dict_digest(obs_dict),
+                synced_version=obs.sync_version,
+            )
+            entry.delete()
+            report["done"] += 1
+            continue
+
+        entry.attempts += 1
+        entry.last_error = str(error)
+        if entry.attempts >= max_attempts and entry.action == OutboxAction.DELETE:
+            logger.error(
+                f"{entry.action} of observation {obs.id} failed {entry.attempts} times, leaving it to the pending deletion. Got: {error}"
+            )
+            entry.delete()
+            report["failed"] += 1
+            continue
+        if entry.attempts >= max_attempts:
+            logger.error(
+                f"{entry.action} of observation {obs.id} failed {entry.attempts} times, setting status to {ObservationStatus.ERROR}. Got: {error}"
+            )
+            AbstractObservation.objects.filter(id=obs.id).update(
+                project_status=ObservationStatus.ERROR
+            )
+            entry.delete()
+            report["failed"] += 1
+            continue
+
+        entry.next_attempt = timezone.now() + retry_delay * 2 ** (entry.attempts - 1)
+        logger.warning(
+            f"{entry.action} of observation {obs.id} failed, retrying at {entry.next_attempt.isoformat()}. Got: {error}"
+        )
+        entry.save()
+        report["retried"] += 1
+
+    if entries:
+        logger.info(
+            f"Processed outbox: {report['done']} done, {report['retried']} retried, {report['failed']} failed."
+        )
+    return report
@@ -0,0 +1,215 @@
+"""
+This module keeps the history of the progress of the non-scheduled observations and forecasts their completion from it.
+Every update run records the accepted and required frames of each filter read from the progress files as ProgressSample.
+The samples are appended with bulk inserts. Only the first sample of each observing night is kept, so a night counts once no matter how often the sync runs.
+Scheduled observations are not sampled, as their completion follows their scheduling window.
+
+The forecasts assume that NINA keeps accepting as many frames per night as it did on average since the first sample.
+They are computed by the database in a single query, regardless of the number of samples.
+"""
+
+import datetime
+import logging
+from collections import defaultdict
+
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    FloatField,
+    Func,
+    Max,
+    Min,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Ceil
+from django.utils import timezone
+
+from nextcloud.models import ProgressSample
+from observation_data.models import (
+    AbstractObservation,
+    ObservationStatus,
+    ScheduledObservation,
+)
+
+logger = logging.getLogger(__name__)
+
+# Samples recorded before this hour belong to the night that started on the previous day
+night_start_hour = 12
+
+
+def exposure_amounts(nc_dict: dict) -> dict[str, list[int]]:
+    """
+    Extracts the accepted and required frames of every filter from an observation dict downloaded from the nextcloud.
+
+    :param nc_dict: Observation as dict
+    :return: dict mapping the filters to [accepted, required]
+    """
+    amounts = defaultdict(lambda: [0, 0])
+    for exposure in nc_dict["targets"][0]["exposures"]:
+        amounts[exposure["filter"]][0] += exposure["acceptedAmount"]
+        amounts[exposure["filter"]][1] += exposure["requiredAmount"]
+    return dict(amounts)
+
+
+def night_of(dt: datetime.datetime) -> datetime.date:
+    """
+    Returns the date the observing night of `dt` starts on.
+    """
+    local = timezone.localtime(dt)
+    return (local - datetime.timedelta(hours=night_start_hour)).date()
+
+
+def create_samples(
+    obs: AbstractObservation, amounts: dict[str, list[int]], now=None
+) -> list[ProgressSample]:
+    """
+    Creates the (unsaved) samples of the progress of an observation.
+
+    :param obs: Observation the progress belongs to
+    :param amounts: Progress as returned by `exposure_amounts`
+    :param now: datetime; default=None uses the current time
+    """
+    now = now or timezone.now()
+    night = night_of(now)
+    return [
+        ProgressSample(
+            observation_id=obs.id,
+            filter=filter_type,
+            accepted=accepted,
+            required=required,
+            night=night,
+            recorded_at=now,
+        )
+        for filter_type, (accepted, required) in amounts.items()
+    ]
+
+
+def save_samples(samples: list[ProgressSample]):
+    """
+    Appends the samples to the history with bulk inserts. Samples of a night that already has a sample are dropped.
+    """
+    if not samples:
+        return
+    ProgressSample.objects.bulk_create(samples, batch_size=500, ignore_conflicts=True)
+    logger.info(f"Recorded {len(samples)} progress samples.")
+
+
+class _NightSpan(Func):
+    """
+    Computes the number of days from the second to the first date, e.g. the nights between the first and the latest sample.
+    """
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="(JULIANDAY(%(expressions)s))",
+            arg_joiner=") - JULIANDAY(",
+            **extra_context,
+        )
+
+
+def _remaining_nights() -> Subquery:
+    """
+    Estimates the nights until the observation referenced by OuterRef("pk") is completed, i.e. the maximum over its filters.
+    Each filter needs its missing frames divided by the frames accepted per night since its first sample,
+    i.e. the frames accepted since then divided by the nights elapsed since then.
+    The estimate is NULL if a filter has not progressed yet, all its samples are from the same night, or the observation has no samples.
+    """
+    filters = (
+        ProgressSample.objects.filter(observation=OuterRef("pk"))
+        .values("filter")
+        .annotate(
+            first=Min("accepted"),
+            latest=Max("accepted"),
+            required_frames=Max("required"),
+            nights=_NightSpan(Max("night"), Min("night")),
+        )
+        .annotate(
+            remaining=Case(
+                When(latest__gte=F("required_frames"), then=Value(0.0)),
+                When(
+                    latest__gt=F("first"),
+                    nights__gt=0,
+                    then=Ceil(
+                        Cast(F("required_frames") - F("latest"), FloatField())
+                        * F("nights")
+                        / (F("latest") - F("first"))
+                    ),
+                ),
+                default=None,
+                output_field=FloatField(),
+            )
+        )
+        .order_by(F("remaining").desc(nulls_first=True))
+        .values("remaining")[:1]
+    )
+    return Subquery(filters, output_field=FloatField())
+
+
+def active_observations() -> QuerySet:
+    """
+    Returns the non-scheduled observations in the nextcloud, i.e. the observations the forecasts are made for by default.
+    """
+    return AbstractObservation.objects.not_instance_of(ScheduledObservation).filter(
+        project_status__in=[ObservationStatus.UPLOADED, ObservationStatus.PAUSED]
+    )
+
+
+def forecast_observations(
+    observations: QuerySet | None = None,
+) -> dict[int, int | None]:
+    """
+    Estimates the nights remaining until the observations are completed.
+
+    :param observations: Observations to forecast; default=None forecasts all non-scheduled observations in the nextcloud.
+    :return: dict mapping the observation ids to the remaining nights, None if there is not enough history for an estimate
+    """
+    if observations is None:
+        observations = active_observations()
+    return {
+        obs_id: None if nights is None else int(nights)
+        for obs_id, nights in observations.non_polymorphic()
+        .annotate(remaining_nights=_remaining_nights())
+        .values_list("id", "remaining_nights")
+    }
+
+
+def forecast_observatories() -> dict[str, dict]:
+    """
+    Estimates the nights remaining until all non-scheduled observations in the nextcloud of each observatory are completed,
+    i.e. the maximum over the observations that can be estimated.
+
+    :return: dict mapping the observatory names to "remaining_nights" (None if no observation can be estimated),
+        the number of "observations" and the number of "forecasted" observations
+    """
+    rows = (
+        active_observations()
+        .non_polymorphic()
+        .order_by()
+        .values("observatory")
+        .annotate(
+            remaining_nights=Max(_remaining_nights()),
+            observations=Count("id"),
+            forecasted=Count(_remaining_nights()),
+        )
+    )
+    return {
+        row["observatory"]: {
+            "remaining_nights": None
+            if row["remaining_nights"] is None
+            else int(row["remaining_nights"]),
+            "observations": row["observations"],
+            "forecasted": row["forecasted"],
+        }
+        for row in rows
+    }
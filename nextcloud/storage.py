@@ -0,0 +1,328 @@
+"""
+This module provides the storage backends behind the nextcloud_manager. All paths are user paths of the nextcloud, e.g. "TURMX/Projects/00001_M42.json".
+Backends:
+    - WebDavBackend: Accesses the Nextcloud server through nc_py_api (default)
+    - LocalBackend: Accesses a directory of the local filesystem, e.g. the mounted NINA project directory of an observatory
+    - MemoryBackend: Keeps all files in memory, e.g. for tests and benchmarks
+
+All backends raise NextcloudException with status code 404 if a file or directory does not exist, so callers handle all backends alike.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+from typing import Callable, NamedTuple
+
+from nc_py_api import Nextcloud, NextcloudException
+from nc_py_api.files import FsNode
+
+
+class FileInfo(NamedTuple):
+    """
+    Entry of a directory listing. Paths of directories end with "/".
+    """
+
+    path: str
+    etag: str
+    size: int
+    is_dir: bool = False
+
+
+def _not_found(path: str) -> NextcloudException:
+    return NextcloudException(404, "Not found", path)
+
+
+class StorageBackend:
+    """
+    Interface of the storage backends. `remote` backends are accessed over the network, their requests are guarded by the
+    circuit breaker and deadline of the nextcloud_manager.
+    """
+
+    remote = False
+
+    def listdir(self, dir_path: str) -> dict[str, FileInfo]:
+        """
+        Lists the files and directories directly inside a directory.
+
+        :return: dict mapping the path of each entry to its FileInfo
+        :raises NextcloudException: If the directory does not exist
+        """
+        raise NotImplementedError
+
+    def read(self, path: str) -> bytes:
+        """
+        :raises NextcloudException: If the file does not exist
+        """
+        raise NotImplementedError
+
+    def write(self, path: str, content: bytes) -> FileInfo:
+        """
+        Writes a file, overwriting an existing one. The directory of the file must already exist.
+
+        :return: FileInfo of the written file
+        :raises NextcloudException: If the directory does not exist
+        """
+        raise NotImplementedError
+
+    def delete(self, path: str) -> None:
+        """
+        Deletes a file or a directory including its content.
+
+        :raises NextcloudException: If the file/directory does not exist
+        """
+        raise NotImplementedError
+
+    def mkdir(self, path: str) -> None:
+        """
+        Creates a directory including all missing parent directories. Existing directories are kept.
+        """
+        raise NotImplementedError
+
+    def stat(self, path: str) -> FileInfo:
+        """
+        :raises NextcloudException: If the file/directory does not exist
+        """
+        raise NotImplementedError
+
+
+class WebDavBackend(StorageBackend):
+    """
+    Accesses the Nextcloud server through nc_py_api. The client is fetched for every call, so a replaced connection is picked up.
+
+    :param get_client: Returns the Nextcloud client to use
+    """
+
+    remote = True
+
+    def __init__(self, get_client: Callable[[], Nextcloud]):
+        self.get_client = get_client
+
+    @staticmethod
+    def _info(node: FsNode) -> FileInfo:
+        return FileInfo(node.user_path, node.etag, node.info.size, node.is_dir)
+
+    def listdir(self, dir_path: str) -> dict[str, FileInfo]:
+        return {
+            node.user_path: self._info(node)
+            for node in self.get_client().files.listdir(dir_path)
+        }
+
+    def read(self, path: str) -> bytes:
+        return self.get_client().files.download(path)
+
+    def write(self, path: str, content: bytes) -> FileInfo:
+        return self._info(
+            self.get_client().files.upload_stream(path=path, fp=BytesIO(content))
+        )
+
+    def delete(self, path: str) -> None:
+        self.get_client().files.delete(path)
+
+    def mkdir(self, path: str) -> None:
+        dirs = path.strip("/").split("/")
+        for i in range(1, len(dirs) + 1):
+            try:
+                self.get_client().files.mkdir("/".join(dirs[:i]))
+            except NextcloudException:
+                pass
+
+    def stat(self, path: str) -> FileInfo:
+        return self._info(self.get_client().files.by_path(path))
+
+
+class LocalBackend(StorageBackend):
+    """
+    Accesses a directory of the local filesystem. The user paths are resolved relative to `root`, e.g. the file
+    "TURMX/Projects/00001_M42.json" is stored as "<root>/TURMX/Projects/00001_M42.json".
+    Files are written to a temporary file first and then renamed, so readers (e.g. NINA) never see a partially written file.
+    The ETag is built from the modification time and size of the file.
+
+    :param root: Directory the user paths are resolved in
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _local_path(self, path: str) -> str:
+        local_path = os.path.abspath(os.path.join(self.root, path.strip("/")))
+        if local_path != self.root and not local_path.startswith(f"{self.root}/"):
+            raise NextcloudException(400, "Path outside of storage root", path)
+        return local_path
+
+    def _info(self, path: str, stat_result: os.stat_result, is_dir: bool) -> FileInfo:
+        path = path.strip("/")
+        return FileInfo(
+            f"{path}/" if is_dir else path,
+            f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"',
+            0 if is_dir else stat_result.st_size,
+            is_dir,
+        )
+
+    def listdir(self, dir_path: str) -> dict[str, FileInfo]:
+        dir_path = dir_path.strip("/")
+        try:
+            with os.scandir(self._local_path(dir_path)) as entries:
+                infos = [
+                    self._info(
+                        f"{dir_path}/{entry.name}" if dir_path else entry.name,
+                        entry.stat(),
+                        entry.is_dir(),
+                    )
+                    for entry in entries
+                    if not entry.name.startswith(".")  # skips unfinished writes
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            raise _not_found(dir_path)
+        return {info.path: info for info in infos}
+
+    def read(self, path: str) -> bytes:
+        try:
+            with open(self._local_path(path), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            raise _not_found(path)
+
+    def write(self, path: str, content: bytes) -> FileInfo:
+        local_path = self._local_path(path)
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(local_path), prefix=".upload-"
+            )
+        except FileNotFoundError:
+            raise _not_found(os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self._info(path, os.stat(local_path), False)
+
+    def delete(self, path: str) -> None:
+        local_path = self._local_path(path)
+        try:
+            if os.path.isdir(local_path):
+                shutil.rmtree(local_path)
+            else:
+                os.remove(local_path)
+        except FileNotFoundError:
+            raise _not_found(path)
+
+    def mkdir(self, path: str) -> None:
+        os.makedirs(self._local_path(path), exist_ok=True)
+
+    def stat(self, path: str) -> FileInfo:
+        local_path = self._local_path(path)
+        try:
+            return self._info(path, os.stat(local_path), os.path.isdir(local_path))
+        except FileNotFoundError:
+            raise _not_found(path)
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Keeps all files in memory. The ETag is the SHA-256 of the content. Safe to use from multiple threads.
+    """
+
+    def __init__(self):
+        self._files: dict[str, bytes] = {}
+        self._dirs: set[str] = {""}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _file_info(path: str, content: bytes) -> FileInfo:
+        return FileInfo(path, f'"{hashlib.sha256(content).hexdigest()}"', len(content))
+
+    def listdir(self, dir_path: str) -> dict[str, FileInfo]:
+        dir_path = dir_path.strip("/")
+        with self._lock:
+            if dir_path not in self._dirs:
+                raise _not_found(dir_path)
+            listing = {
+                path: self._file_info(path, content)
+                for path, content in self._files.items()
+                if os.path.dirname(path) == dir_path
+            }
+            for path in self._dirs:
+                if path and os.path.dirname(path) == dir_path:
+                    listing[f"{path}/"] = FileInfo(f"{path}/", "", 0, True)
+        return listing
+
+    def read(self, path: str) -> bytes:
+        with self._lock:
+            try:
+                return self._files[path.strip("/")]
+            except KeyError:
+                raise _not_found(path)
+
+    def write(self, path: str, content: bytes) -> FileInfo:
+        path = path.strip("/")
+        with self._lock:
+            if os.path.dirname(path) not in self._dirs:
+                raise _not_found(os.path.dirname(path))
+            self._files[path] = bytes(content)
+        return self._file_info(path, content)
+
+    def delete(self, path: str) -> None:
+        path = path.strip("/")
+        with self._lock:
+            if path in self._files:
+                del self._files[path]
+                return
+            if path not in self._dirs:
+                raise _not_found(path)
+            self._files = {
+                p: c for p, c in self._files.items() if not p.startswith(f"{path}/")
+            }
+            self._dirs = {
+                d for d in self._dirs if d != path and not d.startswith(f"{path}/")
+            }
+
+    def mkdir(self, path: str) -> None:
+        dirs = path.strip("/").split("/")
+        with self._lock:
+            for i in range(1, len(dirs) + 1):
+                self._dirs.add("/".join(dirs[:i]))
+
+    def stat(self, path: str) -> FileInfo:
+        path = path.strip("/")
+        with self._lock:
+            if path in self._files:
+                return self._file_info(path, self._files[path])
+            if path in self._dirs:
+                return FileInfo(f"{path}/", "", 0, True)
+        raise _not_found(path)
+
+
+def parse_backends(config: str) -> dict[str, StorageBackend]:
+    """
+    Parses the configuration of the backends of the observatories, e.g. "TURMX2=local:/mnt/nina;TURMX3=memory".
+    Each observatory is assigned "webdav", "memory" or "local:<root>".
+
+    :param config: Configuration string, e.g. the value of NC_STORAGE_BACKENDS
+    :return: dict mapping the upper case observatory names to their backends. Observatories using WebDAV are left out.
+    :raises ValueError: If the configuration is invalid
+    """
+    backends = {}
+    for entry in config.split(";"):
+        if not entry.strip():
+            continue
+        observatory, _, backend = entry.partition("=")
+        kind, _, argument = backend.strip().partition(":")
+        if kind == "webdav":
+            continue
+        if kind == "memory":
+            backends[observatory.strip().upper()] = MemoryBackend()
+        elif kind == "local" and argument:
+            backends[observatory.strip().upper()] = LocalBackend(argument)
+        else:
+            raise ValueError(f"Invalid storage backend '{backend}' for '{observatory}'")
+    return backends
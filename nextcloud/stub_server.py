@@ -0,0 +1,363 @@
+"""
+This module provides a local stand-in for the Nextcloud server, e.g. for benchmarks of the sync without a live Nextcloud.
+It implements the part of the WebDAV and OCS API used by nc_py_api and the nextcloud_manager: capabilities, PROPFIND, GET (including
+directories as zip), PUT, chunked uploads, MKCOL, DELETE, MOVE and sync-collection REPORTs. The files are kept in a `MemoryBackend`.
+A sync token refers to the listing of the directory at the time it was issued, so changes made directly in `storage` are reported as well.
+
+Every request can be delayed by a fixed latency, and a share of the WebDAV requests can be answered with 503 to inject errors.
+
+Example:
+    with StubNextcloudServer(latency=0.01) as server:
+        os.environ["NC_URL"] = server.url
+        upload_observations()
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import quote, unquote, urlsplit
+from xml.sax.saxutils import escape, unescape
+
+from nc_py_api import NextcloudException
+
+from nextcloud.storage import FileInfo, MemoryBackend
+
+_dav_root = "/remote.php/dav"
+
+
+class StubNextcloudServer:
+    """
+    Local stand-in for the Nextcloud server, listening on a free port of 127.0.0.1. Can be used as context manager.
+
+    :param user: Name of the user the files belong to. Any password is accepted.
+    :param latency: Seconds every request is delayed by
+    :param error_rate: Share of the WebDAV requests answered with 503, between 0 and 1
+    :param seed: Seed of the random numbers that decide which requests fail
+    """
+
+    def __init__(
+        self,
+        user: str = "admin",
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.user = user
+        self.latency = latency
+        self.error_rate = error_rate
+        self.storage = MemoryBackend()
+        self.requests: Counter[str] = Counter()  # requests by HTTP verb
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._file_ids: dict[str, int] = {}
+        self._uploads: dict[str, dict[str, bytes]] = {}  # chunks of running uploads
+        self._sync_tokens: list[
+            dict[str, FileInfo]
+        ] = []  # listing of each issued sync token
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """
+        URL to pass as NC_URL
+        """
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubNextcloudServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StubNextcloudServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_requests(self) -> None:
+        with self._lock:
+            self.requests.clear()
+
+    def _count(self, verb: str) -> None:
+        with self._lock:
+            self.requests[verb] += 1
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _file_id(self, path: str) -> int:
+        with self._lock:
+            return self._file_ids.setdefault(path.strip("/"), len(self._file_ids) + 1)
+
+    def _issue_sync_token(self, listing: dict[str, FileInfo]) -> str:
+        with self._lock:
+            self._sync_tokens.append(listing)
+            return f"http://sabre.io/ns/sync/{len(self._sync_tokens)}"
+
+    def _sync_token_listing(self, token: str) -> dict[str, FileInfo] | None:
+        """
+        :return: The listing the token was issued for, an empty listing for an empty token or None if the token is invalid
+        """
+        if not token:
+            return {}
+        number = token.rsplit("/", 1)[-1]
+        with self._lock:
+            if not number.isdigit() or not 0 < int(number) <= len(self._sync_tokens):
+                return None
+            return self._sync_tokens[int(number) - 1]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keeps the connections of the client alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    @property
+    def stub(self) -> StubNextcloudServer:
+        return self.server.stub
+
+    def log_message(self, format, *args):
+        pass  # the requests are counted instead
+
+    def _respond(
+        self, status: int, body: bytes = b"", headers: dict | None = None
+    ) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _handle(self) -> None:
+        body = self._body()
+        self.stub._count(self.command)
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+
+        path = unquote(urlsplit(self.path).path)
+        if path.startswith("/ocs/"):
+            return self._ocs(path)
+        if not path.startswith(f"{_dav_root}/"):
+            return self._respond(404)
+        if self.stub._should_fail():
+            return self._respond(503)
+
+        area, _, rest = path[len(_dav_root) + 1 :].partition("/")
+        user, _, user_path = rest.partition("/")
+        if user != self.stub.user or area not in ("files", "uploads"):
+            return self._respond(404)
+        try:
+            if area == "uploads":
+                return self._upload(user_path.strip("/"), body)
+            handler = getattr(self, f"_dav_{self.command.lower()}", None)
+            if handler is None:
+                return self._respond(501)
+            handler(user_path.strip("/"), body)
+        except NextcloudException as e:
+            self._respond(e.status_code)
+
+    do_GET = do_PUT = do_DELETE = do_MKCOL = do_MOVE = do_PROPFIND = do_REPORT = _handle
+
+    def _ocs(self, path: str) -> None:
+        if path == "/ocs/v1.php/cloud/capabilities":
+            data = {
+                "version": {
+                    "major": 31,
+                    "minor": 0,
+                    "micro": 0,
+                    "string": "31.0.0",
+                    "extendedSupport": False,
+                },
+                "capabilities": {},
+            }
+        elif path == "/ocs/v1.php/cloud/user":
+            data = {"id": self.stub.user}
+        else:
+            return self._respond(404)
+        ocs = {"ocs": {"meta": {"status": "ok", "statuscode": 100}, "data": data}}
+        self._respond(
+            200,
+            json.dumps(ocs).encode("utf-8"),
+            {"Content-Type": "application/json"},
+        )
+
+    def _href(self, info: FileInfo) -> str:
+        return quote(f"{_dav_root}/files/{self.stub.user}/{info.path}")
+
+    def _file_headers(self, info: FileInfo) -> dict:
+        return {"OC-Etag": info.etag, "OC-FileId": str(self.stub._file_id(info.path))}
+
+    def _dav_propfind(self, path: str, body: bytes) -> None:
+        info = self.stub.storage.stat(path) if path else FileInfo("", "", 0, True)
+        infos = [info]
+        if info.is_dir and self.headers.get("Depth", "1") != "0":
+            infos += sorted(self.stub.storage.listdir(path).values())
+
+        responses = []
+        for info in infos:
+            file_id = self.stub._file_id(info.path)
+            resource_type = "<d:collection/>" if info.is_dir else ""
+            responses.append(
+                f"<d:response><d:href>{escape(self._href(info))}</d:href><d:propstat><d:prop>"
+                f"<d:resourcetype>{resource_type}</d:resourcetype>"
+                f"<d:getetag>{escape(info.etag)}</d:getetag>"
+                f"<d:getcontentlength>{info.size}</d:getcontentlength>"
+                f"<oc:size>{info.size}</oc:size>"
+                f"<oc:id>{file_id:08d}</oc:id><oc:fileid>{file_id}</oc:fileid>"
+                f"</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+            )
+        multistatus = (
+            '<?xml version="1.0"?>'
+            '<d:multistatus xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns" xmlns:nc="http://nextcloud.org/ns">'
+            f"{''.join(responses)}</d:multistatus>"
+        )
+        self._respond(
+            207,
+            multistatus.encode("utf-8"),
+            {"Content-Type": "application/xml; charset=utf-8"},
+        )
+
+    def _dav_report(self, path: str, body: bytes) -> None:
+        """
+        sync-collection REPORT (RFC 6578) with sync-level 1: returns the files of the directory changed or deleted since the token.
+        """
+        match = re.search(rb"<d:sync-token>(.*?)</d:sync-token>", body)
+        if b"sync-collection" not in body or match is None:
+            return self._respond(501)
+        old_listing = self.stub._sync_token_listing(unescape(match.group(1).decode()))
+        if old_listing is None:
+            return self._respond(403)  # invalid sync token
+        listing = {
+            info.path: info
+            for info in self.stub.storage.listdir(path).values()
+            if not info.is_dir
+        }
+
+        responses = []
+        for info in sorted(listing.values()):
+            if old_listing.get(info.path) == info:
+                continue
+            responses.append(
+                f"<d:response><d:href>{escape(self._href(info))}</d:href><d:propstat><d:prop>"
+                f"<d:getetag>{escape(info.etag)}</d:getetag>"
+                f"<d:getcontentlength>{info.size}</d:getcontentlength>"
+                f"</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+            )
+        for deleted in sorted(old_listing.keys() - listing.keys()):
+            responses.append(
+                f"<d:response><d:href>{escape(self._href(old_listing[deleted]))}</d:href>"
+                f"<d:status>HTTP/1.1 404 Not Found</d:status></d:response>"
+            )
+        multistatus = (
+            '<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">'
+            f"{''.join(responses)}"
+            f"<d:sync-token>{escape(self.stub._issue_sync_token(listing))}</d:sync-token></d:multistatus>"
+        )
+        self._respond(
+            207,
+            multistatus.encode("utf-8"),
+            {"Content-Type": "application/xml; charset=utf-8"},
+        )
+
+    def _dav_get(self, path: str, body: bytes) -> None:
+        info = self.stub.storage.stat(path)
+        if not info.is_dir:
+            content = self.stub.storage.read(path)
+            return self._respond(200, content, self._file_headers(info))
+
+        # directories are sent as zip with the members "<directory name>/<path inside the directory>"
+        buffer = BytesIO()
+        root = path.rsplit("/", 1)[0] if "/" in path else ""
+        with zipfile.ZipFile(buffer, "w") as zf:
+            dirs = [path]
+            while dirs:
+                for entry in self.stub.storage.listdir(dirs.pop()).values():
+                    if entry.is_dir:
+                        dirs.append(entry.path.rstrip("/"))
+                    else:
+                        zf.writestr(
+                            entry.path[len(root) :].lstrip("/"),
+                            self.stub.storage.read(entry.path),
+                        )
+        self._respond(200, buffer.getvalue(), {"Content-Type": "application/zip"})
+
+    def _dav_put(self, path: str, body: bytes) -> None:
+        info = self.stub.storage.write(path, body)
+        self._respond(201, headers=self._file_headers(info))
+
+    def _dav_mkcol(self, path: str, body: bytes) -> None:
+        try:
+            self.stub.storage.stat(path)
+            return self._respond(405)  # exists already
+        except NextcloudException:
+            pass
+        if "/" in path:
+            parent = self.stub.storage.stat(path.rsplit("/", 1)[0])
+            if not parent.is_dir:
+                return self._respond(409)
+        self.stub.storage.mkdir(path)
+        self._respond(
+            201, headers=self._file_headers(FileInfo(f"{path}/", "", 0, True))
+        )
+
+    def _dav_delete(self, path: str, body: bytes) -> None:
+        self.stub.storage.delete(path)
+        self._respond(204)
+
+    def _dav_move(self, path: str, body: bytes) -> None:
+        destination = self._destination()
+        info = self.stub.storage.write(destination, self.stub.storage.read(path))
+        self.stub.storage.delete(path)
+        self._respond(201, headers=self._file_headers(info))
+
+    def _destination(self) -> str:
+        destination = unquote(urlsplit(self.headers["Destination"]).path)
+        prefix = f"{_dav_root}/files/{self.stub.user}/"
+        if not destination.startswith(prefix):
+            raise NextcloudException(400)
+        return destination[len(prefix) :]
+
+    def _upload(self, path: str, body: bytes) -> None:
+        """
+        Chunked uploads: MKCOL creates the upload, PUT adds a chunk, MOVE of "<upload>/.file" assembles the file, DELETE drops the upload.
+        """
+        upload, _, chunk = path.partition("/")
+        with self.stub._lock:
+            chunks = self.stub._uploads.get(upload)
+            if self.command == "MKCOL":
+                self.stub._uploads[upload] = {}
+            elif self.command == "DELETE":
+                self.stub._uploads.pop(upload, None)
+        if self.command in ("MKCOL", "DELETE"):
+            return self._respond(201 if self.command == "MKCOL" else 204)
+        if chunks is None:
+            return self._respond(404)
+        if self.command == "PUT":
+            chunks[chunk] = body
+            return self._respond(201)
+        if self.command == "MOVE" and chunk == ".file":
+            content = b"".join(chunks[name] for name in sorted(chunks))
+            info = self.stub.storage.write(self._destination(), content)
+            return self._respond(201, headers=self._file_headers(info))
+        self._respond(501)
@@ -0,0 +1,185 @@
+"""
+This module runs the synchronization with the nextcloud in a single long-running process.
+Unlike the cron-triggered management commands, Django is set up once and a single connection to the nextcloud is kept alive,
+which allows to run the jobs every few minutes.
+
+The jobs (upload, update, pending deletion and outbox) are run on their own intervals. After each run, the last run time, duration and result
+of every job are logged and written to a JSON status file.
+The pending deletion is first run once the current observing night is over, so files are not deleted while NINA is observing.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+import nextcloud.nextcloud_manager as nm
+from nextcloud.nextcloud_sync import update_observations, upload_observations
+from nextcloud.outbox import deletion_due, process_outbox
+from observation_data.observation_management import process_pending_deletion
+
+logger = logging.getLogger(__name__)
+
+
+class SyncJob:
+    """
+    A job of the sync daemon and the statistics of its last run.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func,
+        interval: timedelta,
+        first_run: datetime | None = None,
+    ):
+        """
+        :param name: Name of the job, used in the logs and the status file
+        :param func: Function running the job. Is called without arguments.
+        :param interval: Time between the start of two runs of the job
+        :param first_run: Time of the first run; default=None runs the job right away
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.next_run: datetime = first_run or timezone.now()
+        self.last_run: datetime | None = None
+        self.last_duration: float | None = None
+        self.last_error: str | None = None
+        self.runs = 0
+
+    def run(self):
+        """
+        Runs the job and records its statistics. Errors are logged instead of raised, so that one failing job does not stop the daemon.
+        """
+        close_old_connections()  # the database may have closed the connection since the last run
+        self.last_run = timezone.now()
+        start = time.monotonic()
+        try:
+            self.func()
+            self.last_error = None
+        except Exception as e:
+            logger.error(f"Sync job {self.name} failed: {e}")
+            self.last_error = str(e)
+        self.last_duration = time.monotonic() - start
+        self.runs += 1
+        self.next_run = self.last_run + self.interval
+        logger.info(
+            f"Sync job {self.name} finished in {self.last_duration:.2f}s, next run at {self.next_run.isoformat()}"
+        )
+
+    def status(self) -> dict:
+        """
+        :return: JSON serializable statistics of the job
+        """
+        return {
+            "interval": self.interval.total_seconds(),
+            "runs": self.runs,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+            "next_run": self.next_run.isoformat(),
+        }
+
+
+def create_jobs(
+    upload_interval: timedelta,
+    update_interval: timedelta,
+    deletion_interval: timedelta,
+    outbox_interval: timedelta = timedelta(minutes=1),
+    concurrency: int = 1,
+    bulk: bool = False,
+) -> list[SyncJob]:
+    """
+    Creates the jobs of the sync daemon. A job with an interval of zero is disabled.
+
+    :param upload_interval: Interval of `upload_observations`
+    :param update_interval: Interval of `update_observations`
+    :param deletion_interval: Interval of `process_pending_deletion`, starting at the end of the current observing night (see `deletion_due`)
+    :param outbox_interval: Interval of `process_outbox`
+    :param concurrency: Maximum number of concurrent uploads, downloads and deletions
+    :param bulk: Download the progress files of each observatory as a single zip, see `update_observations`
+    :return: List of the enabled jobs
+    """
+    jobs = [
+        SyncJob(
+            "upload",
+            lambda: upload_observations(timezone.now().date(), concurrency),
+            upload_interval,
+        ),
+        SyncJob(
+            "update",
+            lambda: update_observations(timezone.now().date(), concurrency, bulk),
+            update_interval,
+        ),
+        SyncJob(
+            "pending_deletion",
+            lambda: process_pending_deletion(concurrency),
+            deletion_interval,
+            first_run=deletion_due(),
+        ),
+        SyncJob(
+            "outbox",
+            lambda: process_outbox(concurrency),
+            outbox_interval,
+        ),
+    ]
+    return [job for job in jobs if job.interval > timedelta(0)]
+
+
+def write_status(jobs: list[SyncJob], status_file: str | os.PathLike):
+    """
+    Writes the statistics of all jobs to a JSON file. The file is replaced atomically, so readers never see a partial file.
+
+    :param jobs: Jobs of the daemon
+    :param status_file: Path of the status file
+    """
+    status = {
+        "updated_at": timezone.now().isoformat(),
+        "jobs": {job.name: job.status() for job in jobs},
+    }
+    tmp_file = f"{status_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp_file, status_file)
+
+
+def run_sync_daemon(
+    jobs: list[SyncJob],
+    status_file: str | os.PathLike | None = None,
+    stop_event: threading.Event | None = None,
+    once: bool = False,
+):
+    """
+    Runs the jobs whenever they are due until `stop_event` is set. Uses a single connection to the nextcloud for all runs.
+
+    :param jobs: Jobs to run, see `create_jobs`
+    :param status_file: Optional path of a JSON file the statistics of the jobs are written to after every run
+    :param stop_event: Event to stop the daemon, e.g. set by a signal handler. The current job is finished first.
+    :param once: Run every job once and return afterward
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+    logger.info(
+        f"Starting sync daemon with jobs {', '.join(f'{job.name} (every {job.interval})' for job in jobs)}"
+    )
+
+    with nm.persistent_connection():
+        while jobs and not stop_event.is_set():
+            for job in sorted(jobs, key=lambda j: j.next_run):
+                if stop_event.is_set() or job.next_run > timezone.now():
+                    continue
+                job.run()
+                if status_file:
+                    write_status(jobs, status_file)
+            if once:
+                break
+            next_run = min(job.next_run for job in jobs)
+            stop_event.wait(max(0.0, (next_run - timezone.now()).total_seconds()))
+
+    logger.info("Sync daemon stopped")
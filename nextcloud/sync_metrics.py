@@ -0,0 +1,236 @@
+"""
+This module collects metrics of a sync run: the wall time per phase, the WebDAV requests by verb, the bytes sent and received
+and the status transitions of the observations.
+
+The sync functions are decorated with `collect_metrics(job)`. At the end of a run, a summary is logged and, if NC_METRICS_DIR is set,
+written to `sync_<job>.json` and `sync_<job>.prom` in that directory. The latter uses the Prometheus textfile format and can be
+picked up by the textfile collector of the node exporter.
+
+Environment Variables:
+    - NC_METRICS_DIR: Directory the metrics of every run are written to (default: metrics are only logged)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+metrics_dir = os.getenv("NC_METRICS_DIR") or None
+
+# Metrics of the current run. Only set inside a `collect_metrics()` context.
+_metrics: "RunMetrics | None" = None
+# Requests are also counted by the worker threads of `map_concurrently`
+_metrics_lock = threading.Lock()
+
+
+class RunMetrics:
+    """
+    Metrics of a single sync run.
+    """
+
+    def __init__(self, job: str):
+        """
+        :param job: Name of the job, e.g. "upload". Used in the file names and as label of all Prometheus metrics.
+        """
+        self.job = job
+        self.started_at = timezone.now()
+        self.duration = 0.0
+        self.success = True
+        self.phases: dict[str, float] = defaultdict(float)
+        self.requests: Counter[str] = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.transitions: Counter[tuple[str, str]] = Counter()
+
+    def to_dict(self) -> dict:
+        """
+        :return: JSON serializable summary of the run
+        """
+        return {
+            "job": self.job,
+            "started_at": self.started_at.isoformat(),
+            "duration": round(self.duration, 3),
+            "success": self.success,
+            "phases": {phase: round(s, 3) for phase, s in self.phases.items()},
+            "requests": dict(self.requests),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "transitions": {
+                f"{old} -> {new}": count
+                for (old, new), count in self.transitions.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        :return: Metrics of the run in the Prometheus textfile format
+        """
+        job = _label(self.job)
+        lines = [
+            "# HELP turm_sync_duration_seconds Wall time of the last sync run.",
+            "# TYPE turm_sync_duration_seconds gauge",
+            f'turm_sync_duration_seconds{{job="{job}"}} {self.duration:.3f}',
+            "# HELP turm_sync_last_run_timestamp_seconds Start of the last sync run.",
+            "# TYPE turm_sync_last_run_timestamp_seconds gauge",
+            f'turm_sync_last_run_timestamp_seconds{{job="{job}"}} {self.started_at.timestamp():.0f}',
+            "# HELP turm_sync_success Whether the last sync run finished without exception.",
+            "# TYPE turm_sync_success gauge",
+            f'turm_sync_success{{job="{job}"}} {int(self.success)}',
+            "# HELP turm_sync_phase_seconds Wall time per phase of the last sync run.",
+            "# TYPE turm_sync_phase_seconds gauge",
+        ]
+        for phase, seconds in sorted(self.phases.items()):
+            lines.append(
+                f'turm_sync_phase_seconds{{job="{job}",phase="{_label(phase)}"}} {seconds:.3f}'
+            )
+        lines += [
+            "# HELP turm_sync_requests WebDAV requests by verb of the last sync run.",
+            "# TYPE turm_sync_requests gauge",
+        ]
+        for verb, count in sorted(self.requests.items()):
+            lines.append(
+                f'turm_sync_requests{{job="{job}",verb="{_label(verb)}"}} {count}'
+            )
+        lines += [
+            "# HELP turm_sync_bytes_sent Bytes uploaded during the last sync run.",
+            "# TYPE turm_sync_bytes_sent gauge",
+            f'turm_sync_bytes_sent{{job="{job}"}} {self.bytes_sent}',
+            "# HELP turm_sync_bytes_received Bytes downloaded during the last sync run.",
+            "# TYPE turm_sync_bytes_received gauge",
+            f'turm_sync_bytes_received{{job="{job}"}} {self.bytes_received}',
+            "# HELP turm_sync_status_transitions Status transitions of observations during the last sync run.",
+            "# TYPE turm_sync_status_transitions gauge",
+        ]
+        for (old, new), count in sorted(self.transitions.items()):
+            lines.append(
+                f'turm_sync_status_transitions{{job="{job}",from="{_label(old)}",to="{_label(new)}"}} {count}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomically(path: str, content: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_metrics(metrics: RunMetrics, directory: str | os.PathLike):
+    """
+    Writes the metrics of a run to `sync_<job>.json` and `sync_<job>.prom`. The files are replaced atomically.
+
+    :param metrics: Metrics of the run
+    :param directory: Directory to write the files to
+    """
+    os.makedirs(directory, exist_ok=True)
+    base_path = os.path.join(directory, f"sync_{metrics.job}")
+    _write_atomically(f"{base_path}.json", json.dumps(metrics.to_dict(), indent=2))
+    _write_atomically(f"{base_path}.prom", metrics.to_prometheus())
+
+
+@contextmanager
+def collect_metrics(job: str):
+    """
+    Collects the metrics of a sync run for the duration of the context and logs and writes them when the context is left.
+    Nested contexts add to the metrics of the outermost context, e.g. `update_observations` reports both of its parts as one run.
+    Can also be used as a decorator.
+
+    Example: ``with collect_metrics("upload") as metrics: upload_observations()``
+
+    :param job: Name of the job
+    """
+    global _metrics
+    if _metrics is not None:
+        yield _metrics
+        return
+
+    metrics = _metrics = RunMetrics(job)
+    start = time.monotonic()
+    try:
+        yield metrics
+    except BaseException:
+        metrics.success = False
+        raise
+    finally:
+        _metrics = None
+        metrics.duration = time.monotonic() - start
+        logger.info(f"Metrics of sync run: {json.dumps(metrics.to_dict())}")
+        if metrics_dir:
+            try:
+                write_metrics(metrics, metrics_dir)
+            except OSError as e:
+                logger.error(f"Failed to write metrics to {metrics_dir}: {e}")
+
+
+def is_collecting() -> bool:
+    """
+    :return: Whether a run is collecting metrics at the moment
+    """
+    return _metrics is not None
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Adds the wall time of the context to a phase of the current run. Does nothing outside a `collect_metrics()` context.
+    Must only be used by the thread running the sync.
+
+    :param name: Name of the phase, e.g. "download"
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        if _metrics is not None:
+            _metrics.phases[name] += time.monotonic() - start
+
+
+def record_request(verb: str):
+    """
+    Counts a request to the nextcloud. Does nothing outside a `collect_metrics()` context.
+
+    :param verb: HTTP verb of the request, e.g. "PUT"
+    """
+    if _metrics is None:
+        return
+    with _metrics_lock:
+        _metrics.requests[verb] += 1
+
+
+def record_bytes(sent: int = 0, received: int = 0):
+    """
+    Adds the bytes transferred in the bodies of a request to the current run. Does nothing outside a `collect_metrics()` context.
+
+    :param sent: Bytes sent in the body of the request
+    :param received: Bytes received in the body of the response
+    """
+    if _metrics is None:
+        return
+    with _metrics_lock:
+        _metrics.bytes_sent += sent
+        _metrics.bytes_received += received
+
+
+def record_transition(old_status: str, new_status: str, count: int = 1):
+    """
+    Counts status transitions of observations. Does nothing outside a `collect_metrics()` context.
+
+    :param old_status: Status before the run
+    :param new_status: Status after the run, e.g. "Deleted" for observations removed from the database
+    :param count: Number of observations with that transition
+    """
+    if _metrics is None or old_status == new_status:
+        return
+    with _metrics_lock:
+        _metrics.transitions[(str(old_status), str(new_status))] += count
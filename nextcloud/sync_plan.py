@@ -0,0 +1,249 @@
+"""
+This module computes the actions the next upload and update would take, without any request to the nextcloud and without writing
+to the database. The files in the nextcloud are taken from the listing snapshots stored by the last sync run (see `SyncCollectionState`),
+the progress from the progress cache of the observations. The plan is computed with two queries.
+
+Actions of the plan:
+    - upload: The observation is uploaded. `reason` is "new", "changed" or "scheduled", changed and scheduled observations are
+      only uploaded if their JSON differs from the last upload.
+    - skip: The observation is in the nextcloud and nothing changes.
+    - download: The progress file changed since the last download, the further actions depend on its content.
+    - delete: The file is deleted and the status is set to `status`.
+    - complete: The status is set to Completed, there is no file to delete.
+    - reschedule: next_upload is set to `next_upload`.
+    - error: The status is set to Error, `reason` tells why.
+
+The upload actions are listed in the order they are uploaded (see `upload_order_key`).
+A plan can be passed to `upload_observations` and `update_observations`, which then only sync the observations of the plan.
+"""
+
+import datetime
+from collections import Counter
+from datetime import timedelta
+
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+import nextcloud.nextcloud_manager as nm
+from nextcloud.nextcloud_sync import (
+    _filter_observatories,
+    _get_cached_progress,
+    upload_order_key,
+)
+from observation_data.models import AbstractObservation, ObservationStatus
+
+# Fields of the scheduled observations, which are stored in the tables of their subclasses
+_scheduled_fields = ["start_scheduling", "end_scheduling", "next_upload", "cadence"]
+
+
+def build_sync_plan(
+    today: datetime.date | None = None, observatories: list[str] | None = None
+) -> dict:
+    """
+    Computes the actions of the next `upload_observations` and `update_observations` from the current state of the database.
+    Both parts are computed independently, i.e. the update does not consider the changes of the upload.
+
+    :param today: datetime.date; default=None uses the current date.
+    :param observatories: Names of the observatories whose observations are planned; default=None plans all observations.
+    :return: JSON serializable plan with the actions of the "upload" and "update" and the time of the snapshots used
+    """
+    if today is None:
+        today = timezone.now().date()
+
+    # The scheduled fields are fetched with the same query, instead of one query per subclass
+    observations = list(
+        _filter_observatories(
+            AbstractObservation.objects.non_polymorphic()
+            .filter(
+                project_status__in=[
+                    ObservationStatus.PENDING,
+                    ObservationStatus.UPLOADED,
+                    ObservationStatus.PAUSED,
+                ]
+            )
+            .annotate(
+                **{
+                    f"planned_{field}": Coalesce(
+                        f"monitoringobservation__{field}",
+                        f"expertobservation__{field}",
+                    )
+                    for field in _scheduled_fields
+                },
+                planned_start_observation=Coalesce(
+                    "exoplanetobservation__start_observation",
+                    "expertobservation__start_observation",
+                ),
+            )
+            .order_by("id"),
+            observatories,
+        )
+    )
+    if observatories is None:
+        observatories = sorted(
+            {obs.observatory_id for obs in observations if obs.observatory_id}
+        )
+    index, snapshots = nm.snapshot_observation_index(observatories)
+
+    upload = [
+        action
+        for obs in sorted(
+            observations,
+            key=lambda obs: upload_order_key(
+                obs.priority, obs.planned_start_observation, obs.created_at, obs.id
+            ),
+        )
+        if (action := _plan_upload(obs, today))
+    ]
+    update = [
+        action for obs in observations if (action := _plan_update(obs, today, index))
+    ]
+    return {
+        "created_at": timezone.now().isoformat(),
+        "today": today.isoformat(),
+        "observatories": list(observatories),
+        "snapshots": snapshots,
+        "upload": upload,
+        "update": update,
+        "summary": {
+            "upload": dict(Counter(action["action"] for action in upload)),
+            "update": dict(Counter(action["action"] for action in update)),
+        },
+    }
+
+
+def _plan_upload(obs: AbstractObservation, today: datetime.date) -> dict | None:
+    """
+    Plans the upload of an observation like `upload_observations`.
+
+    :return: the action or None if the observation is not considered by the upload
+    """
+    start_scheduling = obs.planned_start_scheduling
+    if obs.project_status == ObservationStatus.PAUSED:
+        return None
+    if start_scheduling:
+        if (
+            start_scheduling > today
+            or obs.planned_end_scheduling < today
+            or obs.planned_next_upload is None  # never due, like in `_due_for_upload`
+            or today < obs.planned_next_upload
+        ):
+            return None
+        reason = (
+            "new" if obs.project_status == ObservationStatus.PENDING else "scheduled"
+        )
+    elif obs.project_status == ObservationStatus.PENDING:
+        reason = "new"
+    elif obs.sync_version > obs.synced_version:
+        reason = "changed"
+    else:
+        return None
+
+    if not obs.observatory_id:
+        return {"id": obs.id, "action": "error", "reason": "no observatory"}
+    return {
+        "id": obs.id,
+        "action": "upload",
+        "reason": reason,
+        "priority": obs.priority,
+    }
+
+
+def _plan_update(
+    obs: AbstractObservation,
+    today: datetime.date,
+    index: dict[int, nm.ObservationFile],
+) -> dict | None:
+    """
+    Plans the update of an observation like `update_non_scheduled_observations` and `update_scheduled_observations`.
+
+    :return: the action or None if the observation is not considered by the update
+    """
+    file = index.get(obs.id)
+    if obs.project_status == ObservationStatus.PAUSED and file is None:
+        return None
+    if obs.planned_start_scheduling:
+        return _plan_scheduled_update(obs, today, file)
+    if obs.project_status == ObservationStatus.PENDING:
+        return None
+
+    if file is None:
+        return {"id": obs.id, "action": "error", "reason": "missing file"}
+    cached_progress = _get_cached_progress(obs, file.etag, today)
+    if cached_progress is None:
+        return {"id": obs.id, "action": "download", "path": file.path}
+
+    progress, past_time = cached_progress
+    if past_time:
+        status = (
+            ObservationStatus.FAILED if progress == 0.0 else ObservationStatus.COMPLETED
+        )
+        return _delete_action(obs, file, status, progress)
+    if progress == 100.0:
+        return _delete_action(obs, file, ObservationStatus.COMPLETED, progress)
+    return {"id": obs.id, "action": "skip", "progress": progress}
+
+
+def _plan_scheduled_update(
+    obs: AbstractObservation,
+    today: datetime.date,
+    file: nm.ObservationFile | None,
+) -> dict:
+    duration = (obs.planned_end_scheduling - obs.planned_start_scheduling).days + 1
+    if duration <= 0:
+        completion = 100.0
+    else:
+        elapsed_time = (today - obs.planned_start_scheduling).days
+        completion = round(max(0.0, min((elapsed_time / duration) * 100, 100.0)), 2)
+
+    if completion == 100.0:
+        if obs.project_status == ObservationStatus.UPLOADED:
+            return _delete_action(obs, file, ObservationStatus.COMPLETED, completion)
+        return {"id": obs.id, "action": "complete", "progress": completion}
+    if obs.project_status != ObservationStatus.UPLOADED:
+        return {"id": obs.id, "action": "skip", "progress": completion}
+
+    if file is None:
+        return {"id": obs.id, "action": "error", "reason": "missing file"}
+    cached_progress = _get_cached_progress(obs, file.etag, today)
+    if cached_progress is None:
+        return {"id": obs.id, "action": "download", "path": file.path}
+
+    partial_progress, past_time = cached_progress
+    if past_time:
+        partial_progress = 100.0
+    next_upload = obs.planned_next_upload
+    new_upload = today + timedelta(days=obs.planned_cadence - 1)
+    if (
+        partial_progress != 0.0
+        and new_upload <= obs.planned_end_scheduling
+        and today >= next_upload
+    ):
+        next_upload = new_upload
+
+    if partial_progress == 100.0:
+        action = _delete_action(obs, file, ObservationStatus.PENDING, completion)
+        action["next_upload"] = next_upload.isoformat()
+        return action
+    if next_upload != obs.planned_next_upload:
+        return {
+            "id": obs.id,
+            "action": "reschedule",
+            "next_upload": next_upload.isoformat(),
+            "progress": completion,
+        }
+    return {"id": obs.id, "action": "skip", "progress": completion}
+
+
+def _delete_action(
+    obs: AbstractObservation,
+    file: nm.ObservationFile | None,
+    status: ObservationStatus,
+    progress: float,
+) -> dict:
+    return {
+        "id": obs.id,
+        "action": "delete",
+        "path": file.path if file else None,
+        "status": status,
+        "progress": progress,
+    }
@@ -3,24 +3,51 @@ import io
 import django
 from django.utils import timezone
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 import django.test
-from nc_py_api import NextcloudException
+from nc_py_api import Nextcloud, NextcloudException
 
 from nextcloud import nextcloud_manager as nm, nextcloud_manager
 from accounts.models import ObservatoryUser
+from nextcloud import progress_history, sync_metrics
+from nextcloud.models import (
+    OutboxAction,
+    OutboxEntry,
+    ProgressSample,
+    SyncCollectionState,
+)
 from nextcloud.nextcloud_manager import file_exists, generate_observation_path
+from nextcloud.outbox import deletion_due, process_outbox
+from nextcloud.benchmark import compare_to_baseline, run_benchmark
+from nextcloud.storage import (
+    LocalBackend,
+    MemoryBackend,
+    StorageBackend,
+    parse_backends,
+)
+from nextcloud.stub_server import StubNextcloudServer
+from nextcloud.sync_daemon import create_jobs
+from nextcloud.sync_plan import build_sync_plan
 from nextcloud.nextcloud_sync import (
     upload_observations,
     calc_progress,
     update_observations,
+    run_sharded,
+    _due_for_upload,
+    _due_querysets,
+    _download_projects_archives,
 )
 
 import filecmp
 import json
 import os
+import shutil
+import tempfile
 from datetime import datetime, timedelta, time
 from dotenv import load_dotenv
 import unittest
+from unittest import mock
 
 from observation_data.models import (
     ObservationType,
@@ -139,6 +166,454 @@ class NextcloudManagerTestCase(django.test.TestCase):
         self.assertFalse(file_exists(f"{self.prefix}/file"))
         nm.delete(self.prefix)
 
+    def test_listing_cache(self):
+        nm.mkdir(f"{self.prefix}/listing/cache")
+        nm.upload_file(f"{self.prefix}/listing/cache/first.json", file_upload)
+        with nm.listing_cache():
+            self.assertTrue(file_exists(f"{self.prefix}/listing/cache/first.json"))
+
+            # changes made through the manager are reflected by the cache
+            nm.upload_file(f"{self.prefix}/listing/cache/second.json", file_upload)
+            self.assertTrue(file_exists(f"{self.prefix}/listing/cache/second.json"))
+            nm.delete(f"{self.prefix}/listing/cache/first.json")
+            self.assertFalse(file_exists(f"{self.prefix}/listing/cache/first.json"))
+
+            # changes made by others are not noticed until the cache is dropped
+            with open(file_upload, "rb") as f:
+                nm.nc.files.upload_stream(f"{self.prefix}/listing/cache/third.json", f)
+            self.assertFalse(file_exists(f"{self.prefix}/listing/cache/third.json"))
+        self.assertTrue(file_exists(f"{self.prefix}/listing/cache/third.json"))
+        nm.delete(self.prefix)
+
+    def test_get_connection(self):
+        nm.reset_connection()
+        connection = nm.get_connection()
+        self.assertIs(connection, nm.get_connection())
+        self.assertIs(connection, nm.nc)
+
+        # a broken connection is replaced after the next health check
+        broken = Nextcloud(
+            nextcloud_url="http://127.0.0.1:1", nc_auth_user="x", nc_auth_pass="x"
+        )
+        nm.nc = broken
+        nm._last_health_check = 0.0
+        self.assertIsNot(broken, nm.get_connection())
+        nm.upload_file(file_nc, file_upload)
+        nm.delete(file_nc)
+
+    def test_incremental_index(self):
+        projects = f"{self.prefix}/TURMX/Projects"
+        nm.mkdir(projects)
+        nm.upload_file(f"{projects}/00001_first.json", file_upload)
+        nm.upload_file(f"{projects}/00002_second.json", file_upload)
+        nm.use_sync_collection = True
+        try:
+            index = nm.build_observation_index(["TURMX"])
+            self.assertEqual({1, 2}, set(index.keys()))
+            self.assertEqual(
+                set(SyncCollectionState.objects.get(directory=projects).listing.keys()),
+                {index[1].path, index[2].path},
+            )
+
+            # the next index only needs the changes, works the same if the server does not support sync-collection
+            nm.delete(f"{projects}/00001_first.json")
+            nm.upload_file(f"{projects}/00003_third.json", file_upload)
+            nm.upload_dict(f"{projects}/00002_second.json", {"changed": True})
+            new_index = nm.build_observation_index(["TURMX"])
+            self.assertEqual({2, 3}, set(new_index.keys()))
+            self.assertNotEqual(index[2].etag, new_index[2].etag)
+            self.assertEqual(
+                nm.nc.files.by_path(f"{projects}/00002_second.json").etag,
+                new_index[2].etag,
+            )
+        finally:
+            nm.use_sync_collection = False
+            nm.delete(self.prefix)
+
+
+class SyncCollectionTestCase(django.test.TestCase):
+    def test_parse_sync_collection(self):
+        with open("nextcloud/test_data/sync_collection.xml") as f:
+            changes, token = nm.parse_sync_collection(f.read(), "/files/admin/")
+        self.assertEqual(token, "http://sabre.io/ns/sync/42")
+        self.assertEqual(
+            changes,
+            {
+                "TURMX/Projects/00001_Imaging_L_M 42.json": {
+                    "etag": '"8c3f1e0b9d2a4"',
+                    "size": 1642,
+                },
+                "TURMX/Projects/00002_Imaging_H_NGC7822.json": None,
+            },
+        )
+
+    def test_incremental_listing(self):
+        # the REPORTs are sent through a real client to the stand-in server
+        projects = "TURMX/Projects"
+        first, second, third = (
+            f"{projects}/{name}.json"
+            for name in ["00001_first", "00002_second", "00003_third"]
+        )
+        with StubNextcloudServer() as server:
+            nm.nc = Nextcloud(
+                nextcloud_url=server.url, nc_auth_user=server.user, nc_auth_pass="x"
+            )
+            try:
+                nm.mkdir(projects)
+                nm.upload_dict(first, {})
+                nm.upload_dict(second, {})
+                self.assertEqual(
+                    {first, second}, set(nm._listdir_incremental(projects))
+                )
+
+                # only the changes are transferred, no full listing is needed
+                nm.delete(first)
+                nm.upload_dict(second, {"changed": True})
+                nm.upload_dict(third, {})
+                server.reset_requests()
+                files = nm._listdir_incremental(projects)
+                self.assertEqual({"REPORT": 1}, dict(server.requests))
+                self.assertEqual({second, third}, set(files))
+                self.assertEqual(server.storage.stat(second).etag, files[second].etag)
+
+                # an invalid token is replaced by a REPORT without token
+                SyncCollectionState.objects.filter(directory=projects).update(
+                    token="invalid"
+                )
+                server.reset_requests()
+                self.assertEqual(files, nm._listdir_incremental(projects))
+                self.assertEqual({"REPORT": 2}, dict(server.requests))
+            finally:
+                nm.reset_connection()
+
+
+class CircuitBreakerTestCase(django.test.TestCase):
+    def setUp(self):
+        nm.reset_circuit_breaker()
+
+    def tearDown(self):
+        nm.reset_circuit_breaker()
+
+    @staticmethod
+    def _request(error: Exception | None = None):
+        with nm._request_guard("GET"):
+            if error:
+                raise error
+
+    def test_circuit_breaker(self):
+        # errors of the server (e.g. 404) do not count as transport failures
+        for _ in range(nm.breaker_threshold):
+            with self.assertRaises(NextcloudException):
+                self._request(NextcloudException(404))
+        self._request()
+
+        # timeouts are raised as NextcloudException with status code 408 by nc_py_api
+        for _ in range(nm.breaker_threshold):
+            with self.assertRaises(NextcloudException):
+                self._request(NextcloudException(408))
+        with self.assertRaises(nm.NextcloudUnavailable):
+            self._request()
+
+        # a failed probe keeps the breaker open, a successful one closes it
+        cooldown = nm.breaker_cooldown
+        nm.breaker_cooldown = 0
+        try:
+            with self.assertRaises(NextcloudException):
+                self._request(NextcloudException(408))
+            nm.breaker_cooldown = 60
+            with self.assertRaises(nm.NextcloudUnavailable):
+                self._request()
+            nm.breaker_cooldown = 0
+            self._request()
+        finally:
+            nm.breaker_cooldown = cooldown
+        with self.assertRaises(NextcloudException):
+            self._request(NextcloudException(408))
+        self._request()  # closed again, a single failure does not open it
+
+    def test_deadline(self):
+        with nm.deadline(60):
+            outer_deadline = nm._deadline
+            self._request()
+            with nm.deadline(0):
+                with self.assertRaises(nm.NextcloudUnavailable):
+                    self._request()
+            self._request()
+            with nm.deadline(3600):  # cannot extend the outer deadline
+                self.assertEqual(nm._deadline, outer_deadline)
+        self.assertIsNone(nm._deadline)
+
+
+class SyncDaemonTestCase(django.test.SimpleTestCase):
+    def test_deletion_after_night(self):
+        # the daemon is started during the observing night
+        night = timezone.make_aware(datetime(2025, 1, 1, 23))
+        with mock.patch("django.utils.timezone.now", return_value=night):
+            jobs = {
+                job.name: job
+                for job in create_jobs(
+                    timedelta(minutes=15), timedelta(minutes=15), timedelta(days=1)
+                )
+            }
+        self.assertEqual(night, jobs["upload"].next_run)
+        morning = timezone.make_aware(
+            datetime(2025, 1, 2, progress_history.night_start_hour)
+        )
+        self.assertEqual(morning, jobs["pending_deletion"].next_run)
+
+        # later runs keep the time of day
+        with mock.patch("django.utils.timezone.now", return_value=morning):
+            jobs["pending_deletion"].func = mock.Mock()
+            jobs["pending_deletion"].run()
+        self.assertEqual(morning + timedelta(days=1), jobs["pending_deletion"].next_run)
+
+
+class UnreachableNextcloudTestCase(django.test.TestCase):
+    """
+    Uses a real client against an address nothing listens on, so the errors are the ones of an actual outage.
+    """
+
+    def setUp(self):
+        nm.reset_circuit_breaker()
+        nm.nc = Nextcloud(
+            nextcloud_url="http://127.0.0.1:1", nc_auth_user="x", nc_auth_pass="x"
+        )
+
+    def tearDown(self):
+        nm.reset_connection()
+        nm.reset_circuit_breaker()
+
+    def test_bulk_download_falls_back(self):
+        # the files are left out, so they are downloaded one by one instead
+        self.assertEqual({}, _download_projects_archives(["TURMX"]))
+
+    def test_circuit_breaker(self):
+        for _ in range(nm.breaker_threshold):
+            with self.assertRaises(nm.transport_errors):
+                nm.upload_dict("TURMX/Projects/00001_M42.json", {})
+        self.assertEqual(nm.breaker_threshold, nm._consecutive_failures)
+        with self.assertRaises(nm.NextcloudUnavailable):
+            nm.upload_dict("TURMX/Projects/00001_M42.json", {})
+
+
+class StorageBackendTestCase(django.test.SimpleTestCase):
+    def _check_backend(self, backend: StorageBackend):
+        backend.mkdir("TURMX/Projects")
+        self.assertEqual({"TURMX/"}, set(backend.listdir("").keys()))
+        self.assertEqual({}, backend.listdir("TURMX/Projects"))
+        with self.assertRaises(NextcloudException):
+            backend.listdir("TURMX2/Projects")
+        with self.assertRaises(NextcloudException):
+            backend.write("TURMX2/Projects/00001_M42.json", b"{}")
+
+        file = backend.write("TURMX/Projects/00001_M42.json", b"{}")
+        self.assertEqual(("TURMX/Projects/00001_M42.json", 2), (file.path, file.size))
+        self.assertEqual({file.path: file}, backend.listdir("TURMX/Projects"))
+        self.assertEqual(file, backend.stat(file.path))
+        self.assertEqual(b"{}", backend.read(file.path))
+
+        changed = backend.write(file.path, b'{"changed": true}')
+        self.assertNotEqual(file.etag, changed.etag)
+        self.assertEqual(b'{"changed": true}', backend.read(file.path))
+
+        backend.delete(file.path)
+        with self.assertRaises(NextcloudException):
+            backend.read(file.path)
+        backend.write(file.path, b"{}")
+        backend.delete("TURMX")
+        with self.assertRaises(NextcloudException):
+            backend.stat("TURMX/Projects")
+
+    def test_memory_backend(self):
+        self._check_backend(MemoryBackend())
+
+    def test_local_backend(self):
+        with tempfile.TemporaryDirectory() as root:
+            self._check_backend(LocalBackend(root))
+            self.assertEqual([], os.listdir(root))  # no temporary files left
+            with self.assertRaises(NextcloudException):
+                LocalBackend(root).read("../outside.json")
+
+    def test_parse_backends(self):
+        backends = parse_backends("turmx=memory; TURMX2=local:/mnt/nina;TURMX3=webdav")
+        self.assertEqual({"TURMX", "TURMX2"}, set(backends.keys()))
+        self.assertIsInstance(backends["TURMX"], MemoryBackend)
+        self.assertEqual("/mnt/nina", backends["TURMX2"].root)
+        with self.assertRaises(ValueError):
+            parse_backends("TURMX=ftp")
+
+    def test_backend_per_observatory(self):
+        # the files of the observatory never reach the nextcloud, so the client is not needed
+        nm.nc = Nextcloud(
+            nextcloud_url="http://127.0.0.1:1", nc_auth_user="x", nc_auth_pass="x"
+        )
+        old_backends = nm.backends
+        nm.backends = {"TURMX": MemoryBackend()}
+        projects = nm.get_projects_directory("TURMX")
+        try:
+            self.assertIs(nm.backends["TURMX"], nm.get_backend(projects))
+            self.assertIs(nm.webdav_backend, nm.get_backend("TURMX2/Projects"))
+
+            nm.mkdir(projects)
+            nm.upload_dict(f"{projects}/00001_M42.json", {"name": "M42"})
+            self.assertTrue(file_exists(f"{projects}/00001_M42.json"))
+            self.assertEqual(
+                {"name": "M42"}, nm.download_dict(f"{projects}/00001_M42.json")
+            )
+            self.assertEqual(
+                {f"{projects}/00001_M42.json": {"name": "M42"}},
+                nm.download_folder_dicts(projects),
+            )
+            nm.delete(f"{projects}/00001_M42.json")
+            self.assertFalse(file_exists(f"{projects}/00001_M42.json"))
+        finally:
+            nm.backends = old_backends
+            nm.reset_connection()
+
+
+class BenchmarkTestCase(django.test.TestCase):
+    def setUp(self):
+        call_command(
+            "load_configuration",
+            "./observation_data/test_data/dummy_config.json",
+            stdout=io.StringIO(),
+        )
+        self.user = ObservatoryUser.objects.create_user(
+            username="benchmark", password="benchmark"
+        )
+
+    def test_stub_server(self):
+        with StubNextcloudServer() as server:
+            nc = Nextcloud(
+                nextcloud_url=server.url, nc_auth_user=server.user, nc_auth_pass="x"
+            )
+            nc.files.mkdir("TURMX")
+            nc.files.upload("TURMX/00001_M42.json", b"{}")
+            self.assertEqual(b"{}", nc.files.download("TURMX/00001_M42.json"))
+            self.assertEqual(
+                ["TURMX/00001_M42.json"],
+                [node.user_path for node in nc.files.listdir("TURMX")],
+            )
+            nc.files.delete("TURMX/00001_M42.json")
+            self.assertEqual([], nc.files.listdir("TURMX"))
+            self.assertEqual(1, server.requests["PUT"])
+
+    def test_run_benchmark(self):
+        results = run_benchmark(10, self.user)
+        self.assertEqual({"upload", "update", "pending_deletion"}, set(results.keys()))
+        self.assertEqual(10, results["upload"]["requests"]["PUT"])
+        self.assertEqual(3, results["update"]["requests"]["DELETE"])  # finished by NINA
+        self.assertEqual(
+            2, results["pending_deletion"]["requests"]["DELETE"]
+        )  # one of them was already finished
+        self.assertFalse(AbstractObservation.objects.exists())
+
+        self.assertEqual([], compare_to_baseline({"10": results}, {"10": results}))
+        slower = json.loads(json.dumps(results))
+        slower["upload"]["queries"] *= 2
+        self.assertEqual(
+            1, len(compare_to_baseline({"10": slower}, {"10": results}, 0.5))
+        )
+        self.assertEqual([], compare_to_baseline({"10": slower}, {}))
+
+
+class ProgressHistoryTestCase(django.test.TestCase):
+    def setUp(self):
+        call_command(
+            "load_configuration",
+            "./observation_data/test_data/dummy_config.json",
+            stdout=io.StringIO(),
+        )
+        self.user = ObservatoryUser.objects.create_user(
+            username="forecast", password="forecast"
+        )
+        self.observations = [
+            ImagingObservation.objects.create(
+                observatory=Observatory.objects.get(name="TURMX"),
+                target=CelestialTarget.objects.create(
+                    name=f"Target{i}", ra="0", dec="0"
+                ),
+                user=self.user,
+                created_at=timezone.now(),
+                observation_type=ObservationType.IMAGING,
+                project_status=ObservationStatus.UPLOADED,
+                project_completion=0.0,
+                priority=1,
+                exposure_time=10.0,
+                frames_per_filter=10,
+            )
+            for i in range(3)
+        ]
+
+    def _record(self, obs, night: int, amounts: dict):
+        now = timezone.now() + timedelta(days=night)
+        progress_history.save_samples(
+            progress_history.create_samples(obs, amounts, now)
+        )
+
+    def test_exposure_amounts(self):
+        nc_dict = {
+            "targets": [
+                {
+                    "exposures": [
+                        {"filter": "L", "acceptedAmount": 2, "requiredAmount": 10},
+                        {"filter": "L", "acceptedAmount": 1, "requiredAmount": 5},
+                        {"filter": "B", "acceptedAmount": 0, "requiredAmount": 10},
+                    ]
+                }
+            ]
+        }
+        self.assertEqual(
+            {"L": [3, 15], "B": [0, 10]}, progress_history.exposure_amounts(nc_dict)
+        )
+        morning = timezone.make_aware(datetime(2025, 1, 2, 6))
+        evening = timezone.make_aware(datetime(2025, 1, 1, 22))
+        self.assertEqual(
+            progress_history.night_of(evening), progress_history.night_of(morning)
+        )
+
+    def test_forecast(self):
+        obs1, obs2, obs3 = self.observations
+        for night in range(3):
+            self._record(obs1, night, {"L": [2 * night, 10], "B": [night, 10]})
+        self._record(obs1, 2, {"L": [10, 10], "B": [10, 10]})  # same night, dropped
+        self._record(obs2, 0, {"L": [5, 10]})
+        self._record(obs3, 0, {"L": [10, 10]})
+        self.assertEqual(8, ProgressSample.objects.count())
+
+        # L: 6 frames missing at 2 per night, B: 8 frames missing at 1 per night
+        self.assertEqual(
+            {obs1.id: 8, obs2.id: None, obs3.id: 0},
+            progress_history.forecast_observations(),
+        )
+        self.assertEqual(
+            {"TURMX": {"remaining_nights": 8, "observations": 3, "forecasted": 2}},
+            progress_history.forecast_observatories(),
+        )
+
+        client = django.test.Client()
+        client.force_login(self.user)
+        response = client.get("/observation-data/forecast/")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {str(obs1.id): 8, str(obs2.id): None, str(obs3.id): 0},
+            response.json()["observations"],
+        )
+
+    def test_forecast_with_gap(self):
+        obs1, obs2, _ = self.observations
+        self._record(obs1, 0, {"L": [0, 20]})
+        self._record(obs1, 5, {"L": [10, 20]})  # no samples in the nights between
+        self._record(obs2, 0, {"L": [0, 20]})
+
+        # 10 frames missing at 2 per night
+        self.assertEqual(
+            {obs1.id: 5, obs2.id: None},
+            progress_history.forecast_observations(
+                AbstractObservation.objects.filter(id__in=[obs1.id, obs2.id])
+            ),
+        )
+
 
 # noinspection DuplicatedCode
 @unittest.skipIf(
@@ -515,6 +990,49 @@ class NextcloudSyncTestCase(django.test.TestCase):
             path1,
         )
 
+    def test_observation_index(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=7, target_name="I1", observatory=turmx)
+        self._create_imaging_observations(obs_id=8, target_name="I2", observatory=turmx)
+        upload_observations()
+        nm.upload_file(f"{self.prefix}/TURMX/Projects/notes.txt", file_upload)
+
+        index = nm.build_observation_index()
+        self.assertEqual({7, 8}, set(index.keys()))
+        obs = self._get_obs_by_id(7)
+        self.assertEqual(index[7].path, generate_observation_path(obs))
+        self.assertTrue(index[7].etag)
+        self.assertGreater(index[7].size, 0)
+        self.assertEqual(nm.get_observation_file(obs, index), index[7].path)
+        self.assertEqual(nm.get_observation_file(obs), index[7].path)
+
+        nm.delete(self.prefix)
+
+    def test_generate_observation_paths(self):
+        nm.initialize_connection()
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        for i in range(10):
+            self._create_imaging_observations(
+                obs_id=i, target_name=f"I{i}", observatory=turmx
+            )
+        observations = list(AbstractObservation.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            paths = nm.generate_observation_paths(observations)
+        self.assertEqual(2, len(queries))  # filter sets and targets
+        for obs in observations:
+            self.assertEqual(paths[obs.id], generate_observation_path(obs))
+
+        # observations without observatory have no path and are set to ERROR
+        AbstractObservation.objects.filter(id=0).update(observatory=None)
+        obs = self._get_obs_by_id(0)
+        self.assertIsNone(generate_observation_path(obs))
+        self.assertIsNone(nm.get_observation_file(obs))
+        self.assertEqual(self._get_obs_by_id(0).project_status, ObservationStatus.ERROR)
+        paths = nm.generate_observation_paths(AbstractObservation.objects.all())
+        self.assertEqual(set(range(1, 10)), set(paths))
+
     def test_upload_from_db_simple(self):
         # fmt: off
         nm.initialize_connection()
@@ -554,6 +1072,341 @@ class NextcloudSyncTestCase(django.test.TestCase):
         nm.delete(self.prefix)
         # fmt: on
 
+    def test_upload_from_db_concurrent(self):
+        # fmt: off
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        nm.mkdir(f"{self.prefix}/TURMX2/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        turmx2 = Observatory.objects.filter(name="TURMX2")[0]
+
+        for i in range(20):
+            self._create_imaging_observations(obs_id=i, target_name=f"I{i}", observatory=turmx if i % 2 else turmx2)
+        self._create_imaging_observations(obs_id=20, target_name="I20", observatory=turmx, project_status=ObservationStatus.COMPLETED)
+
+        upload_observations(concurrency=8)
+
+        for i in range(20):
+            obs = self._get_obs_by_id(i)
+            self.assertTrue(file_exists(generate_observation_path(obs)), f"For i={i}")
+            self.assertEqual(obs.project_status, ObservationStatus.UPLOADED)
+        obs = self._get_obs_by_id(20)
+        self.assertFalse(file_exists(generate_observation_path(obs)))
+        self.assertEqual(obs.project_status, ObservationStatus.COMPLETED)
+
+        nm.delete(self.prefix)
+        # fmt: on
+
+    def test_upload_sharded(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        nm.mkdir(f"{self.prefix}/TURMX2/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        turmx2 = Observatory.objects.filter(name="TURMX2")[0]
+        for i in range(5):
+            self._create_imaging_observations(
+                obs_id=i, target_name=f"I{i}", observatory=turmx if i < 3 else turmx2
+            )
+
+        # the test database is not visible to other processes, so the shards run in this process
+        summary = run_sharded("upload", ["TURMX", "TURMX2"], processes=1)
+        self.assertEqual(
+            summary["total"],
+            {"new": 5, "changed": 0, "skipped": 0, "failed": 0, "deferred": 0},
+        )
+        self.assertEqual(summary["shards"]["TURMX"]["result"]["new"], 3)
+        self.assertEqual(summary["shards"]["TURMX2"]["result"]["new"], 2)
+        for i in range(5):
+            obs = self._get_obs_by_id(i)
+            self.assertEqual(obs.project_status, ObservationStatus.UPLOADED)
+            self.assertTrue(self._obs_exists_in_nextcloud(obs))
+
+        summary = run_sharded("update", ["TURMX", "TURMX2"], processes=1)
+        self.assertIsNone(summary["shards"]["TURMX"]["error"])
+        self.assertIsNone(summary["shards"]["TURMX2"]["error"])
+
+        nm.delete(self.prefix)
+
+    def test_upload_skips_unchanged(self):
+        # fmt: off
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=0, target_name="I0", observatory=turmx)
+        self._create_imaging_observations(obs_id=1, target_name="I1", observatory=turmx)
+
+        summary = upload_observations()
+        self.assertEqual(summary, {"new": 2, "changed": 0, "skipped": 0, "failed": 0, "deferred": 0})
+
+        # progress written by NINA must not be overwritten by an observation that was saved without changes
+        self._set_accepted_amount(self._get_obs_by_id(0), 5)
+        self._get_obs_by_id(0).save()
+        obs = self._get_obs_by_id(1)
+        obs.priority = 42
+        obs.save()
+
+        summary = upload_observations()
+        self.assertEqual(summary, {"new": 0, "changed": 1, "skipped": 1, "failed": 0, "deferred": 0})
+
+        # observations that were not saved since their last upload are not serialized again
+        summary = upload_observations()
+        self.assertEqual(summary, {"new": 0, "changed": 0, "skipped": 0, "failed": 0, "deferred": 0})
+        obs_dict = nm.download_dict(generate_observation_path(self._get_obs_by_id(0)))
+        self.assertEqual(obs_dict["targets"][0]["exposures"][0]["acceptedAmount"], 5)
+        obs_dict = nm.download_dict(generate_observation_path(self._get_obs_by_id(1)))
+        self.assertEqual(obs_dict["priority"], 42)
+
+        # observations uploaded before the digest was stored are not uploaded again, only their digest is stored
+        AbstractObservation.objects.update(upload_digest="", sync_version=1, synced_version=0)
+        summary = upload_observations()
+        self.assertEqual(summary, {"new": 0, "changed": 0, "skipped": 2, "failed": 0, "deferred": 0})
+        obs_dict = nm.download_dict(generate_observation_path(self._get_obs_by_id(0)))
+        self.assertEqual(obs_dict["targets"][0]["exposures"][0]["acceptedAmount"], 5)
+        self.assertNotEqual("", self._get_obs_by_id(0).upload_digest)
+
+        # unless they were edited after the migration
+        AbstractObservation.objects.update(upload_digest="", sync_version=1, synced_version=0)
+        obs = self._get_obs_by_id(1)
+        obs.priority = 43
+        obs.save()
+        summary = upload_observations()
+        self.assertEqual(summary, {"new": 0, "changed": 1, "skipped": 1, "failed": 0, "deferred": 0})
+        obs_dict = nm.download_dict(generate_observation_path(self._get_obs_by_id(1)))
+        self.assertEqual(obs_dict["priority"], 43)
+
+        nm.delete(self.prefix)
+        # fmt: on
+
+    def test_write_back_keeps_concurrent_changes(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=0, target_name="I0", observatory=turmx)
+        self._create_imaging_observations(obs_id=1, target_name="I1", observatory=turmx)
+
+        # the user pauses observation 0 while it is uploaded
+        upload_dict = nm.upload_dict
+
+        def upload_and_pause(nc_path, obs_dict):
+            if os.path.basename(nc_path).startswith("00000_"):
+                AbstractObservation.objects.filter(id=0).update(
+                    project_status=ObservationStatus.PAUSED
+                )
+            upload_dict(nc_path, obs_dict)
+
+        with mock.patch.object(nm, "upload_dict", side_effect=upload_and_pause):
+            upload_observations()
+        self.assertEqual(
+            self._get_obs_by_id(0).project_status, ObservationStatus.PAUSED
+        )
+        self.assertEqual(
+            self._get_obs_by_id(1).project_status, ObservationStatus.UPLOADED
+        )
+
+    def test_sync_metrics(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=0, target_name="I0", observatory=turmx)
+        self._create_imaging_observations(obs_id=1, target_name="I1", observatory=turmx)
+
+        metrics_dir = sync_metrics.metrics_dir
+        sync_metrics.metrics_dir = tempfile.mkdtemp()
+        try:
+            upload_observations()
+            with open(f"{sync_metrics.metrics_dir}/sync_upload.json") as f:
+                metrics = json.load(f)
+            with open(f"{sync_metrics.metrics_dir}/sync_upload.prom") as f:
+                prometheus = f.read()
+        finally:
+            shutil.rmtree(sync_metrics.metrics_dir)
+            sync_metrics.metrics_dir = metrics_dir
+
+        self.assertTrue(metrics["success"])
+        self.assertEqual(metrics["requests"]["PUT"], 2)
+        self.assertGreater(metrics["bytes_sent"], 0)
+        self.assertEqual(metrics["transitions"], {"Pending Upload -> Uploaded": 2})
+        for phase in ["db_query", "listing", "serialization", "upload", "write_back"]:
+            self.assertIn(phase, metrics["phases"])
+        self.assertIn('turm_sync_requests{job="upload",verb="PUT"} 2', prometheus)
+        self.assertIn(
+            'turm_sync_status_transitions{job="upload",from="Pending Upload",to="Uploaded"} 2',
+            prometheus,
+        )
+
+    def test_sync_plan(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=0, target_name="I0", observatory=turmx)
+        self._create_imaging_observations(obs_id=1, target_name="I1", observatory=turmx)
+        self._create_expert_observation(
+            obs_id=2,
+            target_name="E2",
+            start_scheduling=self._day(0),
+            end_scheduling=self._day(10),
+            cadence=3,
+            observatory=turmx,
+        )
+        upload_observations(self._day(0))
+        update_observations(self._day(0))  # caches the progress
+
+        self._set_accepted_amount(self._get_obs_by_id(0), 10)
+        nm.build_observation_index()  # updates the snapshot
+        self._create_imaging_observations(obs_id=3, target_name="I3", observatory=turmx)
+        self._create_expert_observation(
+            obs_id=5,
+            target_name="E5",
+            start_scheduling=self._day(0),
+            end_scheduling=self._day(10),
+            cadence=3,
+            observatory=turmx,
+        )
+        ExpertObservation.objects.filter(id=5).update(next_upload=None)
+
+        with CaptureQueriesContext(connection) as queries:
+            plan = build_sync_plan(self._day(0))
+        self.assertEqual(2, len(queries))  # observations and snapshots
+        actions = {
+            (part, action["id"]): action["action"]
+            for part in ["upload", "update"]
+            for action in plan[part]
+        }
+        self.assertEqual(
+            {
+                ("upload", 2): "upload",  # scheduled for today
+                ("upload", 3): "upload",
+                ("update", 0): "download",  # file changed since the last download
+                ("update", 1): "skip",
+                ("update", 2): "skip",
+                ("update", 5): "skip",  # not uploaded, as it has no next upload
+            },
+            actions,
+        )
+
+        out = io.StringIO()
+        call_command("plan_sync", stdout=out)
+        self.assertEqual(
+            plan["summary"], json.loads(out.getvalue())["summary"]
+        )  # same date, same plan
+
+        # only the observations of the plan are synced
+        self._create_imaging_observations(obs_id=4, target_name="I4", observatory=turmx)
+        upload_observations(self._day(0), plan=plan)
+        update_observations(self._day(0), plan=plan)
+        self.assertEqual(
+            self._get_obs_by_id(0).project_status, ObservationStatus.COMPLETED
+        )
+        self.assertEqual(
+            self._get_obs_by_id(3).project_status, ObservationStatus.UPLOADED
+        )
+        self.assertEqual(
+            self._get_obs_by_id(4).project_status, ObservationStatus.PENDING
+        )
+
+    def test_upload_priority_budget(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=0, target_name="I0", observatory=turmx)
+        self._create_imaging_observations(
+            obs_id=1, target_name="I1", priority=10, observatory=turmx
+        )
+        for obs_id, days in [(2, 2), (3, 1)]:
+            self._create_exoplanet_observation(
+                obs_id=obs_id,
+                target_name=f"E{obs_id}",
+                priority=1000000,
+                start_observation=timezone.now() + timedelta(days=days),
+                end_observation=timezone.now() + timedelta(days=days, hours=2),
+                observatory=turmx,
+            )
+
+        # highest priority first, then the earliest observation window, then the oldest
+        plan = build_sync_plan()
+        self.assertEqual([3, 2, 1, 0], [action["id"] for action in plan["upload"]])
+
+        summary = upload_observations(budget_seconds=0)
+        self.assertEqual(4, summary["deferred"])
+        for obs_id in range(4):
+            self.assertEqual(
+                self._get_obs_by_id(obs_id).project_status, ObservationStatus.PENDING
+            )
+
+        summary = upload_observations(budget_seconds=60)
+        self.assertEqual(0, summary["deferred"])
+        self.assertEqual(4, summary["new"])
+
+    def test_sync_daemon(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=0, target_name="I0", observatory=turmx)
+        status_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(status_dir.cleanup)
+        status_file = os.path.join(status_dir.name, "sync_status.json")
+
+        # closing the connection would end the transaction of the test case
+        with (
+            nm.persistent_connection(),
+            mock.patch(
+                "nextcloud.sync_daemon.close_old_connections"
+            ) as close_old_connections,
+        ):
+            client = nm.nc
+            call_command(
+                "run_sync_daemon",
+                "--once",
+                "--deletion-interval",
+                "0",
+                "--outbox-interval",
+                "0",
+                "--status-file",
+                status_file,
+            )
+            nm.initialize_connection()
+            self.assertIs(client, nm.nc)  # all jobs used the same connection
+        self.assertTrue(close_old_connections.called)
+
+        self.assertEqual(
+            self._get_obs_by_id(0).project_status, ObservationStatus.UPLOADED
+        )
+        with open(status_file) as f:
+            status = json.load(f)
+        self.assertEqual({"upload", "update"}, set(status["jobs"].keys()))
+        for job in status["jobs"].values():
+            self.assertEqual(job["runs"], 1)
+            self.assertIsNone(job["last_error"])
+            self.assertGreaterEqual(job["last_duration"], 0)
+            self.assertEqual(job["interval"], 15 * 60)
+
+        nm.delete(self.prefix)
+
+    def test_upload_writes_back_in_bulk(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        for i in range(10):
+            self._create_imaging_observations(
+                obs_id=i, target_name=f"I{i}", observatory=turmx
+            )
+            self._create_monitoring_observation(
+                obs_id=i + 10, target_name=f"M{i}", observatory=turmx
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            upload_observations()
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(2, len(updates))  # observation table and monitoring table
+
+        self.assertEqual(
+            20,
+            AbstractObservation.objects.filter(
+                project_status=ObservationStatus.UPLOADED
+            ).count(),
+        )
+        nm.delete(self.prefix)
+
     def test_upload_from_db_status(self):
         nm.initialize_connection()
         nm.mkdir(f"{self.prefix}/TURMX/Projects")
@@ -589,6 +1442,32 @@ class NextcloudSyncTestCase(django.test.TestCase):
         # fmt: on
         nm.delete(self.prefix)
 
+    def test_due_for_upload(self):
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        # fmt: off
+        self._create_expert_observation(obs_id=0, target_name="E0", start_scheduling=self._day(0), end_scheduling=self._day(2), observatory=turmx)
+        self._create_monitoring_observation(obs_id=1, target_name="M0", start_scheduling=self._day(1), end_scheduling=self._day(3), observatory=turmx)
+        self._create_monitoring_observation(obs_id=2, target_name="M1", start_scheduling=self._day(-3), end_scheduling=self._day(-1), observatory=turmx)
+        self._create_imaging_observations(obs_id=3, target_name="I0", observatory=turmx)
+        # fmt: on
+
+        # expected due observations from day 0 to day 3 (both inclusive)
+        expected_due = [[0], [0, 1], [0, 1], [1]]
+        for day, expected in enumerate(expected_due):
+            due = AbstractObservation.objects.filter(_due_for_upload(self._day(day)))
+            self.assertEqual(
+                expected, sorted(due.values_list("id", flat=True)), f"Day: {day}"
+            )
+
+    def test_due_for_upload_uses_index(self):
+        if connection.vendor == "postgresql":
+            # the test tables are too small for the planner to prefer an index otherwise
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        for queryset in _due_querysets(self._day(0)):
+            index = f"{queryset.model._meta.model_name}_due_idx"
+            self.assertIn(index, queryset.explain(), queryset.model.__name__)
+
     def test_upload_from_db_repetitive_observations(self):
         # fmt: off
         nm.initialize_connection()
@@ -724,6 +1603,102 @@ class NextcloudSyncTestCase(django.test.TestCase):
         nm.delete(self.prefix)
         # fmt: on
 
+    def test_download_non_scheduled_concurrent(self):
+        # fmt: off
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+
+        for i in range(12):
+            self._create_imaging_observations(obs_id=i, target_name=f"I{i}", observatory=turmx, frames_per_filter=10)
+        upload_observations()
+
+        for i in range(0, 12, 3):
+            self._set_accepted_amount(self._get_obs_by_id(i), 10)
+        for i in range(1, 12, 3):
+            self._set_accepted_amount(self._get_obs_by_id(i), 5)
+        nm.delete(generate_observation_path(self._get_obs_by_id(11)))
+
+        update_observations(concurrency=4)
+
+        for i in range(0, 12, 3):
+            obs = self._get_obs_by_id(i)
+            self.assertEqual(obs.project_status, ObservationStatus.COMPLETED, f"For i={i}")
+            self.assertFalse(self._obs_exists_in_nextcloud(obs))
+        for i in range(1, 11, 3):
+            obs = self._get_obs_by_id(i)
+            self.assertEqual(obs.project_status, ObservationStatus.UPLOADED, f"For i={i}")
+            self.assertEqual(obs.project_completion, 50.0)
+        for i in range(2, 11, 3):
+            obs = self._get_obs_by_id(i)
+            self.assertEqual(obs.project_status, ObservationStatus.UPLOADED, f"For i={i}")
+            self.assertEqual(obs.project_completion, 0.0)
+        self.assertEqual(self._get_obs_by_id(11).project_status, ObservationStatus.ERROR)
+
+        nm.delete(self.prefix)
+        # fmt: on
+
+    def test_download_bulk(self):
+        # fmt: off
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        nm.mkdir(f"{self.prefix}/TURMX2/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        turmx2 = Observatory.objects.filter(name="TURMX2")[0]
+
+        for i in range(6):
+            self._create_imaging_observations(obs_id=i, target_name=f"I{i}", observatory=turmx if i % 2 else turmx2, frames_per_filter=10)
+        upload_observations()
+        nm.upload_file(f"{self.prefix}/TURMX/Projects/notes.json", file_upload)
+
+        nc_dicts = nm.download_folder_dicts(f"{self.prefix}/TURMX/Projects")
+        self.assertEqual({generate_observation_path(self._get_obs_by_id(i)) for i in range(1, 6, 2)}, set(nc_dicts.keys()) - {f"{self.prefix}/TURMX/Projects/notes.json"})
+
+        self._set_accepted_amount(self._get_obs_by_id(0), 10)
+        self._set_accepted_amount(self._get_obs_by_id(1), 5)
+        update_observations(bulk=True)
+
+        self.assertEqual(self._get_obs_by_id(0).project_status, ObservationStatus.COMPLETED)
+        self.assertFalse(self._obs_exists_in_nextcloud(self._get_obs_by_id(0)))
+        self.assertEqual(self._get_obs_by_id(1).project_status, ObservationStatus.UPLOADED)
+        self.assertEqual(self._get_obs_by_id(1).project_completion, 50.0)
+        for i in range(2, 6):
+            obs = self._get_obs_by_id(i)
+            self.assertEqual(obs.project_status, ObservationStatus.UPLOADED, f"For i={i}")
+            self.assertEqual(obs.project_completion, 0.0)
+
+        nm.delete(self.prefix)
+        # fmt: on
+
+    def test_download_skips_unchanged_progress(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(
+            obs_id=0, target_name="I0", observatory=turmx, frames_per_filter=10
+        )
+        upload_observations()
+        self._set_accepted_amount(self._get_obs_by_id(0), 2)
+
+        update_observations()
+        obs = self._get_obs_by_id(0)
+        self.assertEqual(obs.project_completion, 20.0)
+        self.assertEqual(
+            obs.progress_cache["etag"], nm.build_observation_index()[0].etag
+        )
+
+        # the file is not downloaded again as long as its ETag is unchanged, so the (tampered) cached progress is used
+        obs.progress_cache["progress"] = 30.0
+        obs.save()
+        update_observations()
+        self.assertEqual(self._get_obs_by_id(0).project_completion, 30.0)
+
+        self._set_accepted_amount(self._get_obs_by_id(0), 4)
+        update_observations()
+        self.assertEqual(self._get_obs_by_id(0).project_completion, 40.0)
+
+        nm.delete(self.prefix)
+
     def test_update_scheduled_1(self):
         """
         Simple test of a scheduled observation where to observation is uploaded every day. Every night, the entire partial observation is completed
@@ -1265,6 +2240,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         upload_observations()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.PAUSED)
@@ -1276,6 +2252,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         upload_observations()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.UPLOADED)
@@ -1298,6 +2275,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.PAUSED)
         self.assertTrue(self._obs_exists_in_nextcloud(obs))
@@ -1311,6 +2289,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.UPLOADED)
         self.assertTrue(self._obs_exists_in_nextcloud(obs))
@@ -1341,6 +2320,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.PAUSED)
         self.assertTrue(self._obs_exists_in_nextcloud(obs))
@@ -1353,6 +2333,97 @@ class NextcloudSyncTestCase(django.test.TestCase):
         self.assertEqual(obs.project_status, ObservationStatus.FAILED)
         self.assertFalse(self._obs_exists_in_nextcloud(obs))
 
+    def test_outbox(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        self._create_imaging_observations(obs_id=0, target_name="I1", observatory=turmx)
+        upload_observations()
+
+        # pausing and resuming before the outbox is processed only carries out the resume
+        for _ in range(2):
+            response = self.client.post(
+                path=f"/observation-data/pause/{0}",
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(OutboxEntry.objects.count(), 2)
+        self.assertEqual(process_outbox(), {"done": 1, "retried": 0, "failed": 0})
+        self.assertEqual(OutboxEntry.objects.count(), 0)
+        obs = self._get_obs_by_id(0)
+        self.assertEqual(obs.project_status, ObservationStatus.UPLOADED)
+        obs_dict = nm.download_dict(generate_observation_path(obs))
+        self.assertEqual(obs_dict["active"], True)
+
+        # failed uploads are retried until the maximum number of attempts is reached
+        response = self.client.post(
+            path=f"/observation-data/pause/{0}",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+        nm.delete(f"{self.prefix}/TURMX/Projects")
+        self.assertEqual(
+            process_outbox(max_attempts=2, retry_delay=timedelta(0)),
+            {"done": 0, "retried": 1, "failed": 0},
+        )
+        entry = OutboxEntry.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertNotEqual(entry.last_error, "")
+        self.assertEqual(
+            process_outbox(max_attempts=2, retry_delay=timedelta(0)),
+            {"done": 0, "retried": 0, "failed": 1},
+        )
+        self.assertEqual(OutboxEntry.objects.count(), 0)
+        obs = self._get_obs_by_id(0)
+        self.assertEqual(obs.project_status, ObservationStatus.ERROR)
+
+    def test_outbox_deletion(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.prefix}/TURMX/Projects")
+
+        turmx = Observatory.objects.filter(name="TURMX")[0]
+        for obs_id in range(3):
+            self._create_imaging_observations(
+                obs_id=obs_id, target_name=f"I{obs_id}", observatory=turmx
+            )
+        upload_observations()
+        paths = [generate_observation_path(self._get_obs_by_id(i)) for i in range(3)]
+
+        for path in [f"/observation-data/delete/{0}", f"/observation-data/finish/{1}"]:
+            response = self.client.post(path=path, content_type="application/json")
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(OutboxEntry.objects.count(), 2)
+        for entry in OutboxEntry.objects.all():
+            self.assertEqual(entry.action, OutboxAction.DELETE)
+            self.assertEqual(entry.next_attempt, deletion_due(entry.created_at))
+            self.assertGreater(entry.next_attempt, entry.created_at)
+
+        # deletions are not carried out before the observing night is over
+        self.assertEqual(process_outbox(), {"done": 0, "retried": 0, "failed": 0})
+        OutboxEntry.objects.update(next_attempt=timezone.now())
+        self.assertEqual(process_outbox(), {"done": 2, "retried": 0, "failed": 0})
+        self.assertEqual(OutboxEntry.objects.count(), 0)
+        self.assertFalse(AbstractObservation.objects.filter(id=0).exists())
+        self.assertEqual(
+            self._get_obs_by_id(1).project_status, ObservationStatus.COMPLETED
+        )
+        self.assertFalse(file_exists(paths[0]))
+        self.assertFalse(file_exists(paths[1]))
+        self.assertTrue(file_exists(paths[2]))
+
+        # outdated deletions are dropped
+        response = self.client.post(
+            path=f"/observation-data/delete/{2}", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 202)
+        AbstractObservation.objects.filter(id=2).update(
+            project_status=ObservationStatus.UPLOADED
+        )
+        OutboxEntry.objects.update(next_attempt=timezone.now())
+        self.assertEqual(process_outbox(), {"done": 1, "retried": 0, "failed": 0})
+        self.assertTrue(file_exists(paths[2]))
+
     def test_pause_scheduled(self):
         nm.initialize_connection()
         nm.mkdir(f"{self.prefix}/TURMX/Projects")
@@ -1373,6 +2444,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.PAUSED)
 
@@ -1388,6 +2460,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.PENDING)
         upload_observations(self._day(1))
@@ -1399,6 +2472,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
             content_type="application/json",
         )
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.PAUSED)
         self.assertTrue(self._obs_exists_in_nextcloud(obs))
@@ -1422,6 +2496,7 @@ class NextcloudSyncTestCase(django.test.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
+        process_outbox()
         obs = self._get_obs_by_id(0)
         self.assertEqual(obs.project_status, ObservationStatus.UPLOADED)
 
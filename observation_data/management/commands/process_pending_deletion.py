@@ -11,4 +11,13 @@ class Command(BaseCommand):
     help = "Deletes all observations with status PENDING_DELETION and all users with deletion_pending=True"
 
     def handle(self, *args, **options):
-        process_pending_deletion()
+        process_pending_deletion(concurrency=options["concurrency"])
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            "-c",
+            type=int,
+            help="Maximum number of concurrent deletions in the nextcloud",
+            default=1,
+        )
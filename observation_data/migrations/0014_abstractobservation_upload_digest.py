@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("observation_data", "0013_alter_abstractobservation_project_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="abstractobservation",
+            name="upload_digest",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
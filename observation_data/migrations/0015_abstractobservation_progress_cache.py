@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-16 21:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("observation_data", "0014_abstractobservation_upload_digest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="abstractobservation",
+            name="progress_cache",
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("observation_data", "0015_abstractobservation_progress_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="abstractobservation",
+            name="sync_version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="abstractobservation",
+            name="synced_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
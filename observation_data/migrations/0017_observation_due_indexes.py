@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("observation_data", "0016_abstractobservation_sync_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="abstractobservation",
+            index=models.Index(
+                fields=["project_status"], name="observation_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expertobservation",
+            index=models.Index(
+                fields=["next_upload", "end_scheduling"],
+                name="expertobservation_due_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="monitoringobservation",
+            index=models.Index(
+                fields=["next_upload", "end_scheduling"],
+                name="monitoringobservation_due_idx",
+            ),
+        ),
+    ]
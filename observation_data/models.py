@@ -129,6 +129,42 @@ class AbstractObservation(PolymorphicModel):
     priority = models.IntegerField()
     exposure_time = models.DecimalField(max_digits=10, decimal_places=2)
     filter_set = models.ManyToManyField(Filter, related_name="observations")
+    upload_digest = models.CharField(
+        max_length=64, blank=True, default=""
+    )  # SHA-256 of the JSON last uploaded to the nextcloud
+    progress_cache = models.JSONField(
+        null=True, blank=True, default=None
+    )  # ETag, progress and endDateTime of the progress file last downloaded from the nextcloud
+    sync_version = models.PositiveIntegerField(
+        default=1
+    )  # increased on every save, e.g. by the serializers, views and status changes
+    synced_version = models.PositiveIntegerField(
+        default=0
+    )  # sync_version the nextcloud is known to be up to date with
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project_status"], name="observation_status_idx")
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the project_status the observation was loaded with as `loaded_status`,
+        so changes made by others in the meantime can be detected before it is written back.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_status = instance.__dict__.get("project_status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the observation and marks it as changed for the upload to the nextcloud by increasing its sync_version.
+        Saves restricted to `update_fields` do not change the sync_version.
+        """
+        if kwargs.get("update_fields") is None:
+            self.sync_version += 1
+        super().save(*args, **kwargs)
 
 
 class ImagingObservation(AbstractObservation):
@@ -148,6 +184,12 @@ class VariableObservation(AbstractObservation):
 class ScheduledObservation(AbstractObservation):
     class Meta:
         abstract = True
+        # the observations due for upload are selected by their next upload (see `nextcloud_sync.upload_observations`)
+        indexes = [
+            models.Index(
+                fields=["next_upload", "end_scheduling"], name="%(class)s_due_idx"
+            )
+        ]
 
     start_scheduling = models.DateField(blank=True, null=True)
     end_scheduling = models.DateField(blank=True, null=True)
@@ -1,16 +1,19 @@
 import logging
+from collections import defaultdict
 
 from django.core.exceptions import BadRequest
+from django.db import transaction
 from django.db.models import Q
 from nc_py_api import NextcloudException
 
 from accounts.models import ObservatoryUser
-from nextcloud.nextcloud_manager import (
-    generate_observation_path,
-)
 from observation_data.models import AbstractObservation, ObservationStatus
 
 import nextcloud.nextcloud_manager as nm
+from nextcloud import sync_metrics
+from nextcloud.models import OutboxAction, OutboxEntry
+from nextcloud.nextcloud_sync import map_concurrently
+from nextcloud.outbox import deletion_due
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +41,11 @@ def delete_observation(observation_id: int):
         logger.info(
             f"Status of observation {obs.id} with target {obs.target.name} set to {obs.project_status}"
         )
-        obs.save()
+        with transaction.atomic():
+            obs.save()
+            OutboxEntry.objects.create(
+                observation=obs, action=OutboxAction.DELETE, next_attempt=deletion_due()
+            )
         return
 
     obs.delete()
@@ -47,14 +54,24 @@ def delete_observation(observation_id: int):
     )
 
 
-def process_pending_deletion():
-    process_pending_deletion_observations()
+@sync_metrics.collect_metrics("pending_deletion")
+def process_pending_deletion(concurrency: int = 1):
+    process_pending_deletion_observations(concurrency)
     process_pending_deletion_users()
 
 
-def process_pending_deletion_observations():
+@sync_metrics.collect_metrics("pending_deletion")
+@nm.listing_cache()
+def process_pending_deletion_observations(concurrency: int = 1) -> dict | None:
     """
     Deletes all observations with status PENDING_DELETE from database and if existent from nextcloud.
+    Observations with status PENDING_COMPLETION are deleted from the nextcloud and set to COMPLETED.
+    The files are looked up in one index and deleted concurrently, afterward all rows are deleted or completed in bulk in one transaction.
+    Observations whose file could not be deleted are kept unchanged and retried in the next run.
+
+    :param concurrency: Maximum number of concurrent deletions in the nextcloud; default=1 deletes one file after another.
+    :return: dict with the ids of the "deleted" and "completed" observations and the errors of the "failed" observations by id,
+        or None if the nextcloud could not be reached
     """
     try:
         nm.initialize_connection()
@@ -62,35 +79,80 @@ def process_pending_deletion_observations():
         logger.error(
             "Could not connect to Nextcloud. Observations with status PENDING_DELETE were not deleted"
         )
-        return
+        return None
+
+    with sync_metrics.phase("listing"):
+        index = nm.build_observation_index()
+    with sync_metrics.phase("db_query"):
+        observations = list(
+            AbstractObservation.objects.filter(
+                Q(project_status=ObservationStatus.PENDING_DELETION)
+                | Q(project_status=ObservationStatus.PENDING_COMPLETION)
+            ).select_related("target")
+        )
 
-    for obs in AbstractObservation.objects.filter(
-        Q(project_status=ObservationStatus.PENDING_DELETION)
-        | Q(project_status=ObservationStatus.PENDING_COMPLETION)
-    ):
-        nc_path = generate_observation_path(obs)
-        if nm.file_exists(nc_path):
-            nm.delete(nc_path)
-            logger.info(
-                f"Observation {obs.id} with target {obs.target.name} deleted successfully from Nextcloud."
-            )
+    deletions = []
+    for obs in observations:
+        nc_path = nm.get_observation_file(obs, index)
+        if nc_path is not None:
+            deletions.append((obs, nc_path))
         else:
             logger.info(
                 f"Observation {obs.id} with target {obs.target.name} does not exist in Nextcloud."
             )
 
-        if obs.project_status == ObservationStatus.PENDING_COMPLETION:
-            obs.project_status = ObservationStatus.COMPLETED
+    report = {"deleted": [], "completed": [], "failed": {}}
+    with sync_metrics.phase("delete"):
+        for (obs, nc_path), _, error in map_concurrently(
+            lambda deletion: nm.delete(deletion[1]), deletions, concurrency
+        ):
+            if error is not None and error.status_code != 404:
+                logger.error(
+                    f"Failed to delete observation {obs.id} with target {obs.target.name} from Nextcloud. Got: {error}"
+                )
+                report["failed"][obs.id] = str(error)
+                continue
             logger.info(
-                f"Status of observation {obs.id} with target {obs.target.name} set to {obs.project_status}"
+                f"Observation {obs.id} with target {obs.target.name} deleted successfully from Nextcloud."
             )
-            obs.save()
+
+    deleted_by_model = defaultdict(list)
+    for obs in observations:
+        if obs.id in report["failed"]:
+            continue
+        if obs.project_status == ObservationStatus.PENDING_COMPLETION:
+            report["completed"].append(obs.id)
         else:
-            obs.delete()
-            logger.info(
-                f"Observation {obs.id} with target {obs.target.name} deleted successfully from database."
-            )
-    logger.info("All observations with status PENDING_DELETE deleted successfully.")
+            report["deleted"].append(obs.id)
+            deleted_by_model[type(obs)].append(obs.id)
+
+    with sync_metrics.phase("write_back"), transaction.atomic():
+        AbstractObservation.objects.filter(id__in=report["completed"]).update(
+            project_status=ObservationStatus.COMPLETED
+        )
+        # Deleting through the subclasses loads the parent rows along with them, deleting through AbstractObservation
+        # would fetch the parent row of every observation one by one while collecting the cascades.
+        for model, obs_ids in deleted_by_model.items():
+            model.objects.non_polymorphic().filter(id__in=obs_ids).delete()
+    sync_metrics.record_transition(
+        ObservationStatus.PENDING_COMPLETION,
+        ObservationStatus.COMPLETED,
+        len(report["completed"]),
+    )
+    sync_metrics.record_transition(
+        ObservationStatus.PENDING_DELETION, "Deleted", len(report["deleted"])
+    )
+
+    logger.info(
+        f"Set status of observations {report['completed']} to {ObservationStatus.COMPLETED}, deleted observations {report['deleted']} from database."
+    )
+    if report["failed"]:
+        logger.error(
+            f"Failed to delete {len(report['failed'])} observations, they are retried in the next run: {report['failed']}"
+        )
+    else:
+        logger.info("All observations with status PENDING_DELETE deleted successfully.")
+    return report
 
 
 def process_pending_deletion_users():
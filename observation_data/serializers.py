@@ -8,6 +8,7 @@ from collections import OrderedDict
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from django.db.models import prefetch_related_objects
 from django.utils import timezone
 from rest_framework import serializers
 
@@ -25,6 +26,7 @@ from .models import (
     MonitoringObservation,
     ExpertObservation,
     Observatory,
+    ObservatoryExposureSettings,
     Filter,
     ObservationType,
     ObservationStatus,
@@ -138,20 +140,72 @@ def _convert_decimal_fields(rep):
     return rep
 
 
+def get_project_name(instance) -> str:
+    """
+    Builds the name of the project, e.g. "Imaging_HOS_NGC7822", without serializing the whole observation.
+    Only needs the observation type, the filter set and the target, the latter two can be prefetched.
+    :param instance: Observation instance
+    :return: Name of the project
+    """
+    filters = "".join([f.filter_type for f in instance.filter_set.all()])
+    return f"{instance.observation_type}_{filters}_{instance.target.name}"
+
+
+def load_exposure_settings():
+    """
+    Loads the exposure settings of all observatories with a single query.
+    Can be passed to the serializers as context "exposure_settings", so they do not query the exposure settings of every observation.
+    :return: Dictionary mapping (observatory name, observation type) to the exposure settings
+    """
+    lookup = {}
+    for settings in ObservatoryExposureSettings.objects.select_related(
+        "exposure_settings"
+    ).order_by("exposure_settings_id"):
+        # the settings with the lowest id are used, like `first()` does
+        lookup.setdefault(
+            (settings.observatory_id, settings.observation_type),
+            settings.exposure_settings,
+        )
+    return lookup
+
+
+def serialize_many(observations):
+    """
+    Serializes many observations with a constant number of queries, regardless of their number.
+    The related objects are prefetched and the exposure settings are loaded once (see `load_exposure_settings`).
+    The representations are the same as the ones of the serializer of each observation.
+    :param observations: Observations, as polymorphic queryset or list of observation instances
+    :return: Dictionary mapping the observation ids to their representation, in the order of the observations
+    """
+    observations = list(observations)
+    prefetch_related_objects(
+        observations, "target", "user", "observatory", "filter_set"
+    )
+    context = {"exposure_settings": load_exposure_settings()}
+    return {
+        obs.id: get_serializer(obs.observation_type)(obs, context=context).data
+        for obs in observations
+    }
+
+
 # noinspection PyTypeChecker
-def _to_representation(instance, additional_fields=None, exposure_fields=None):
+def _to_representation(
+    instance, additional_fields=None, exposure_fields=None, exposure_settings=None
+):
     """
     Convert an observation instance to a dictionary representation.
     :param instance: Observation instance
     :param additional_fields: Additional fields to add to the representation
     :param exposure_fields: Additional fields to add to each exposure. Do not add these to additional_fields.
+    :param exposure_settings: Exposure settings by observatory and observation type (see `load_exposure_settings`).
+        If None, the exposure settings of the observation are queried.
     :return: Dictionary representation of the observation
     """
     if not instance.observatory:
         logger.warning(f"Observation {instance.id} has no observatory")
 
     rep = {
-        "name": f"{instance.observation_type}_{''.join([f.filter_type for f in instance.filter_set.all()])}_{instance.target.name}",
+        "name": get_project_name(instance),
         "id": str(instance.user.username),
         "active": instance.project_status != ObservationStatus.PAUSED,
         "priority": instance.priority,
@@ -192,20 +246,24 @@ def _to_representation(instance, additional_fields=None, exposure_fields=None):
         rep.update(additional_fields)
 
     # Populate the exposures dynamically based on filters
-    exposure_settings = instance.observatory.exposure_settings.filter(
-        observatoryexposuresettings__observation_type=instance.observation_type,
-        observatoryexposuresettings__observatory=instance.observatory,
-    )
+    if exposure_settings is None:
+        exposure_settings = instance.observatory.exposure_settings.filter(
+            observatoryexposuresettings__observation_type=instance.observation_type,
+            observatoryexposuresettings__observatory=instance.observatory,
+        ).first()
+    else:
+        exposure_settings = exposure_settings.get(
+            (instance.observatory.name, instance.observation_type)
+        )
 
     if (
-        not exposure_settings.exists()
+        exposure_settings is None
         and instance.observation_type != ObservationType.EXPERT
     ):
         raise serializers.ValidationError(
             f"Exposure settings for observatory {instance.observatory.name} and observation type {instance.observation_type} not found"
         )
 
-    exposure_settings = exposure_settings.first()
     exposure_order = [
         "filter",
         "exposureTime",
@@ -358,6 +416,7 @@ class ImagingObservationSerializer(serializers.ModelSerializer):
             instance=instance,
             exposure_fields=exposure_fields,
             additional_fields=additional_fields,
+            exposure_settings=self.context.get("exposure_settings"),
         )
 
 
@@ -412,6 +471,7 @@ class ExoplanetObservationSerializer(serializers.ModelSerializer):
             instance=instance,
             additional_fields=additional_fields,
             exposure_fields=exposure_fields,
+            exposure_settings=self.context.get("exposure_settings"),
         )
 
 
@@ -450,6 +510,7 @@ class VariableObservationSerializer(serializers.ModelSerializer):
             instance=instance,
             additional_fields=additional_fields,
             exposure_fields=exposure_fields,
+            exposure_settings=self.context.get("exposure_settings"),
         )
 
 
@@ -498,6 +559,7 @@ class MonitoringObservationSerializer(serializers.ModelSerializer):
             instance=instance,
             additional_fields=additional_fields,
             exposure_fields=exposure_fields,
+            exposure_settings=self.context.get("exposure_settings"),
         )
 
 
@@ -657,6 +719,7 @@ class ExpertObservationSerializer(serializers.ModelSerializer):
             instance=instance,
             additional_fields=additional_fields,
             exposure_fields=exposure_fields,
+            exposure_settings=self.context.get("exposure_settings"),
         )
 
 
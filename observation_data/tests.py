@@ -10,6 +10,8 @@ import django.test
 from django.contrib.auth.models import Permission
 from django.core.management import call_command
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from dotenv import load_dotenv
 
 from accounts.models import ObservatoryUser, UserPermission
@@ -32,8 +34,12 @@ from observation_data.models import (
 )
 from observation_data.observation_management import (
     process_pending_deletion,
+    process_pending_deletion_observations,
 )
 from observation_data.serializers import (
+    get_project_name,
+    get_serializer,
+    serialize_many,
     ExpertObservationSerializer,
     ImagingObservationSerializer,
     ExoplanetObservationSerializer,
@@ -1760,6 +1766,37 @@ class JsonFormattingTestCase(django.test.TestCase):
         )
         self.assertEqual(serializer.data["targets"][0]["name"], "TEST2")
 
+    def test_project_name(self):
+        for obs in AbstractObservation.objects.all():
+            self.assertEqual(
+                get_project_name(obs),
+                get_serializer(obs.observation_type)(obs).data["name"],
+            )
+
+    def test_serialize_many(self):
+        def serialize_all():
+            with CaptureQueriesContext(connection) as queries:
+                obs_dicts = serialize_many(AbstractObservation.objects.order_by("id"))
+            return obs_dicts, len(queries)
+
+        obs_dicts, num_queries = serialize_all()
+        for obs in AbstractObservation.objects.all():
+            self.assertEqual(
+                json.dumps(get_serializer(obs.observation_type)(obs).data),
+                json.dumps(obs_dicts[obs.id]),
+            )
+
+        # the number of queries does not depend on the number of observations
+        for obs in list(ImagingObservation.objects.all()):
+            filters = list(obs.filter_set.all())
+            obs.pk = obs.id = None
+            obs._state.adding = True
+            obs.save()
+            obs.filter_set.set(filters)
+        obs_dicts, more_queries = serialize_all()
+        self.assertEqual(AbstractObservation.objects.count(), len(obs_dicts))
+        self.assertEqual(num_queries, more_queries)
+
 
 class ObservationManagementTestCase(django.test.TestCase):
     old_prefix = ""
@@ -1944,6 +1981,75 @@ class ObservationManagementTestCase(django.test.TestCase):
 
         nm.delete(self.nc_prefix)
 
+    @skipIf(
+        not run_nc_test,
+        "Nextclouds test cannot run in CI. Set env variable `NC_TEST=True` to run nextcloud tests.",
+    )
+    def test_batched_deletion(self):
+        nm.initialize_connection()
+        nm.mkdir(f"{self.nc_prefix}/TURMX/Projects")
+        for obs_id in range(1, 9):
+            self.create_test_observation(obs_id=obs_id)
+        upload_observations()
+        paths = {
+            obs.id: generate_observation_path(obs)
+            for obs in AbstractObservation.objects.all()
+        }
+        nm.delete(paths[4])  # deleted files are skipped
+        AbstractObservation.objects.filter(id__in=[1, 2, 3, 4]).update(
+            project_status=ObservationStatus.PENDING_DELETION
+        )
+        AbstractObservation.objects.filter(id__in=[5, 6]).update(
+            project_status=ObservationStatus.PENDING_COMPLETION
+        )
+
+        report = process_pending_deletion_observations(concurrency=4)
+        self.assertEqual(sorted(report["deleted"]), [1, 2, 3, 4])
+        self.assertEqual(sorted(report["completed"]), [5, 6])
+        self.assertEqual(report["failed"], {})
+
+        self.assertEqual(
+            [5, 6, 7, 8],
+            sorted(AbstractObservation.objects.values_list("id", flat=True)),
+        )
+        for obs_id in [5, 6]:
+            self.assertEqual(
+                AbstractObservation.objects.get(id=obs_id).project_status,
+                ObservationStatus.COMPLETED,
+            )
+        for obs_id in range(1, 7):
+            self.assertFalse(nm.file_exists(paths[obs_id]))
+        for obs_id in [7, 8]:
+            self.assertTrue(nm.file_exists(paths[obs_id]))
+        self.assertFalse(
+            ImagingObservation.objects.filter(id__in=[1, 2, 3, 4]).exists()
+        )
+
+        nm.delete(self.nc_prefix)
+
+    @skipIf(
+        not run_nc_test,
+        "Nextclouds test cannot run in CI. Set env variable `NC_TEST=True` to run nextcloud tests.",
+    )
+    def test_deletion_queries(self):
+        def delete_observations(obs_ids):
+            for obs_id in obs_ids:
+                self.create_test_observation(obs_id=obs_id)
+            AbstractObservation.objects.update(
+                project_status=ObservationStatus.PENDING_DELETION
+            )
+            with CaptureQueriesContext(connection) as queries:
+                report = process_pending_deletion_observations()
+            self.assertEqual(sorted(report["deleted"]), list(obs_ids))
+            return len(queries)
+
+        delete_observations([1])  # fills the content type cache
+        # the number of queries does not depend on the number of observations
+        num_queries = delete_observations(range(2, 4))
+        self.assertEqual(num_queries, delete_observations(range(4, 24)))
+        self.assertFalse(AbstractObservation.objects.exists())
+        self.assertFalse(ImagingObservation.objects.exists())
+
     def test_does_not_obs_exists_in_nc(self):
         # simulates the situation a successful deletion where the observation is not in the nextcloud
         obs_id = 42
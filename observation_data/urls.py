@@ -5,6 +5,7 @@ from observation_data.views import (
     delete_observation,
     edit_observation,
     finish_observation,
+    progress_forecast,
     toggle_pause_observation,
 )
 
@@ -21,4 +22,5 @@ urlpatterns = [
         edit_observation,
     ),
     path("finish/<int:observation_id>", finish_observation, name="finish-observation"),
+    path("forecast/", progress_forecast, name="progress-forecast"),
 ]
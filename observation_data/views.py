@@ -1,7 +1,7 @@
 import logging
 
-import httpx
 from django.core.exceptions import FieldDoesNotExist, BadRequest
+from django.db import transaction
 from django.db.models import ManyToManyField
 from django.http import QueryDict
 from django.views.decorators.http import require_POST
@@ -9,12 +9,9 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from nextcloud.nextcloud_manager import (
-    initialize_connection,
-    file_exists,
-    generate_observation_path,
-    upload_dict,
-)
+from nextcloud import progress_history
+from nextcloud.models import OutboxAction, OutboxEntry
+from nextcloud.outbox import deletion_due
 from observation_data import observation_management
 from observation_data.models import (
     ObservationType,
@@ -190,9 +187,16 @@ def finish_observation(request, observation_id):
 
     if observation.project_status == ObservationStatus.UPLOADED:
         observation.project_status = ObservationStatus.PENDING_COMPLETION
+        with transaction.atomic():
+            observation.save()
+            OutboxEntry.objects.create(
+                observation=observation,
+                action=OutboxAction.DELETE,
+                next_attempt=deletion_due(),
+            )
     else:
         observation.project_status = ObservationStatus.COMPLETED
-    observation.save()
+        observation.save()
     return Response(status=status.HTTP_202_ACCEPTED)
 
 
@@ -224,44 +228,17 @@ def toggle_pause_observation(request, observation_id):
             status=status.HTTP_401_UNAUTHORIZED,
         )
 
-    if obs.project_status == ObservationStatus.PAUSED:
-        obs.project_status = ObservationStatus.PENDING
-        obs.save()
-        initialize_connection()
-        nc_path = generate_observation_path(obs)
-        try:
-            if file_exists(nc_path):
-                serializer = get_serializer(obs.observation_type)
-                serializer = serializer(obs)
-                upload_dict(nc_path, serializer.data)
-                obs.project_status = ObservationStatus.UPLOADED
-                obs.save()
-        except httpx.ConnectError as e:
-            logger.error(f"Failed to connect to Nextcloud: {str(e)}")
-            return Response(
-                {"error": "Failed to connect to the nextcloud server"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
-
-    elif obs.project_status == ObservationStatus.UPLOADED:
-        try:
+    # the nextcloud is updated by process_outbox, so the request does not wait for it
+    with transaction.atomic():
+        if obs.project_status == ObservationStatus.PAUSED:
+            obs.project_status = ObservationStatus.PENDING
+            OutboxEntry.objects.create(observation=obs, action=OutboxAction.RESUME)
+        elif obs.project_status == ObservationStatus.UPLOADED:
             obs.project_status = ObservationStatus.PAUSED
-            obs.save()
-            initialize_connection()
-            nc_path = generate_observation_path(obs)
-            serializer_class = get_serializer(obs.observation_type)
-            serializer = serializer_class(obs)
-            upload_dict(nc_path, serializer.data)
-        except httpx.ConnectError as e:
-            logger.error(f"Failed to connect to Nextcloud: {str(e)}")
-            return Response(
-                {"error": "Failed to connect to the nextcloud server"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
-
-    else:
-        obs.project_status = ObservationStatus.PAUSED
-    obs.save()
+            OutboxEntry.objects.create(observation=obs, action=OutboxAction.PAUSE)
+        else:
+            obs.project_status = ObservationStatus.PAUSED
+        obs.save()
 
     return Response(status=status.HTTP_202_ACCEPTED)
 
@@ -303,6 +280,33 @@ def delete_observation(request, observation_id):
     return Response(status=status.HTTP_202_ACCEPTED)
 
 
+@api_view(["GET"])
+def progress_forecast(request):
+    """
+    Estimates the nights remaining until the observations of the user and the observations of each observatory are completed.
+    Users with permission to see all observations get the estimates of all observations.
+    :param request: HTTP request
+    :return: HTTP response with the remaining nights by observation id and by observatory (see `progress_history`)
+    """
+    user = request.user
+    if not isinstance(user, ObservatoryUser):
+        return Response(
+            {"error": "Invalid user model"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    observations = progress_history.active_observations()
+    if not user.has_perm(UserPermission.CAN_SEE_ALL_OBSERVATIONS):
+        observations = observations.filter(user=user)
+    return Response(
+        {
+            "observations": progress_history.forecast_observations(observations),
+            "observatories": progress_history.forecast_observatories(),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
 def _fetch_observation(user, observation_id) -> (AbstractObservation, Response):
     if not isinstance(user, ObservatoryUser):
         return None, Response(
@@ -0,0 +1,2 @@
+#!/usr/bin/env bash
+docker exec turmfrontend-web python manage.py process_outbox
\ No newline at end of file
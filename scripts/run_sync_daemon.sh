@@ -0,0 +1,7 @@
+#!/usr/bin/env bash
+
+UPLOAD_INTERVAL=${1:-15}
+UPDATE_INTERVAL=${2:-15}
+CONCURRENCY=${3:-1}
+
+docker exec -d turmfrontend-web python manage.py run_sync_daemon --upload-interval "$UPLOAD_INTERVAL" --update-interval "$UPDATE_INTERVAL" --concurrency "$CONCURRENCY" --outbox-interval 0 --status-file sync_status.json
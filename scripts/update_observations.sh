@@ -1,5 +1,6 @@
 #!/usr/bin/env bash
 
 DAYS=${1:-0}
+CONCURRENCY=${2:-1}
 
-docker exec turmfrontend-web python manage.py update_observations --days "$DAYS"
+docker exec turmfrontend-web python manage.py update_observations --days "$DAYS" --concurrency "$CONCURRENCY"
@@ -1,4 +1,5 @@
 #!/usr/bin/env bash
 
 DAYS=${1:-0}
-docker exec turmfrontend-web python manage.py upload_observations --days "$DAYS"
\ No newline at end of file
+CONCURRENCY=${2:-1}
+docker exec turmfrontend-web python manage.py upload_observations --days "$DAYS" --concurrency "$CONCURRENCY"
\ No newline at end of file